@@ -0,0 +1,526 @@
+"""
+Completion backends for the chat harnesses. A backend turns (model, messages, temperature) into a reply,
+either all at once (complete) or as text deltas (stream).
+
+    OpenAIBackend        openai package, the default. openai is only imported on the first request
+    HTTPBackend          any OpenAI compatible /chat/completions endpoint, standard library only
+    FakeBackend          in process replies, no network
+    RecordReplayBackend  replays replies from a JSON lines cassette, recording misses from another backend
+
+Fake and replay backends take latency settings so harness overhead and concurrency can be measured offline.
+The backend harnesses use by default is set with the LEARNASSIST_BACKEND environment variable, see default_backend().
+
+A cassette (or fake replies) can also be served over HTTP for HTTPBackend or any other client:
+    python -m LearnAssist.backends serve --cassette replies.jsonl --latency 0.3
+"""
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import argparse
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.parse
+
+from LearnAssist.cache import ResponseCache
+
+Messages = List[Dict[str, str]]
+
+def api_key() -> Optional[str]:
+    """
+    OpenAI key from secret.py if there is one, else from OPENAI_API_KEY
+    """
+    try:
+        from secret import API_KEY
+        return API_KEY
+    except ImportError:
+        return os.environ.get("OPENAI_API_KEY")
+
+class BackendError(Exception):
+    """
+    A failed completion request
+
+    :param status: HTTP status, None if the request never got a response (connection errors, timeouts)
+    :param retry_after: Seconds the server asked to wait before trying again, if it said
+    """
+    RETRYABLE = {408, 409, 429, 500, 502, 503, 504}
+
+    def __init__(self, message : str, status : int = None, retry_after : float = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status in self.RETRYABLE
+
+def parse_retry_after(value : Optional[str]) -> Optional[float]:
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None # HTTP dates are allowed too, but API servers send seconds
+
+def split_chunks(text : str) -> List[str]:
+    """
+    Split a reply into word sized deltas for simulated streaming
+    """
+    return re.findall(r"\s*\S+|\s+", text)
+
+class CompletionBackend:
+    """
+    Base class for backends. Subclasses implement complete, and stream if they can do better
+    than sending the whole reply as one delta.
+
+    :param latency: Seconds to wait before the reply (or its first delta)
+    :param jitter: Latency varies uniformly by up to this many seconds either way
+    :param chunk_latency: Seconds between streamed deltas
+    """
+    def __init__(self, latency : float = 0.0, jitter : float = 0.0, chunk_latency : float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_latency = chunk_latency
+
+    def wait_first(self):
+        delay = self.latency + (random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def wait_chunk(self):
+        if self.chunk_latency > 0:
+            time.sleep(self.chunk_latency)
+
+    def complete(self, model : str, messages : Messages, temperature : float) -> str:
+        raise NotImplementedError
+
+    def stream(self, model : str, messages : Messages, temperature : float) -> Iterator[str]:
+        yield self.complete(model, messages, temperature)
+
+    def simulated_stream(self, reply : str) -> Iterator[str]:
+        for i, chunk in enumerate(split_chunks(reply)):
+            if i > 0:
+                self.wait_chunk()
+            yield chunk
+
+# ==== REAL BACKENDS ====
+class OpenAIBackend(CompletionBackend):
+    """
+    Goes through the openai package, imported (and given the key) on the first request
+
+    :param key: API key, defaults to api_key()
+    """
+    def __init__(self, key : str = None):
+        super().__init__()
+        self.key = key
+        self._openai = None
+
+    @property
+    def openai(self):
+        if self._openai is None:
+            import openai
+            openai.api_key = self.key or api_key()
+            self._openai = openai
+        return self._openai
+
+    def create(self, **kwargs):
+        openai = self.openai
+        try:
+            return openai.ChatCompletion.create(**kwargs)
+        except openai.error.OpenAIError as e:
+            status = e.http_status
+            if status is None and not isinstance(e, (openai.error.APIConnectionError, openai.error.Timeout, openai.error.ServiceUnavailableError)):
+                status = 400 # Not a transient failure, don't retry it
+            raise BackendError(str(e), status, parse_retry_after((e.headers or {}).get("retry-after"))) from e
+
+    def complete(self, model : str, messages : Messages, temperature : float) -> str:
+        response = self.create(
+            model = model,
+            messages = messages,
+            temperature = temperature
+        )
+        return response['choices'][0]['message']['content']
+
+    def stream(self, model : str, messages : Messages, temperature : float) -> Iterator[str]:
+        response = self.create(
+            model = model,
+            messages = messages,
+            temperature = temperature,
+            stream = True
+        )
+        for chunk in response:
+            delta = chunk['choices'][0]['delta'].get('content')
+            if delta:
+                yield delta
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections to one host, shared by every thread using the backend
+
+    :param url: Any URL on the host
+    :param size: Idle connections kept open, extra ones are closed when returned
+    :param timeout: Socket timeout in seconds
+    """
+    def __init__(self, url : str, size : int = 8, timeout : float = 60):
+        import http.client # Only HTTP backends need it, and it pulls in ssl and email
+        self.errors = (http.client.HTTPException, OSError) # Failures of a request on a connection
+        parts = urllib.parse.urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.host = parts.hostname
+        self.port = parts.port
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(maxsize = size) # Most recently used first, it is least likely to have timed out
+        self.opened = 0
+        self.reused = 0
+
+    def get(self) -> Tuple['http.client.HTTPConnection', bool]:
+        """
+        Returns (connection, whether it was used before)
+        """
+        try:
+            connection = self.idle.get_nowait()
+            self.reused += 1
+            return connection, True
+        except queue.Empty:
+            self.opened += 1
+            return self.connection_class(self.host, self.port, timeout = self.timeout), False
+
+    def put(self, connection : 'http.client.HTTPConnection'):
+        try:
+            self.idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+class HTTPBackend(CompletionBackend):
+    """
+    Posts to an OpenAI compatible chat completions endpoint using only the standard library,
+    over a pool of keep-alive connections
+
+    :param base_url: URL the /chat/completions path is appended to
+    :param key: Bearer token, defaults to api_key(). Local servers usually ignore it
+    :param timeout: Socket timeout in seconds
+    :param pool_size: Idle connections kept open
+    """
+    def __init__(self, base_url : str = "https://api.openai.com/v1", key : str = None, timeout : float = 60, pool_size : int = 8):
+        super().__init__()
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.path = urllib.parse.urlsplit(self.url).path
+        self.key = key
+        self.pool = ConnectionPool(self.url, pool_size, timeout)
+
+    def post(self, payload : dict) -> Tuple['http.client.HTTPConnection', 'http.client.HTTPResponse']:
+        key = self.key or api_key()
+        headers = {"Content-Type" : "application/json"}
+        if key:
+            headers["Authorization"] = f"Bearer {key}"
+        body = json.dumps(payload).encode("utf-8")
+
+        while True:
+            connection, reused = self.pool.get()
+            try:
+                connection.request("POST", self.path, body = body, headers = headers)
+                response = connection.getresponse()
+                break
+            except self.pool.errors as e:
+                connection.close()
+                if reused:
+                    continue # The server closed the idle connection, not a real failure
+                raise BackendError(f"{type(e).__name__}: {e}") from e
+
+        if response.status >= 400:
+            text = response.read().decode("utf-8", "replace")
+            self.release(connection, response)
+            try:
+                message = json.loads(text)["error"]["message"]
+            except (ValueError, KeyError, TypeError):
+                message = text
+            raise BackendError(f"HTTP {response.status}: {message}", response.status, parse_retry_after(response.getheader("Retry-After")))
+        return connection, response
+
+    def release(self, connection : 'http.client.HTTPConnection', response : 'http.client.HTTPResponse'):
+        if response.will_close or not response.isclosed():
+            connection.close()
+        else:
+            self.pool.put(connection)
+
+    def complete(self, model : str, messages : Messages, temperature : float) -> str:
+        connection, response = self.post({"model" : model, "messages" : messages, "temperature" : temperature})
+        try:
+            data = json.loads(response.read())
+        except self.pool.errors as e:
+            connection.close()
+            raise BackendError(f"{type(e).__name__}: {e}") from e
+        self.release(connection, response)
+        return data['choices'][0]['message']['content']
+
+    def stream(self, model : str, messages : Messages, temperature : float) -> Iterator[str]:
+        connection, response = self.post({"model" : model, "messages" : messages, "temperature" : temperature, "stream" : True})
+        try:
+            for line in response:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[len(b"data:"):].strip()
+                if data == b"[DONE]":
+                    break
+                delta = json.loads(data)['choices'][0]['delta'].get('content')
+                if delta:
+                    yield delta
+            response.read() # Drain so the connection can be reused
+        except self.pool.errors as e:
+            raise BackendError(f"{type(e).__name__}: {e}") from e
+        finally:
+            self.release(connection, response)
+
+# ==== OFFLINE BACKENDS ====
+def echo_reply(messages : Messages) -> str:
+    return f"Echo: {messages[-1]['content']}"
+
+def expansion_reply(messages : Messages, n_concepts : int = 5) -> str:
+    """
+    Well formed ConceptExpanderChat reply for a "[Concept], [Topic], [Scope], [Direction]" command,
+    with made up concepts derived from the concept name
+    """
+    fields = [field.strip() for field in messages[-1]['content'].split(",")] + [None] * 4
+    concept = fields[0]
+    data = {
+        "concept" : concept,
+        "topic" : fields[1],
+        "scope" : fields[2],
+        "direction" : fields[3],
+        "chat" : f"Here are some concepts related to {concept}",
+        "new_concepts" : [
+            {"name" : f"{concept} {i}", "justification" : f"Concept {i} related to {concept}"}
+            for i in range(1, n_concepts + 1)
+        ]
+    }
+    return "```json\n" + json.dumps(data, indent = 4) + "\n```"
+
+class FakeBackend(CompletionBackend):
+    """
+    Answers in process with reply(messages), a fixed string or echo_reply by default
+
+    :param reply: Function of the message list, or a string returned for every request
+    :param error_rate: Fraction of requests that fail with a retryable BackendError (HTTP 429 or 503)
+    :param retry_after: Retry-After given with the simulated 429s
+    """
+    def __init__(self, reply : Callable[[Messages], str] = echo_reply, latency : float = 0.0, jitter : float = 0.0, chunk_latency : float = 0.0,
+        error_rate : float = 0.0, retry_after : float = None):
+        super().__init__(latency, jitter, chunk_latency)
+        self.reply = reply if callable(reply) else (lambda messages: reply)
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def complete(self, model : str, messages : Messages, temperature : float) -> str:
+        with self.lock:
+            self.requests += 1
+        self.wait_first()
+        if self.error_rate and random.random() < self.error_rate:
+            with self.lock:
+                self.errors += 1
+            if random.random() < 0.5:
+                raise BackendError("HTTP 429: Simulated rate limit", 429, self.retry_after)
+            raise BackendError("HTTP 503: Simulated outage", 503)
+        return self.reply(messages)
+
+    def stream(self, model : str, messages : Messages, temperature : float) -> Iterator[str]:
+        yield from self.simulated_stream(self.complete(model, messages, temperature))
+
+class RecordReplayBackend(CompletionBackend):
+    """
+    Replays replies from a JSON lines cassette, one {"key", "model", "messages", "temperature", "reply"} object
+    per line and keyed like the response cache. Requests missing from the cassette go to backend and are
+    appended to it, or raise KeyError if there is no backend.
+
+    :param cassette: Path of the cassette, created when the first reply is recorded
+    :param backend: Backend for requests the cassette doesn't have, None to replay only
+    """
+    def __init__(self, cassette : str, backend : CompletionBackend = None, latency : float = 0.0, jitter : float = 0.0, chunk_latency : float = 0.0):
+        super().__init__(latency, jitter, chunk_latency)
+        self.cassette = cassette
+        self.backend = backend
+        self.replies : Dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.recorded = 0
+
+        if os.path.exists(cassette):
+            with open(cassette, 'r', encoding = "utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # Partially written last line
+                    self.replies[entry["key"]] = entry["reply"]
+
+    def __len__(self):
+        return len(self.replies)
+
+    def complete(self, model : str, messages : Messages, temperature : float) -> str:
+        key = ResponseCache.make_key(model, messages, temperature)
+        reply = self.replies.get(key)
+        if reply is not None:
+            self.hits += 1
+            self.wait_first()
+            return reply
+        if self.backend is None:
+            raise KeyError(f"No recorded reply for this request in {self.cassette}")
+
+        reply = self.backend.complete(model, messages, temperature)
+        entry = {"key" : key, "model" : model, "messages" : messages, "temperature" : temperature, "reply" : reply}
+        with self.lock:
+            self.replies[key] = reply
+            with open(self.cassette, 'a', encoding = "utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii = False) + "\n")
+            self.recorded += 1
+        return reply
+
+    def stream(self, model : str, messages : Messages, temperature : float) -> Iterator[str]:
+        yield from self.simulated_stream(self.complete(model, messages, temperature))
+
+# ==== DEFAULT ====
+_default = None
+_default_lock = threading.Lock()
+
+def make_backend(spec : str) -> CompletionBackend:
+    """
+    Backend from a short description:
+        openai                   OpenAIBackend
+        fake, fake-expansion     FakeBackend with echo_reply or expansion_reply
+        replay:<path>            RecordReplayBackend replaying the cassette only
+        record:<path>            RecordReplayBackend recording OpenAI replies it doesn't have
+        http(s)://...            HTTPBackend with that base URL
+    """
+    if spec == "openai":
+        return OpenAIBackend()
+    if spec == "fake":
+        return FakeBackend()
+    if spec == "fake-expansion":
+        return FakeBackend(expansion_reply)
+    if spec.startswith("replay:"):
+        return RecordReplayBackend(spec[len("replay:"):])
+    if spec.startswith("record:"):
+        return RecordReplayBackend(spec[len("record:"):], backend = OpenAIBackend())
+    if spec.startswith("http://") or spec.startswith("https://"):
+        return HTTPBackend(spec)
+    raise ValueError(f"Unknown backend {spec}")
+
+def default_backend() -> CompletionBackend:
+    """
+    Backend shared by harnesses that aren't given one, made from LEARNASSIST_BACKEND (openai if unset)
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = make_backend(os.environ.get("LEARNASSIST_BACKEND", "openai"))
+        return _default
+
+# ==== SERVER ====
+def make_server(backend : CompletionBackend, host : str = "127.0.0.1", port : int = 8765) -> 'ThreadingHTTPServer':
+    """
+    OpenAI compatible HTTP server (POST .../chat/completions, streaming included) answering from backend.
+    Call serve_forever() on the result, port 0 picks a free port
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer # Only the server needs it, harnesses don't
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status : int, data : dict, retry_after : float = None):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if retry_after is not None:
+                self.send_header("Retry-After", str(retry_after))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_json(404, {"error" : {"message" : f"Unknown path {self.path}"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            args = (request.get("model"), request["messages"], request.get("temperature", 1.0))
+
+            try:
+                if not request.get("stream"):
+                    reply = backend.complete(*args)
+                    self.send_json(200, {
+                        "object" : "chat.completion",
+                        "model" : args[0],
+                        "choices" : [{"index" : 0, "message" : {"role" : "assistant", "content" : reply}, "finish_reason" : "stop"}]
+                    })
+                    return
+                deltas = backend.stream(*args)
+                first = next(deltas, None) # Errors show up before the headers are sent
+            except KeyError as e:
+                self.send_json(404, {"error" : {"message" : e.args[0] if e.args else "Not found"}})
+                return
+            except BackendError as e:
+                self.send_json(e.status or 502, {"error" : {"message" : str(e)}}, e.retry_after)
+                return
+            except Exception as e:
+                self.send_json(500, {"error" : {"message" : f"{type(e).__name__}: {e}"}})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            def events():
+                if first is not None:
+                    yield first
+                yield from deltas
+            for delta in events():
+                chunk = {"object" : "chat.completion.chunk", "choices" : [{"index" : 0, "delta" : {"content" : delta}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Serve recorded or fake completions over an OpenAI compatible HTTP API")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    serve = commands.add_parser("serve")
+    serve.add_argument("--cassette", default = None, help = "Replay this cassette, fake replies if not given")
+    serve.add_argument("--record", action = "store_true", help = "Record replies missing from the cassette with OpenAI")
+    serve.add_argument("--fake", default = "echo", choices = ["echo", "expansion"], help = "Fake replies when there is no cassette")
+    serve.add_argument("--latency", type = float, default = 0.0)
+    serve.add_argument("--jitter", type = float, default = 0.0)
+    serve.add_argument("--chunk-latency", type = float, default = 0.0)
+    serve.add_argument("--error-rate", type = float, default = 0.0, help = "Fraction of fake replies that fail with 429 or 503")
+    serve.add_argument("--host", default = "127.0.0.1")
+    serve.add_argument("--port", type = int, default = 8765)
+    args = parser.parse_args()
+
+    latency = dict(latency = args.latency, jitter = args.jitter, chunk_latency = args.chunk_latency)
+    if args.cassette is not None:
+        backend = RecordReplayBackend(args.cassette, backend = OpenAIBackend() if args.record else None, **latency)
+    else:
+        backend = FakeBackend(expansion_reply if args.fake == "expansion" else echo_reply, error_rate = args.error_rate, retry_after = 1.0, **latency)
+
+    server = make_server(backend, args.host, args.port)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Streaming loader for graph builder commands, the /addnode and /addedge lines of a builder file or of a
+reply to the graphbuilder prompt:
+
+    /addnode Complex Numbers
+    /addedge Complex Numbers, Euler's Identity
+
+Lines are read one at a time, so a file or sys.stdin can be passed directly. Anything that isn't a
+command (prose, code fences, blank lines) is skipped, and bad commands are reported without stopping the load.
+
+Load commands into a saved graph (created if missing) with:
+    python -m LearnAssist.builder commands.txt saves/courses.lgraph
+    cat reply.txt | python -m LearnAssist.builder - saves/courses.lgraph
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+from dataclasses import dataclass, field
+from functools import lru_cache
+import argparse
+import io
+import os
+import re
+import sys
+import time
+
+from LearnAssist.name_index import normalize
+
+# Optional list marker or quote before the command, e.g. "- /addnode X", "3. /addnode X", "> /addnode X"
+COMMAND = re.compile(r"^[\s\d.)*>•-]*/(\w+)[ \t]*(.*?)[\s`]*$")
+
+# Edge lines repeat node names a lot, so keep recent normalized names around
+name_key = lru_cache(maxsize = 1 << 16)(normalize)
+
+@dataclass
+class BuilderReport:
+    lines : int = 0
+    commands : int = 0
+    skipped : int = 0 # Lines that weren't commands
+    nodes_added : int = 0
+    nodes_existing : int = 0 # /addnode for a name that was already in the graph
+    edges_added : int = 0
+    edges_duplicate : int = 0
+    nodes_merged : int = 0 # New nodes merged into a near duplicate already in the graph
+    errors : List[Tuple[int, str, str]] = field(default_factory = list) # (line number, line, reason)
+    error_count : int = 0 # Can be more than len(errors), see BuilderLoader's max_errors
+    seconds : float = 0.0
+
+    @property
+    def lines_per_second(self) -> float:
+        return self.lines / self.seconds if self.seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Added {self.nodes_added} nodes ({self.nodes_merged} merged into near duplicates) and {self.edges_added} edges from {self.lines} lines "
+            f"in {self.seconds:.2f}s ({self.lines_per_second:.0f} lines/s), {self.error_count} errors"
+        )
+
+class BuilderLoader:
+    """
+    Adds builder commands to a graph. Nodes are given IDs as soon as they are read and inserted in batches.
+    Edges naming a node that hasn't been declared yet wait until it is, and whatever is still unknown at
+    the end is matched fuzzily against the graph (see DirectedGraph.resolve_name).
+
+    :param graph: DirectedGraph to add to
+    :param batch_size: Nodes and edges queued before they are inserted
+    :param max_errors: Errors kept in the report, the rest are only counted
+    :param merge_threshold: New nodes whose name vectors are at least this similar to an existing node are merged
+        into it once everything is loaded (see LearnAssist.similarity). None keeps them
+    """
+    def __init__(self, graph, batch_size : int = 1000, max_errors : int = 1000, merge_threshold : Optional[float] = 0.9):
+        self.graph = graph
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.merge_threshold = merge_threshold
+        self.added : List[int] = []
+        self.report = BuilderReport()
+
+        self.node_batch : List[Tuple[int, str]] = []
+        self.edge_batch : List[Tuple[int, int]] = []
+        self.batch_ids : Dict[str, int] = {} # Normalized name -> ID of nodes waiting in node_batch
+        self.waiting : Dict[str, List[Tuple[int, str, str, str]]] = {} # Normalized name -> edges waiting for it
+        self.seconds = 0.0
+
+    def error(self, lineno : int, line : str, reason : str):
+        self.report.error_count += 1
+        if len(self.report.errors) < self.max_errors:
+            self.report.errors.append((lineno, line, reason))
+
+    def lookup(self, key : str) -> Optional[int]:
+        id = self.batch_ids.get(key)
+        if id is None:
+            ids = self.graph.names.exact.get(key)
+            id = min(ids) if ids else None
+        return id
+
+    def feed(self, lines : Iterable[str]) -> BuilderReport:
+        """
+        Read commands from lines (any iterable of strings, or one string holding many lines).
+        Can be called repeatedly, call finish() after the last one
+        """
+        if isinstance(lines, str):
+            lines = io.StringIO(lines)
+        start = time.perf_counter()
+        report = self.report
+
+        for line in lines:
+            report.lines += 1
+            lineno = report.lines
+            match = COMMAND.match(line)
+            if match is None:
+                report.skipped += 1
+                continue
+
+            cmd, arg = match.group(1).lower(), match.group(2)
+            report.commands += 1
+            if cmd == "addnode":
+                self.add_node(lineno, line, arg.strip())
+            elif cmd == "addedge":
+                names = [name.strip() for name in arg.split(",")]
+                if len(names) != 2 or not all(names):
+                    self.error(lineno, line.strip(), "expected /addedge <name>, <name>")
+                else:
+                    self.add_edge(lineno, line.strip(), *names)
+            else:
+                self.error(lineno, line.strip(), f"unknown command /{cmd}")
+
+        self.seconds += time.perf_counter() - start
+        report.seconds = self.seconds
+        return report
+
+    def add_node(self, lineno : int, line : str, name : str):
+        if not name:
+            self.error(lineno, line.strip(), "expected /addnode <name>")
+            return
+        key = name_key(name)
+        if self.lookup(key) is not None: # Same name up to case and punctuation means same node
+            self.report.nodes_existing += 1
+            return
+
+        id = self.graph.new_id()
+        self.batch_ids[key] = id
+        self.node_batch.append((id, name))
+        for edge in self.waiting.pop(key, ()):
+            self.add_edge(*edge)
+        if len(self.node_batch) >= self.batch_size:
+            self.flush()
+
+    def add_edge(self, lineno : int, line : str, name_start : str, name_end : str):
+        ids = []
+        for name in (name_start, name_end):
+            key = name_key(name)
+            id = self.lookup(key)
+            if id is None:
+                # Might be declared further down, try again then
+                self.waiting.setdefault(key, []).append((lineno, line, name_start, name_end))
+                return
+            ids.append(id)
+
+        self.edge_batch.append(tuple(ids))
+        if len(self.edge_batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Insert the queued nodes, then the queued edges
+        """
+        if self.node_batch:
+            self.report.nodes_added += self.graph.add_nodes(self.node_batch)
+            self.added.extend(id for id, _ in self.node_batch)
+            self.node_batch = []
+            self.batch_ids = {}
+        if self.edge_batch:
+            added = self.graph.add_edges(self.edge_batch)
+            self.report.edges_added += added
+            self.report.edges_duplicate += len(self.edge_batch) - added
+            self.edge_batch = []
+
+    def finish(self) -> BuilderReport:
+        """
+        Insert everything still queued and resolve the remaining edges fuzzily. Returns the report
+        """
+        start = time.perf_counter()
+        self.flush()
+
+        waiting = sorted(edge for edges in self.waiting.values() for edge in edges)
+        self.waiting = {}
+        for lineno, line, name_start, name_end in waiting:
+            ids = [self.graph.resolve_name(name) for name in (name_start, name_end)]
+            if None in ids:
+                missing = [name for name, id in zip((name_start, name_end), ids) if id is None]
+                self.error(lineno, line, f"unknown node {', '.join(missing)}")
+            else:
+                self.edge_batch.append(tuple(ids))
+        self.flush()
+
+        if self.merge_threshold is not None and self.added:
+            try:
+                from LearnAssist.similarity import merge_duplicates # numpy, only loaded once there is something to merge
+                self.report.nodes_merged += len(merge_duplicates(self.graph, self.added, self.merge_threshold))
+            except ImportError:
+                pass # numpy is not installed, near duplicate nodes are kept
+            self.added = []
+
+        self.seconds += time.perf_counter() - start
+        self.report.seconds = self.seconds
+        self.report.errors.sort()
+        return self.report
+
+def load_commands(graph, lines : Iterable[str], batch_size : int = 1000, merge_threshold : Optional[float] = 0.9) -> BuilderReport:
+    """
+    Add every builder command in lines to graph
+    """
+    loader = BuilderLoader(graph, batch_size = batch_size, merge_threshold = merge_threshold)
+    loader.feed(lines)
+    return loader.finish()
+
+def main():
+    from LearnAssist.graph import DirectedGraph
+    from LearnAssist.storage import GraphStore
+
+    parser = argparse.ArgumentParser(description = "Load graph builder commands into a graph file")
+    parser.add_argument("commands", help = "Builder file, or - for stdin")
+    parser.add_argument("graph", help = ".lgraph file to add to, created if it doesn't exist")
+    parser.add_argument("--batch-size", type = int, default = 1000)
+    args = parser.parse_args()
+
+    if os.path.exists(args.graph):
+        store, graph, positions = GraphStore.open(args.graph)
+    else:
+        store, graph, positions = GraphStore(args.graph), DirectedGraph(), {}
+
+    if args.commands == "-":
+        report = load_commands(graph, sys.stdin, args.batch_size)
+    else:
+        with open(args.commands, 'r', encoding = "utf-8") as f:
+            report = load_commands(graph, f, args.batch_size)
+    store.save(graph, positions)
+
+    print(report.summary())
+    for lineno, line, reason in report.errors:
+        print(f"line {lineno}: {reason}: {line}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+from typing import Dict, Iterable, Optional
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+import time
+
+class ResponseCache:
+    """
+    Content addressed cache for chat completions. Replies are keyed on a hash of the engine, the
+    decorated message list and the temperature, kept in an in memory LRU and optionally mirrored to disk.
+
+    :param cache_dir: Directory for on disk entries. None keeps the cache in memory only
+    :param max_entries: Maximum number of entries held in memory before the least recently used is evicted
+    :param max_disk_entries: Maximum number of entries kept on disk before the oldest files are removed
+    :param ttl: Seconds an entry stays valid for. None means entries never expire
+    """
+    def __init__(self, cache_dir : str = None, max_entries : int = 512, max_disk_entries : int = 10000, ttl : float = None):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+
+        # key -> (created time, reply)
+        self.entries : "OrderedDict[str, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.disk_count = 0
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok = True)
+            self.disk_count = sum(1 for _ in self._disk_files())
+
+    @staticmethod
+    def make_key(engine : str, messages : Iterable[Dict[str, str]], temperature : float) -> str:
+        """
+        Hash (engine, messages, temperature) into a stable hex key
+        """
+        payload = json.dumps(
+            {"engine" : engine, "messages" : list(messages), "temperature" : temperature},
+            sort_keys = True, ensure_ascii = False, separators = (",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created : float) -> bool:
+        return self.ttl is not None and (time.time() - created) > self.ttl
+
+    def _disk_path(self, key : str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def _disk_files(self):
+        for sub in os.scandir(self.cache_dir):
+            if sub.is_dir():
+                for entry in os.scandir(sub.path):
+                    if entry.name.endswith(".json"):
+                        yield entry
+
+    def _remember(self, key : str, created : float, reply : str):
+        self.entries[key] = (created, reply)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last = False)
+            self.evictions += 1
+
+    def get(self, key : str) -> Optional[str]:
+        """
+        Returns cached reply for key, or None on a miss
+        """
+        with self.lock:
+            if key in self.entries:
+                created, reply = self.entries[key]
+                if not self._expired(created):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return reply
+                del self.entries[key]
+
+            if self.cache_dir is not None:
+                path = self._disk_path(key)
+                try:
+                    with open(path, 'r', encoding = "utf-8") as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    data = None
+
+                if data is not None:
+                    if not self._expired(data["created"]):
+                        self._remember(key, data["created"], data["reply"])
+                        self.hits += 1
+                        return data["reply"]
+                    self._remove_file(path)
+
+            self.misses += 1
+            return None
+
+    def put(self, key : str, reply : str):
+        created = time.time()
+        with self.lock:
+            self._remember(key, created, reply)
+
+            if self.cache_dir is not None:
+                path = self._disk_path(key)
+                os.makedirs(os.path.dirname(path), exist_ok = True)
+                is_new = not os.path.exists(path)
+
+                # Write to a temp file then rename so readers never see a partial entry
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'w', encoding = "utf-8") as f:
+                    json.dump({"created" : created, "reply" : reply}, f, ensure_ascii = False)
+                os.replace(tmp_path, path)
+
+                if is_new:
+                    self.disk_count += 1
+                if self.disk_count > self.max_disk_entries:
+                    self._evict_disk()
+
+    def _remove_file(self, path : str):
+        try:
+            os.remove(path)
+            self.disk_count -= 1
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        """
+        Removes the oldest files until the disk cache is back to 90% of its limit
+        """
+        files = sorted(self._disk_files(), key = lambda entry: entry.stat().st_mtime)
+        self.disk_count = len(files)
+        target = int(self.max_disk_entries * 0.9)
+        for entry in files[:max(0, self.disk_count - target)]:
+            self._remove_file(entry.path)
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.cache_dir is not None:
+                for entry in list(self._disk_files()):
+                    self._remove_file(entry.path)
+                self.disk_count = 0
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "evictions" : self.evictions,
+            "hit_rate" : (self.hits / total) if total else 0.0,
+            "memory_entries" : len(self.entries),
+            "disk_entries" : self.disk_count
+        }
@@ -1,114 +1,259 @@
-from typing import List, Iterable
-from abc import abstractclassmethod
-from copy import deepcopy
-import os
-import json
-import re
-
-from secret import API_KEY
-import openai
-
-openai.api_key = API_KEY
-
-class BaseChatHarness:
-    """
-    Base class for all chat bots that make use of tools
-
-    :param verbosity: 0 = no prints, 1 = print all model generated text, 2 = print all model generated text and tool calls
-    """
-    def __init__(self, init_prompt, debug_mode = False, init_messages : List[str] = [], engine = "gpt-3.5-turbo", verbosity = 0):
-        if os.path.isfile(init_prompt):
-            with open(init_prompt, 'r') as file:
-                init_prompt = file.read()
-        
-        self.model = engine
-
-        self.messages = [
-            {"role":"system", "content":init_prompt}
-        ]
-
-        for i in range(0, len(init_messages), 2):
-            self.messages.append({"role":"user", "content":init_messages[i]})
-            if i+1 < len(init_messages):
-                self.messages.append({"role":"assistant", "content":init_messages[i+1]})
-
-        self.message_base = deepcopy(self.messages)
-        self.debug_mode = debug_mode
-        self.verbosity = verbosity
-
-        self.message_decorators = {}
-
-    def reset(self):
-        self.messages = deepcopy(self.message_base)
-    
-    def update_decoration(self, key, val):
-        self.message_decorators[key] = val
-
-    def decorate_messages(self, msg_list : Iterable):
-        msg_list = deepcopy(msg_list)
-        for key in self.message_decorators:
-            msg_list[0]['content'] += f"\n ==== {key} ====\n {self.message_decorators[key]}\n ========"
-
-        return msg_list
-
-    def __call__(self, msg : str):
-        return self.converse(msg)
-        
-    def converse(self, user_input, mode = "user"):
-        # Any outputs that are from a tool will get "TOOL RESULT:" added to start
-        # This is to differentiate from actual user input
-
-        if type(user_input) is not str:
-            user_input = str(user_input)
-
-        if mode == "tool":
-            user_input = "TOOL RESULT: " + user_input
-            if self.debug_mode:
-                print("User: " + user_input)
-
-        self.messages.append({"role":"user", "content":user_input})
-
-        # If not in debug try and generate response from API
-        # Otherwise get user input as a debug value
-        try:
-            if not self.debug_mode:
-                response = openai.ChatCompletion.create(
-                    model = self.model,
-                    messages = self.decorate_messages(self.messages),
-                    temperature = 0
-                )
-                reply =  response['choices'][0]['message']['content']
-            else:
-                reply = input("Assistant:")
-        except Exception as e:
-            del self.messages[-1]
-            return f"API Error : {e}"
-
-        self.messages.append({"role":"assistant", "content":reply})
-        
-        return self.sanitize_response(reply)
-
-    @abstractclassmethod
-    def sanitize_response(self, message : str):
-        """
-        Sanitize the final response to the user, i.e. to extract external dialogue or just generally to post proecess messages
-        """
-        return message
-
-class ConceptExpanderChat(BaseChatHarness):
-    def __init__(self, init_prompt = "LearnAssist/prompts/json_prompt.txt", engine = "gpt-3.5-turbo", **kwargs):
-        super().__init__(init_prompt, engine = engine, **kwargs)
-    
-    def sanitize_response(self, message):
-        try:
-            json_start = message.find("```json")
-            assert json_start != -1, "Couldn't find JSON block"
-            json_end = message.find("```", json_start + len("```json"))
-            s = message[json_start:json_end].strip()
-        except:
-            s = message
-        data = json.loads(s)
-    
-        return data
-
-    
\ No newline at end of file
+from typing import List, Iterable, Iterator, Generator
+from abc import abstractclassmethod
+from functools import lru_cache
+import os
+import re
+import time
+
+from LearnAssist.backends import CompletionBackend, default_backend
+from LearnAssist.cache import ResponseCache
+from LearnAssist.context import ContextWindow
+from LearnAssist.json_stream import ConceptStreamParser, parse_concepts
+from LearnAssist.profiling import PROFILER
+from LearnAssist.transport import Transport, shared_transport
+
+@lru_cache(maxsize = None)
+def load_prompt(path : str) -> str:
+    """
+    Text of a prompt file, read once per process however many harnesses use it
+    """
+    with open(path, 'r') as file:
+        return file.read()
+
+class BaseChatHarness:
+    """
+    Base class for all chat bots that make use of tools
+
+    :param verbosity: 0 = no prints, 1 = print all model generated text, 2 = print all model generated text and tool calls
+    :param cache: Optional ResponseCache. When given, identical requests are answered from the cache instead of the API
+    :param context: ContextWindow that keeps the conversation within a token budget. Defaults to one sized for the engine
+    :param backend: CompletionBackend that produces the replies. Defaults to the shared one from LearnAssist.backends.default_backend
+    :param transport: Transport requests are sent through (concurrency limit, coalescing, retries). Defaults to the one shared by all harnesses on the backend
+    :param message_base: message_base of another harness to share instead of building one from init_prompt and init_messages,
+        so many harnesses with the same prompt hold it only once
+    """
+    def __init__(self, init_prompt, debug_mode = False, init_messages : List[str] = [], engine = "gpt-3.5-turbo", verbosity = 0, cache : ResponseCache = None,
+        context : ContextWindow = None, backend : CompletionBackend = None, transport : Transport = None, message_base : List[dict] = None):
+        self.model = engine
+        self.temperature = 0
+        self.cache = cache
+        self.backend = backend if backend is not None else default_backend()
+        self.transport = transport if transport is not None else shared_transport(self.backend)
+
+        if message_base is None:
+            if os.path.isfile(init_prompt):
+                init_prompt = load_prompt(init_prompt)
+
+            message_base = [
+                {"role":"system", "content":init_prompt}
+            ]
+
+            for i in range(0, len(init_messages), 2):
+                message_base.append({"role":"user", "content":init_messages[i]})
+                if i+1 < len(init_messages):
+                    message_base.append({"role":"assistant", "content":init_messages[i+1]})
+
+        # Messages are never changed in place (trimming and decoration replace them), so the base messages
+        # are shared by the history rather than copied
+        self.message_base = message_base
+        self.messages = list(message_base)
+        self.context = context if context is not None else ContextWindow(engine = engine)
+        self.context.n_pinned = len(self.message_base)
+        self.debug_mode = debug_mode
+        self.verbosity = verbosity
+
+        self.message_decorators = {}
+        self._decorated_system = None # (undecorated system message, decorated copy)
+
+    def reset(self):
+        self.messages = list(self.message_base)
+    
+    def update_decoration(self, key, val):
+        """
+        Set the section key of the system prompt to val, None removes the section
+        """
+        if val is None:
+            if self.message_decorators.pop(key, None) is not None:
+                self._decorated_system = None
+        elif self.message_decorators.get(key) is not val:
+            self.message_decorators[key] = val
+            self._decorated_system = None
+
+    def decorate_messages(self, msg_list : Iterable):
+        # Only the system prompt changes, so the rest of the history is shared rather than copied
+        # The decorated system message is rebuilt only when a decoration changes
+        msg_list = list(msg_list)
+        if self.message_decorators:
+            system = msg_list[0]
+            if self._decorated_system is None or self._decorated_system[0] is not system:
+                content = system['content'] + "".join(
+                    [f"\n ==== {key} ====\n {val}\n ========" for key, val in self.message_decorators.items()]
+                )
+                self._decorated_system = (system, dict(system, content = content))
+            msg_list[0] = self._decorated_system[1]
+
+        return msg_list
+
+    def fit_context(self) -> int:
+        """
+        Trim the history to the token budget before a request. Returns the request size in tokens
+        """
+        n_tokens = self.context.fit(self.messages, self.message_decorators)
+        if self.verbosity >= 2:
+            print(f"[{self.model}] request tokens: {n_tokens}")
+        return n_tokens
+
+    def __call__(self, msg : str):
+        return self.converse(msg)
+        
+    def push_user_input(self, user_input, mode = "user"):
+        # Any outputs that are from a tool will get "TOOL RESULT:" added to start
+        # This is to differentiate from actual user input
+
+        if type(user_input) is not str:
+            user_input = str(user_input)
+
+        if mode == "tool":
+            user_input = "TOOL RESULT: " + user_input
+            if self.debug_mode:
+                print("User: " + user_input)
+
+        self.messages.append({"role":"user", "content":user_input})
+        return self.fit_context()
+
+    def record_request(self, start : float, n_tokens : int, reply : str = None):
+        """
+        Profile one request: latency, prompt tokens and reply characters, or an error if reply is None
+        """
+        if not PROFILER.enabled:
+            return
+        if reply is None:
+            PROFILER.count("chat.errors")
+            return
+        PROFILER.count("chat.requests")
+        PROFILER.observe("chat.latency_ms", (time.perf_counter() - start) * 1e3)
+        PROFILER.observe("chat.prompt_tokens", n_tokens)
+        PROFILER.observe("chat.reply_chars", len(reply))
+
+    def converse(self, user_input, mode = "user"):
+        n_tokens = self.push_user_input(user_input, mode)
+
+        # If not in debug try and generate response from API
+        # Otherwise get user input as a debug value
+        start = time.perf_counter()
+        try:
+            if not self.debug_mode:
+                reply = self.request_completion(self.decorate_messages(self.messages))
+            else:
+                reply = input("Assistant:")
+        except Exception as e:
+            del self.messages[-1]
+            self.record_request(start, n_tokens)
+            return f"API Error : {e}"
+
+        self.record_request(start, n_tokens, reply)
+        self.messages.append({"role":"assistant", "content":reply})
+        
+        return self.sanitize_response(reply)
+
+    def converse_stream(self, user_input, mode = "user") -> Generator[str, None, object]:
+        """
+        Streaming version of converse. Yields text deltas as they arrive and returns the sanitized reply
+        (as the StopIteration value). The stored assistant message is the concatenation of all deltas,
+        identical to what converse would have stored.
+        """
+        n_tokens = self.push_user_input(user_input, mode)
+
+        pieces = []
+        start = time.perf_counter()
+        try:
+            if not self.debug_mode:
+                for delta in self.request_completion_stream(self.decorate_messages(self.messages)):
+                    if not pieces:
+                        PROFILER.observe("chat.first_delta_ms", (time.perf_counter() - start) * 1e3)
+                    pieces.append(delta)
+                    yield delta
+            else:
+                pieces.append(input("Assistant:"))
+                yield pieces[-1]
+        except Exception as e:
+            del self.messages[-1]
+            self.record_request(start, n_tokens)
+            error = f"API Error : {e}"
+            yield ("\n" if pieces else "") + error
+            return error
+
+        reply = "".join(pieces)
+        self.record_request(start, n_tokens, reply)
+        self.messages.append({"role":"assistant", "content":reply})
+
+        return self.sanitize_response(reply)
+
+    def request_completion(self, messages : List[dict]) -> str:
+        """
+        Get a completion for the (already decorated) messages, going through the cache if there is one
+        """
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(self.model, messages, self.temperature)
+            reply = self.cache.get(key)
+            if reply is not None:
+                return reply
+
+        reply = self.transport.complete(self.model, messages, self.temperature)
+
+        if key is not None:
+            self.cache.put(key, reply)
+        return reply
+
+    def request_completion_stream(self, messages : List[dict]) -> Iterator[str]:
+        """
+        Streaming version of request_completion. A cache hit is yielded as a single delta
+        """
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(self.model, messages, self.temperature)
+            reply = self.cache.get(key)
+            if reply is not None:
+                yield reply
+                return
+
+        pieces = []
+        for delta in self.transport.stream(self.model, messages, self.temperature):
+            pieces.append(delta)
+            yield delta
+
+        if key is not None:
+            self.cache.put(key, "".join(pieces))
+
+    @abstractclassmethod
+    def sanitize_response(self, message : str):
+        """
+        Sanitize the final response to the user, i.e. to extract external dialogue or just generally to post proecess messages
+        """
+        return message
+
+class ConceptExpanderChat(BaseChatHarness):
+    def __init__(self, init_prompt = "LearnAssist/prompts/json_prompt.txt", engine = "gpt-3.5-turbo", **kwargs):
+        super().__init__(init_prompt, engine = engine, **kwargs)
+    
+    def sanitize_response(self, message):
+        # Tolerates a missing ```json fence, text around the JSON and replies that were cut off
+        return parse_concepts(message)
+
+    def converse_concepts(self, user_input, mode = "user") -> Generator[dict, None, dict]:
+        """
+        Stream an expansion, yielding each new_concepts entry as soon as it is complete so it can be
+        used while the rest is still being generated. Returns the whole parsed reply (as the StopIteration value)
+        """
+        parser = ConceptStreamParser()
+        gen = self.converse_stream(user_input, mode)
+        while True:
+            try:
+                delta = next(gen)
+            except StopIteration as stop:
+                if isinstance(stop.value, str): # API error
+                    raise RuntimeError(stop.value)
+                break
+            yield from parser.feed(delta)
+        return parser.finish()
@@ -0,0 +1,241 @@
+from typing import List, Dict, Callable
+import re
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Context sizes of the engines we use, anything unknown gets the smallest
+CONTEXT_SIZES = {
+    "gpt-3.5-turbo" : 4096,
+    "gpt-3.5-turbo-16k" : 16384,
+    "gpt-4" : 8192,
+    "gpt-4-32k" : 32768
+}
+
+class TokenCounter:
+    """
+    Counts tokens with tiktoken if it is installed, otherwise approximates them from the text
+    (roughly one token per 4 characters, never less than one per word)
+    """
+    MESSAGE_OVERHEAD = 4 # Tokens the chat format adds around every message
+
+    def __init__(self, engine : str = "gpt-3.5-turbo"):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(engine)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count(self, text : str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return max(len(text) // 4, len(re.findall(r"\S+", text)))
+
+    def count_message(self, message : Dict[str, str]) -> int:
+        return self.count(message["content"]) + self.MESSAGE_OVERHEAD
+
+def extractive_summary(messages : List[Dict[str, str]], max_chars : int = 160) -> str:
+    """
+    Cheap local summary: the first sentence of every message, clipped to max_chars
+    """
+    lines = []
+    for message in messages:
+        text = " ".join(message["content"].split())
+        end = text.find(". ")
+        if end != -1:
+            text = text[:end + 1]
+        if len(text) > max_chars:
+            text = text[:max_chars - 3] + "..."
+        lines.append(f"{message['role']}: {text}")
+    return "\n".join(lines)
+
+class EvictionPolicy:
+    """
+    Decides what to remove from a conversation that is over its token budget.
+    Policies only ever touch messages after the pinned base and before the newest message.
+    """
+    def evict(self, window : 'ContextWindow', messages : List[Dict[str, str]], excess : int):
+        raise NotImplementedError
+
+    @staticmethod
+    def turn_end(messages : List[Dict[str, str]], start : int) -> int:
+        """
+        Index just past the turn starting at start (a user message plus the replies to it)
+        """
+        end = start + 1
+        while end < len(messages) - 1 and messages[end]["role"] != "user":
+            end += 1
+        return end
+
+class DropOldest(EvictionPolicy):
+    """
+    Drop whole turns, oldest first, until the conversation fits
+    """
+    def evict(self, window, messages, excess):
+        start = window.n_pinned
+        freed = 0
+        end = start
+        while freed < excess and end < len(messages) - 1:
+            new_end = self.turn_end(messages, end)
+            freed += sum(window.counts[end:new_end])
+            end = new_end
+        window.drop_range(messages, start, end)
+
+class KeepLastN(EvictionPolicy):
+    """
+    When over budget, keep only the last n messages after the pinned base (falling back to DropOldest
+    if that still does not fit)
+
+    :param n: Number of (non pinned) messages to keep
+    """
+    def __init__(self, n : int = 8):
+        self.n = n
+
+    def evict(self, window, messages, excess):
+        end = max(window.n_pinned, len(messages) - self.n)
+        while end < len(messages) - 1 and messages[end]["role"] != "user": # Don't start on an orphaned reply
+            end += 1
+        window.drop_range(messages, window.n_pinned, end)
+        remaining = window.total() - window.budget
+        if remaining > 0:
+            DropOldest().evict(window, messages, remaining)
+
+class Summarize(EvictionPolicy):
+    """
+    Replace the oldest turns with a single summary message. Earlier summaries are folded into the new one.
+
+    :param summarizer: Maps a list of messages to summary text. Defaults to a local extractive summary,
+        a chat harness can be plugged in for abstractive summaries
+    :param keep_last: Number of most recent messages that are never summarized
+    :param max_summary_tokens: The oldest summary lines are dropped once the summary grows past this
+    """
+    PREFIX = "Summary of the earlier conversation:\n"
+
+    def __init__(self, summarizer : Callable[[List[Dict[str, str]]], str] = extractive_summary, keep_last : int = 4,
+        max_summary_tokens : int = 256):
+        self.summarizer = summarizer
+        self.keep_last = keep_last
+        self.max_summary_tokens = max_summary_tokens
+
+    def evict(self, window, messages, excess):
+        start = window.n_pinned
+        end = max(start, len(messages) - self.keep_last)
+        while end < len(messages) - 1 and messages[end]["role"] != "user":
+            end += 1
+
+        old = messages[start:end]
+        previous = ""
+        if old and old[0]["role"] == "system" and old[0]["content"].startswith(self.PREFIX):
+            previous = old[0]["content"][len(self.PREFIX):] + "\n"
+            old = old[1:]
+        if not old:
+            DropOldest().evict(window, messages, excess)
+            return
+
+        lines = (previous + self.summarizer(old)).split("\n")
+        while len(lines) > 1 and window.counter.count("\n".join(lines)) > self.max_summary_tokens:
+            lines.pop(0)
+
+        summary = {"role" : "system", "content" : self.PREFIX + "\n".join(lines)}
+        window.replace_range(messages, start, end, summary)
+
+        remaining = window.total() - window.budget
+        if remaining > 0:
+            DropOldest().evict(window, messages, remaining)
+
+class ContextWindow:
+    """
+    Keeps per message token counts for a harness conversation (updated incrementally as messages are
+    added) and trims the conversation to a token budget before each request. The first n_pinned messages
+    (the harness message_base) are never evicted.
+
+    :param budget: Maximum prompt tokens per request. Defaults to the engine context size minus reply_reserve
+    :param policy: EvictionPolicy used when over budget, defaults to DropOldest
+    :param engine: Engine name, used for the default budget and tokenizer
+    :param reply_reserve: Tokens left free for the reply when budget is derived from the engine
+    """
+    def __init__(self, budget : int = None, policy : EvictionPolicy = None, engine : str = "gpt-3.5-turbo", reply_reserve : int = 1024):
+        if budget is None:
+            budget = CONTEXT_SIZES.get(engine, min(CONTEXT_SIZES.values())) - reply_reserve
+        self.budget = budget
+        self.policy = policy if policy is not None else DropOldest()
+        self.counter = TokenCounter(engine)
+
+        self.n_pinned = 1
+        self.tracked : List[Dict[str, str]] = [] # Messages the counts belong to
+        self.counts : List[int] = []
+        self.decoration_counts : Dict[str, tuple] = {} # key -> (value, count)
+        self.extra_tokens = 0 # Tokens added by decorations
+
+        self.last_request_tokens = 0
+        self.total_tokens_sent = 0
+        self.n_evicted = 0
+
+    def sync(self, messages : List[Dict[str, str]]):
+        """
+        Bring the counts in line with messages, only counting messages that were not seen before
+        """
+        n = min(len(messages), len(self.tracked))
+        i = 0
+        while i < n and messages[i] is self.tracked[i]:
+            i += 1
+        del self.tracked[i:]
+        del self.counts[i:]
+        for message in messages[i:]:
+            self.tracked.append(message)
+            self.counts.append(self.counter.count_message(message))
+
+    def decoration_tokens(self, decorators : Dict[str, str]) -> int:
+        total = 0
+        for key, val in decorators.items():
+            cached = self.decoration_counts.get(key)
+            if cached is None or cached[0] != val:
+                cached = (val, self.counter.count(f"\n ==== {key} ====\n {val}\n ========"))
+                self.decoration_counts[key] = cached
+            total += cached[1]
+        return total
+
+    def total(self) -> int:
+        return sum(self.counts) + self.extra_tokens
+
+    def fit(self, messages : List[Dict[str, str]], decorators : Dict[str, str] = {}) -> int:
+        """
+        Trim messages in place so the decorated request fits the budget, returns the request size in tokens
+        """
+        self.sync(messages)
+        self.extra_tokens = self.decoration_tokens(decorators)
+
+        excess = self.total() - self.budget
+        if excess > 0 and len(messages) - 1 > self.n_pinned:
+            self.policy.evict(self, messages, excess)
+
+        self.last_request_tokens = self.total()
+        self.total_tokens_sent += self.last_request_tokens
+        return self.last_request_tokens
+
+    def drop_range(self, messages : List[Dict[str, str]], start : int, end : int):
+        start = max(start, self.n_pinned)
+        if end <= start:
+            return
+        del messages[start:end]
+        del self.tracked[start:end]
+        del self.counts[start:end]
+        self.n_evicted += end - start
+
+    def replace_range(self, messages : List[Dict[str, str]], start : int, end : int, message : Dict[str, str]):
+        start = max(start, self.n_pinned)
+        messages[start:end] = [message]
+        self.tracked[start:end] = [message]
+        self.counts[start:end] = [self.counter.count_message(message)]
+        self.n_evicted += end - start
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "budget" : self.budget,
+            "last_request_tokens" : self.last_request_tokens,
+            "total_tokens_sent" : self.total_tokens_sent,
+            "evicted_messages" : self.n_evicted
+        }
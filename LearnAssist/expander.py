@@ -0,0 +1,301 @@
+"""
+Breadth first concept expansion of a graph with ConceptExpanderChat.
+
+Starting from seed nodes, every concept on the frontier is sent to the expander as
+"[Concept], [Topic], [Scope], [Direction]". The new_concepts of each reply are matched against the
+graph by name, added as nodes where missing, and linked to the concept with the justification as the edge note.
+They then join the frontier, until the depth limit or the request budget is reached.
+
+    python -m LearnAssist.expander saves/calculus.lgraph "Calculus" --depth 2 --budget 30
+"""
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from collections import deque
+from dataclasses import dataclass, field
+import argparse
+import json
+import os
+import threading
+import time
+
+from LearnAssist.chat_harness import ConceptExpanderChat
+from LearnAssist.name_index import normalize
+from LearnAssist.profiling import MetricsExporter
+from LearnAssist.workers import RateLimiter
+
+# Whether the edge for a suggested concept points from the concept being expanded to it
+OUTWARD = {"down" : True, "forward" : True, "up" : False, "backward" : False}
+
+@dataclass
+class ExpansionReport:
+    requests : int = 0
+    expanded : int = 0
+    replayed : int = 0 # Expansions read back from the checkpoint
+    nodes_added : int = 0
+    edges_added : int = 0
+    failed : List[Tuple[str, str]] = field(default_factory = list) # (concept, error)
+    seconds : float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Expanded {self.expanded} concepts ({self.replayed} from checkpoint, {len(self.failed)} failed) "
+            f"adding {self.nodes_added} nodes and {self.edges_added} edges in {self.seconds:.1f}s"
+        )
+
+class FrontierExpander:
+    """
+    Expands a DirectedGraph concurrently. Each worker thread gets its own harness from harness_factory,
+    and requests from all of them go through one rate limiter. Replies are merged into the graph on the
+    calling thread, so the graph is never touched concurrently.
+
+    With a checkpoint path every finished expansion is appended there, and a later run with the same seeds
+    and settings merges those replies back in and continues where the interrupted one stopped. If the graph
+    is attached to a GraphStore, its journal is flushed at every checkpoint too.
+
+    :param graph: Graph to expand
+    :param harness_factory: Makes a ConceptExpanderChat (or anything with reset() and converse()) per worker
+    :param topic: Topic field of the expansion command, None for "No-Topic"
+    :param scope: "low", "medium" or "high"
+    :param direction: "down", "up", "forward" or "backward". Down and forward edges point from the concept to
+        the suggestions, up and backward ones from the suggestions to the concept
+    :param max_depth: Levels to expand, 1 expands only the seeds
+    :param budget: Most expansion requests in total, None for no limit
+    :param max_workers: Expansions running at once
+    :param requests_per_second: Rate limit over all workers, None for no limit
+    :param match_score: How close a suggested name must be to an existing node to count as the same concept,
+        by fuzzy name search and by name vector similarity
+    :param checkpoint: Path of the JSON lines checkpoint, None to not keep one
+    :param on_expand: Called on the calling thread after each expansion with (concept, reply or None, error or None)
+    """
+    def __init__(self, graph, harness_factory : Callable[[], ConceptExpanderChat] = ConceptExpanderChat, topic : str = None,
+        scope : str = "medium", direction : str = "down", max_depth : int = 2, budget : int = None, max_workers : int = 4,
+        requests_per_second : float = None, match_score : float = 0.9, checkpoint : str = None,
+        on_expand : Callable[[str, Optional[dict], Optional[str]], None] = None):
+        assert direction in OUTWARD, f"Unknown direction {direction}"
+        self.graph = graph
+        self.harness_factory = harness_factory
+        self.topic = topic
+        self.scope = scope
+        self.direction = direction
+        self.max_depth = max_depth
+        self.budget = budget
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(requests_per_second, burst = max_workers) if requests_per_second else None
+        self.match_score = match_score
+        self.checkpoint = checkpoint
+        self.on_expand = on_expand
+
+        self.local = threading.local()
+        self.frontier : Deque[Tuple[int, int]] = deque() # (node ID, depth)
+        self.expanded = set() # Normalized names of concepts expanded or being expanded
+        self.report = ExpansionReport()
+
+    def settings(self, seeds : List[str]) -> dict:
+        return {
+            "seeds" : seeds,
+            "topic" : self.topic,
+            "scope" : self.scope,
+            "direction" : self.direction,
+            "max_depth" : self.max_depth
+        }
+
+    def command(self, concept : str) -> str:
+        return f"{concept}, {self.topic or 'No-Topic'}, {self.scope}, {self.direction}"
+
+    # ==== WORKERS ====
+    def expand(self, concept : str) -> dict:
+        """
+        Run one expansion on the current worker thread's harness
+        """
+        harness = getattr(self.local, "harness", None)
+        if harness is None:
+            harness = self.local.harness = self.harness_factory()
+        if self.limiter is not None:
+            self.limiter.acquire()
+
+        harness.reset() # Expansions are independent, no need to send earlier ones along
+        reply = harness.converse(self.command(concept))
+        if not isinstance(reply, dict):
+            raise RuntimeError(str(reply)) # converse returns API errors as text
+        return reply
+
+    # ==== MERGING ====
+    def merge(self, id : int, reply : dict) -> List[int]:
+        """
+        Add the new_concepts of a reply to the graph around node id. Returns the IDs of the suggested concepts
+        """
+        children = []
+        for entry in reply.get("new_concepts") or []:
+            if isinstance(entry, dict):
+                name, justification = str(entry.get("name") or "").strip(), entry.get("justification")
+            else:
+                name, justification = str(entry).strip(), None
+            if not name:
+                continue
+
+            child = self.graph.resolve_name(name, min_score = self.match_score)
+            if child is None:
+                child = self.graph.add_node(text = name)
+                if self.graph.similarity is not None: # Without numpy near duplicate nodes are kept
+                    from LearnAssist.similarity import merge_duplicates
+                    child = merge_duplicates(self.graph, [child], self.match_score).get(child, child)
+            if child == id or child in children:
+                continue
+            children.append(child)
+
+            edge = (id, child) if OUTWARD[self.direction] else (child, id)
+            self.graph.add_edge(*edge)
+            if justification and edge not in self.graph.notes:
+                self.graph.set_note(*edge, str(justification))
+        return children
+
+    def finish(self, id : int, depth : int, concept : str, reply : dict = None, error : str = None, record : bool = True):
+        if record and self.checkpoint is not None:
+            entry = {"concept" : concept, "depth" : depth}
+            entry.update({"error" : error} if error is not None else {"new_concepts" : reply.get("new_concepts") or []})
+            with open(self.checkpoint, 'a', encoding = "utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii = False) + "\n")
+            if self.graph.journal is not None:
+                self.graph.journal.flush()
+
+        if error is not None:
+            self.report.failed.append((concept, error))
+        else:
+            self.report.expanded += 1
+            if id in self.graph.V:
+                for child in self.merge(id, reply):
+                    if depth + 1 < self.max_depth:
+                        self.frontier.append((child, depth + 1))
+        if self.on_expand is not None:
+            self.on_expand(concept, reply, error)
+
+    def resume(self, seeds : List[str]):
+        """
+        Merge the replies recorded in the checkpoint, or start a new one if it belongs to a different run
+        """
+        settings = self.settings(seeds)
+        entries = []
+        if os.path.exists(self.checkpoint):
+            with open(self.checkpoint, 'r', encoding = "utf-8") as f:
+                lines = f.read().split("\n")
+            try:
+                header = json.loads(lines[0])
+            except ValueError:
+                header = None # Cut off or not a checkpoint, start over
+            if header == settings:
+                for line in lines[1:]:
+                    if not line:
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        break # Last line was cut off by an interrupted run, everything before it is intact
+
+        with open(self.checkpoint, 'w', encoding = "utf-8") as f:
+            f.write(json.dumps(settings, ensure_ascii = False) + "\n")
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii = False) + "\n")
+
+        for entry in entries:
+            if "error" in entry:
+                continue # Tried again below
+            id = self.graph.names.lookup(entry["concept"])
+            if id is None:
+                continue
+            self.expanded.add(normalize(entry["concept"]))
+            self.report.requests += 1
+            self.report.replayed += 1
+            self.finish(id, entry["depth"], entry["concept"], reply = entry, record = False)
+
+    # ==== DRIVER ====
+    def run(self, seeds : Iterable) -> ExpansionReport:
+        """
+        Expand from seeds (node IDs or names, names missing from the graph are added) until the frontier
+        is empty, the depth limit is reached or the budget is spent
+        """
+        start = time.perf_counter()
+        n_nodes, n_edges = len(self.graph.V), len(self.graph.E)
+
+        seed_ids = []
+        for seed in seeds:
+            if isinstance(seed, int):
+                seed_ids.append(seed)
+            else:
+                id = self.graph.resolve_name(seed, min_score = self.match_score)
+                seed_ids.append(id if id is not None else self.graph.add_node(text = seed))
+        self.frontier.extend((id, 0) for id in seed_ids)
+        if self.checkpoint is not None:
+            self.resume([self.graph.V[id].display_text for id in seed_ids])
+
+        running : Dict[Future, Tuple[int, int, str]] = {}
+        executor = ThreadPoolExecutor(max_workers = self.max_workers, thread_name_prefix = "expand")
+        try:
+            while True:
+                while self.frontier and len(running) < self.max_workers and (self.budget is None or self.report.requests < self.budget):
+                    id, depth = self.frontier.popleft()
+                    if id not in self.graph.V:
+                        continue
+                    concept = self.graph.V[id].display_text
+                    key = normalize(concept)
+                    if key in self.expanded:
+                        continue
+                    self.expanded.add(key)
+                    self.report.requests += 1
+                    running[executor.submit(self.expand, concept)] = (id, depth, concept)
+
+                if not running:
+                    break
+                done, _ = wait(running, return_when = FIRST_COMPLETED)
+                for future in done:
+                    id, depth, concept = running.pop(future)
+                    try:
+                        self.finish(id, depth, concept, reply = future.result())
+                    except Exception as e:
+                        self.finish(id, depth, concept, error = f"{type(e).__name__}: {e}")
+        finally:
+            executor.shutdown(wait = False, cancel_futures = True)
+
+        self.report.nodes_added += len(self.graph.V) - n_nodes
+        self.report.edges_added += len(self.graph.E) - n_edges
+        self.report.seconds += time.perf_counter() - start
+        return self.report
+
+def main():
+    from LearnAssist.graph import DirectedGraph
+    from LearnAssist.storage import GraphStore
+
+    parser = argparse.ArgumentParser(description = "Expand a graph breadth first from seed concepts")
+    parser.add_argument("graph", help = ".lgraph file, created if it doesn't exist")
+    parser.add_argument("seeds", nargs = "+")
+    parser.add_argument("--topic", default = None)
+    parser.add_argument("--scope", default = "medium", choices = ["low", "medium", "high"])
+    parser.add_argument("--direction", default = "down", choices = list(OUTWARD))
+    parser.add_argument("--depth", type = int, default = 2)
+    parser.add_argument("--budget", type = int, default = 20)
+    parser.add_argument("--workers", type = int, default = 4)
+    parser.add_argument("--rps", type = float, default = 1.0, help = "Requests per second over all workers")
+    parser.add_argument("--checkpoint", default = None, help = "Defaults to <graph>.expand.jsonl")
+    parser.add_argument("--metrics", default = None, help = "Export request metrics here every 10 s (.prom for Prometheus text, else JSON lines)")
+    args = parser.parse_args()
+    exporter = MetricsExporter(args.metrics).start() if args.metrics else None
+
+    if os.path.exists(args.graph):
+        store, graph, positions = GraphStore.open(args.graph)
+    else:
+        store, graph, positions = GraphStore(args.graph), DirectedGraph(), {}
+        store.save(graph, positions)
+
+    expander = FrontierExpander(
+        graph, topic = args.topic, scope = args.scope, direction = args.direction, max_depth = args.depth,
+        budget = args.budget, max_workers = args.workers, requests_per_second = args.rps,
+        checkpoint = args.checkpoint or args.graph + ".expand.jsonl",
+        on_expand = lambda concept, reply, error: print(f"{concept}: {error or len(reply.get('new_concepts') or [])}")
+    )
+    report = expander.run(args.seeds)
+    store.save(graph, positions)
+    print(report.summary())
+    if exporter is not None:
+        exporter.stop()
+
+if __name__ == "__main__":
+    main()
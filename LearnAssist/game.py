@@ -1,550 +1,1389 @@
-from typing import Iterable, Tuple, Dict, Callable
-from dataclasses import dataclass
-
-import pygame
-import random
-import math
-import os
-import joblib
-
-import tkinter as tk
-from tkinter import filedialog
-
-from LearnAssist.chat_harness import BaseChatHarness
-
-@dataclass
-class Point:
-    x : int
-    y : int
-
-    def astuple(self):
-        return (self.x, self.y)
-
-    def dist(self, other : 'Point'):
-        return ((self.x - other.x) ** 2 + (self.y - other.y) ** 2) ** 0.5
-
-    def translate(self, other : 'Point'):
-        return Point(self.x - other.x, self.y - other.y)
-    
-    def __add__(self, other : 'Point'):
-        return Point(self.x + other.x, self.y + other.y)
-    
-    def __sub__(self, other : 'Point'):
-        return self.translate(other)
-
-@dataclass
-class Node:
-    id : int
-    forward_neighbors : Iterable[int]
-    backward_neighbors : Iterable[int]
-    display_text : str
-
-class SquareButton:
-    def __init__(self, pos : Point, size : int, text : str, on_click : Callable, is_toggle : bool = False):
-        self.pos = pos
-        self.size = size
-        self.on = False
-        self.text = text
-        self.on_click = on_click
-        self.is_toggle = is_toggle
-    
-    def scan(self, mouse_pos : Point):
-        """
-        Check if mouse is in button boundaries
-        """
-        if (mouse_pos.x > self.pos.x and mouse_pos.x < (self.pos.x + self.size)) \
-            and (mouse_pos.y > self.pos.y and mouse_pos.y < (self.pos.y + self.size)):
-            print("Pressed")
-            return True
-        return False
-    
-    def draw(self, screen, font):
-        button_rect = pygame.Rect(self.pos.x, self.pos.y, self.size, self.size)
-        pygame.draw.rect(screen, (0, 0, 0), button_rect)
-        if self.on:
-            pygame.draw.rect(screen, (0, 255, 0), button_rect, 2)
-        else:
-            pygame.draw.rect(screen, (255, 255, 255), button_rect, 2)
-        
-        text_surface = font.render(self.text, True, (255, 255, 255))
-        text_rect = text_surface.get_rect(center=(self.pos + Point(self.size // 2, self.size // 2)).astuple())   
-
-        screen.blit(text_surface, button_rect)
-    
-    def toggle(self):
-        """
-        Button will change color to indicate it is being pressed
-        """
-        if self.is_toggle:
-            self.on = not self.on
-    
-    def click(self):
-        self.toggle()
-        self.on_click()
-
-class DirectedGraph:
-    def __init__(self):
-        self.V : Dict[int, Node] = {}
-        self.E : Iterable[Tuple[int,int]] = []
-
-        # Tagged vertices representing things the student already knows
-        self.tagged_vertices : Dict[int, bool] = {}
-
-    def add_node(self, id : int, text : str, forward_neighbors : Iterable[int] = [], backward_neighbors : Iterable[int] = []):
-        assert (id not in self.V), "Cannot add node with already existing ID"
-
-        self.V[id] = Node(
-            id = id,
-            forward_neighbors=forward_neighbors,
-            backward_neighbors=backward_neighbors,
-            display_text=text
-        )
-
-        self.tagged_vertices[id] = False # Start off assuming its false
-
-        self.E += [(id, id_f) for id_f in forward_neighbors] + [(id_b, id) for id_b in backward_neighbors]
-
-    def add_edge(self, id_start : int, id_end : int):
-        self.E.append((id_start, id_end))
-        self.V[id_start].forward_neighbors.append(id_end)
-        self.V[id_end].backward_neighbors.append(id_start)
-
-    def __str__(self) -> str:
-        s = ""
-        for key in self.V:
-            s += f"{self.V[key].display_text} ({self.V[key].id} is connected to: "
-            for nbr_id in self.V[key].forward_neighbors:
-                s += f"{self.V[nbr_id].display_text} ({self.V[nbr_id].id}), "
-            s += "\n"
-        
-        return s
-    
-    def get_tagged_node_names(self) -> str:
-        s = ""
-        for key in self.tagged_vertices:
-            if self.tagged_vertices[key]:
-                s += self.V[key].display_text + ", "
-
-    def from_builder_file(self, path : str):
-        with open(path, 'r') as f:
-            lines = f.readlines()
-        
-        def command_arg_split(line):
-            command = line.split(" ")[0][1:]
-            args = " ".join(line.split(" ")[1:]).split(",")
-            args = [arg.strip() for arg in args]
-            return command, args
-
-        map_name_id = {}
-        for line in lines:
-            cmd, args = command_arg_split(line)
-            if cmd == "addnode":
-                new_id = (max(self.V.keys()) + 1) if self.V else 0
-                map_name_id[args[0]] = new_id
-                self.add_node(new_id, args[0])
-
-            elif cmd == "addedge":
-                node_1 = map_name_id[args[0]]
-                node_2 = map_name_id[args[1]]
-
-                self.add_edge(node_1, node_2)
-
-class ChatLog:
-    def __init__(self, font, max_messages=10):
-        self.font = font
-        self.max_messages = max_messages
-        self.messages = []
-        self.colors = []
-
-    def log(self, message, color):
-        self.messages.append(message)
-        self.colors.append(color)
-        if len(self.messages) > self.max_messages:
-            self.messages.pop(0)
-            self.colors.pop(0)
-
-    def draw(self, screen, x, y):
-        for i, (message, color) in enumerate(reversed(list(zip(self.messages, self.colors)))):
-            message_surface = self.font.render(message, True, color)
-            screen.blit(message_surface, (x, y - i * self.font.get_height()))
-
-class GraphExplorer:
-    FONT_SIZE = 30
-    NODE_SIZE = 60
-    EDGE_THICKNESS = 2
-    ARROW_LENGTH = 50
-    ARROW_THICKNESS = 10
-    BUTTON_SIZE  = 100
-
-    def __init__(self, graph: DirectedGraph = None, resolution : Tuple[int,int] = (1900, 1000)):
-        if graph is None:
-            self.graph = DirectedGraph()
-        else:
-            self.graph = graph
-
-        pygame.init()
-
-        self.width = resolution[0]
-        self.height = resolution[1]
-
-        if not os.path.isdir("./saves"):
-            os.path.mkdirs("./saves")
-
-        self.screen = pygame.display.set_mode((resolution[0], resolution[1]))
-        self.font = pygame.font.Font(None, self.FONT_SIZE)
-        self.running = True
-
-        self.node_centers : Dict[int,Tuple[int,Point]] = {}
-        self.initialize_node_centers()
-
-        button_x = self.width - self.BUTTON_SIZE
-        button_y = lambda i: (self.height - ((self.BUTTON_SIZE + 2) * i))
-
-        def make_btn(y, txt, clk : Callable, **kwargs):
-            return SquareButton(Point(button_x, y), self.BUTTON_SIZE, txt, clk, **kwargs)
-
-        self.buttons : Dict[str, SquareButton] = {
-            "move_mode" : make_btn(button_y(1), "Move", self.on_click_move_mode, is_toggle = True),
-            "save_button" : make_btn(button_y(2), "Save", self.on_click_save),
-            "load_button" : make_btn(button_y(3), "Load", self.on_click_load),
-            "tag_vertex" : make_btn(button_y(4), "Mark Learned", self.on_click_tag),
-            "from_file" : make_btn(button_y(5), "From File", self.on_click_file)
-        }
-
-        # Window controls
-        self.screen_offset = Point(0, 0)
-
-        # Trackers
-        self.selected_node : int = None
-        self.dragging_start_pos : Point = None
-        self.dragging_screen_start : Point = None
-
-        # Modes
-        self.move_mode : bool = False # Moving node
-        self.dragging_mode : bool = False # Moving screen
-
-        # Chatbots
-        self.chat_log = ChatLog(self.font, 60)
-        self.active_chatbot = "BaseChat"
-        self.chat_stack = [self.active_chatbot]
-
-        self.chatbots = { # ChatHarness with names
-            "BaseChat" : BaseChatHarness("LearnAssist/prompts/basechat.txt"),
-            "Tutor" : BaseChatHarness("LearnAssist/prompts/tutor.txt")
-        }
-        self.chat_colors = { # names and associated colors
-            "User" : (255, 255, 255),
-            "BaseChat" : (0, 255, 0),
-            "System" : (127, 127, 127),
-            "Tutor" : (0, 127, 127)
-        }
-
-    # ==== BUTTONS ====
-    def check_button_clicks(self, mouse_pos : Point):
-        for key in self.buttons:
-            if self.buttons[key].scan(mouse_pos):
-                return key
-
-    def on_click_move_mode(self):
-        self.move_mode = not self.move_mode
-
-    def on_click_save(self):
-        self.data = {
-            "graph" : self.graph,
-            "node_pos" : self.node_centers
-        }
-
-        root = tk.Tk()
-        root.withdraw()
-        file_path = filedialog.asksaveasfilename(
-            defaultextension=".graph",
-            filetypes=[("Graph files", "*.graph")],
-            initialdir="./saves"
-        )
-
-        if file_path:
-            joblib.dump(self.data, file_path)
-
-    def on_click_load(self):
-        # Open a file dialog to select the load path
-        root = tk.Tk()
-        root.withdraw()  # Hide the main window
-        file_path = filedialog.askopenfilename(
-            defaultextension=".graph",
-            filetypes=[("Graph files", "*.graph")],
-            initialdir="./saves"
-        )
-
-        if file_path:
-            self.data = joblib.load(file_path)
-            self.graph = self.data["graph"]
-            self.node_centers = self.data["node_pos"]
-
-    def on_click_tag(self):
-        id = self.selected_node
-
-        if id == -1:
-            return
-        
-        self.graph.tagged_vertices[id] = not self.graph.tagged_vertices[id]
-
-    def on_click_file(self):
-        # Open a file dialog to select the load path
-        root = tk.Tk()
-        root.withdraw()  # Hide the main window
-        file_path = filedialog.askopenfilename(
-            defaultextension=".txt",
-            filetypes=[("Text files", "*.txt")],
-            initialdir="./saves/graph_builder"
-        )
-
-        if file_path:
-            self.graph.from_builder_file(file_path)
-
-        self.initialize_node_centers()
-
-    # ==== BASE GAME FUNCTIONS ====
-    def initialize_node_centers(self):
-        """
-        Initializes nodes starting positions
-        """
-        min_x, max_x = -500, 1000
-        min_y, max_y = -500, 1000
-        spacing = 90
-
-        for node_id in self.graph.V:
-            while True:
-                x = random.randint(min_x, max_x)
-                y = random.randint(min_y, max_y)
-                if not any(abs(x - point.x) < spacing and abs(y - point.y) < spacing for point in self.node_centers.values()):
-                    self.node_centers[node_id] = Point(x, y)
-                    break
-
-    def draw_arrow(self, start: Point, end: Point):
-        """
-        Draw a directed arrow from start to end
-        """
-        start = start.translate(self.screen_offset)
-        end = end.translate(self.screen_offset)
-
-        pygame.draw.line(self.screen, (255, 255, 255), start.astuple(), end.astuple(), self.EDGE_THICKNESS)
-        pygame.draw.line(self.screen, (255, 255, 255), start.astuple(), end.astuple(), self.EDGE_THICKNESS)
-
-        # Calculate the angle of the line
-        angle = math.atan2(end.y - start.y, end.x - start.x)
-
-        # Arrowhead size
-        arrowhead_length = self.ARROW_LENGTH
-        arrowhead_angle = math.pi / 6
-
-        midpoint = Point((start.x + end.x) / 2, (start.y + end.y) / 2)
-
-        # Calculate the positions of the two arrowhead lines
-        arrowhead_end1 = Point(
-            midpoint.x - arrowhead_length * math.cos(angle + arrowhead_angle),
-            midpoint.y - arrowhead_length * math.sin(angle + arrowhead_angle)
-        )
-        arrowhead_end2 = Point(
-            midpoint.x - arrowhead_length * math.cos(angle - arrowhead_angle),
-            midpoint.y - arrowhead_length * math.sin(angle - arrowhead_angle),
-        )
-
-        # Draw the arrowhead lines
-        pygame.draw.line(self.screen, (255, 255, 255), midpoint.astuple(), arrowhead_end1.astuple(), self.ARROW_THICKNESS)
-        pygame.draw.line(self.screen, (255, 255, 255), midpoint.astuple(), arrowhead_end2.astuple(), self.ARROW_THICKNESS)
-
-    def draw_node(self, pos: Point, text: str, id : int):
-        """
-        Draw a node given its position, text on it, and its id
-        """
-        pos = pos.translate(self.screen_offset)
-
-        # Blue halo if it's selected 
-        if self.selected_node == id: 
-            pygame.draw.circle(self.screen, (0, 0, 255), pos.astuple(), self.NODE_SIZE + 5)
-        
-        # Green halo if it's learned concept
-        if self.graph.tagged_vertices[id]:
-            pygame.draw.circle(self.screen, (0, 255, 0), pos.astuple(), self.NODE_SIZE + 2)
-
-        pygame.draw.circle(self.screen, (255, 255, 255), pos.astuple(), self.NODE_SIZE)
-
-        text_surface = self.font.render(text, True, (0, 0, 0))
-        text_rect = text_surface.get_rect(center=pos.astuple())
-        self.screen.blit(text_surface, text_rect)
-
-    def mouse_on_node(self, pos : Point):
-        """
-        Check if mouse_pos (in pos argument) is currently inside a node. If yes,
-        returns id of corresponding node, otherwise returns -1
-        """
-        # Check if mouse is currently above a node
-        for id in self.node_centers:
-            actual_pos = self.node_centers[id].translate(self.screen_offset)
-            if actual_pos.dist(pos) <= self.NODE_SIZE:
-                return id
-        return -1
-
-    # ==== CHAT RELATED ===
-    def handle_commands(self, message : str, source : str):
-        """
-        Handles any and all commands. Returns True if a command was executed and false otherwise.
-        """
-        ind = message.find("/")
-        if ind != -1:
-            message = message[ind:]
-            if source == "BaseChat":
-                n_ind = message.find("\n")
-                quote_ind = message.find("\"")
-                if n_ind != -1:
-                    message = message[:n_ind]
-                elif quote_ind != -1:
-                    message = message[:quote_ind]
-            
-            command = message[1:].split()[0]
-            msg = " ".join(message[1:].split()[1:])
-            params = msg.split(",")
-
-            if command == "help":
-                self.chatbots["BaseChat"].update_decoration("GRAPH", str(self.graph))
-                self.receive_text(self.chatbots["BaseChat"](msg), "BaseChat")
-            
-            if command == "addnode":
-                concept = params[0]
-                new_id = (max(self.graph.V.keys()) + 1) if self.graph.V else 0
-                self.graph.add_node(new_id, concept)
-
-                screen_center = Point(self.width // 2, self.height // 2)
-                self.node_centers[new_id] = (screen_center - self.screen_offset)
-
-                self.receive_text(f"Added node with ID {new_id} for concept '{concept}'", "System")
-
-            elif command == "addedge":
-                id1, id2 = int(params[0]), int(params[1])
-                if id1 in self.graph.V and id2 in self.graph.V:
-                    self.graph.V[id1].forward_neighbors.append(id2)
-                    self.graph.V[id2].backward_neighbors.append(id1)
-                    self.graph.E.append((id1, id2))
-                    self.receive_text(f"Added edge from ID {id1} to ID {id2}", "System")
-                else:
-                    self.receive_text("Invalid node IDs provided", "System")
-            return True
-        return False
-
-    def receive_text(self, message : str, source : str):
-        """
-        Receive text from any source
-        """
-
-        assert source in self.chat_colors, "Not a valid source for message"
-
-        def log(message, source):
-            self.chat_log.log(f"{source}: {message}", self.chat_colors[source])
-        
-        if message.find("\n") != -1:
-            for line in message.split("\n"):
-                log(line, source)
-        else:
-            log(message, source)
-
-        if source in ["User", "BaseChat"]: # Only user and base chat can do commands
-            if not self.handle_commands(message, source):
-                # If the message was not a command
-                self.chatbots["Tutor"].update_decoration("LEARNED CONCEPTS", self.graph.get_tagged_node_names())
-                self.receive_text(self.chatbots["Tutor"](message), "Tutor")
-
-    def run(self):
-        chat_input = "" # Buffer for the chat
-
-        while self.running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-
-                # Chatbox controls
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_RETURN:
-                        self.receive_text(chat_input, "User")
-                        chat_input = ""
-                    elif event.key == pygame.K_BACKSPACE:
-                        chat_input = chat_input[:-1]
-                    else:
-                        chat_input += event.unicode
-
-                # Graph controls
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    mouse_pos = Point(*pygame.mouse.get_pos())
-                    # First check for button presses
-                    button_pressed = self.check_button_clicks(mouse_pos)
-                    if button_pressed:
-                        self.buttons[button_pressed].click()
-                    else:
-                        mouse_node = self.mouse_on_node(mouse_pos) # -1 if no node, otherwise has an id
-                        if mouse_node == -1:
-                            self.dragging_mode = True
-                            self.dragging_start_pos = mouse_pos
-                            self.dragging_screen_start = self.screen_offset
-                        elif self.move_mode:
-                            if mouse_node != -1:
-                                self.selected_node = mouse_node
-                                self.dragging_start_pos = mouse_pos
-                            else:
-                                self.selected_node = None
-                        else: # Select node
-                            self.selected_node = mouse_node
-
-                elif event.type == pygame.MOUSEMOTION:
-                    if self.move_mode:
-                        if self.selected_node is not None and self.dragging_start_pos is not None:
-                            mouse_pos = Point(*pygame.mouse.get_pos())
-                            delta = mouse_pos - self.dragging_start_pos
-                            self.node_centers[self.selected_node] += delta
-                            self.dragging_start_pos = mouse_pos
-                elif event.type == pygame.MOUSEBUTTONUP:
-                    if self.dragging_mode:
-                        self.dragging_mode = False
-                    if self.move_mode:
-                        if self.selected_node is not None:
-                            self.selected_node = None
-                            self.dragging_start_pos = None       
-
-            self.screen.fill((0, 0, 0))
-
-            # Chat box surface
-            chat_surface = self.font.render(chat_input, True, (255, 255, 255))
-            self.screen.blit(chat_surface, (10, self.height - self.font.get_height()))
-            self.chat_log.draw(self.screen, 10, self.height - self.font.get_height() * 2)
-
-            # Draw edges with arrows
-            for edge in self.graph.E:
-                start_node = self.graph.V[edge[0]]
-                end_node = self.graph.V[edge[1]]
-                self.draw_arrow(self.node_centers[start_node.id], self.node_centers[end_node.id])
-
-            # Draw nodes with text
-            for node in self.graph.V.values():
-                self.draw_node(self.node_centers[node.id], node.display_text, node.id)
-
-            # Screen moving
-            if self.dragging_mode:
-                self.screen_offset = self.dragging_screen_start + (self.dragging_start_pos - Point(*pygame.mouse.get_pos()))
-
-            # Buttons
-            for key in self.buttons:
-                self.buttons[key].draw(self.screen, self.font)
-
-            pygame.display.flip()
-
-        pygame.quit()
-
-# Example usage
-if __name__ == "__main__":
-    graph = DirectedGraph()
-    #graph.add_node(0, "A", [1])
-    #graph.add_node(1, "B", [2])
-    #graph.add_node(2, "C", [])
-
-    explorer = GraphExplorer(graph)
-    explorer.run()
-        
-
+from typing import Iterable, List, Optional, Tuple, Dict, Callable
+from dataclasses import dataclass
+from collections import OrderedDict
+
+import pygame
+import math
+import os
+import time
+import threading
+
+from LearnAssist.backends import default_backend
+from LearnAssist.chat_harness import BaseChatHarness
+from LearnAssist.graph import DirectedGraph, Node # Node is imported so graphs pickled from this module still load
+from LearnAssist.profiling import PROFILER, MetricsExporter
+from LearnAssist.reachability import tutor_context
+from LearnAssist.workers import ChatWorkerPool
+from LearnAssist.spatial import SpatialGrid
+from LearnAssist.transport import shared_transport
+
+try:
+    from LearnAssist.storage import GraphStore
+except ImportError: # numpy is not installed, graphs only save to old .graph files
+    GraphStore = None
+
+try:
+    from LearnAssist.layout import ForceLayout
+except ImportError: # numpy is not installed, nodes are only placed by hand
+    ForceLayout = None
+
+try:
+    from LearnAssist.similarity import merge_duplicates
+except ImportError: # numpy is not installed, near duplicate nodes are kept
+    merge_duplicates = None
+
+@dataclass
+class Point:
+    x : int
+    y : int
+
+    def astuple(self):
+        return (self.x, self.y)
+
+    def dist(self, other : 'Point'):
+        return ((self.x - other.x) ** 2 + (self.y - other.y) ** 2) ** 0.5
+
+    def translate(self, other : 'Point'):
+        return Point(self.x - other.x, self.y - other.y)
+    
+    def __add__(self, other : 'Point'):
+        return Point(self.x + other.x, self.y + other.y)
+    
+    def __sub__(self, other : 'Point'):
+        return self.translate(other)
+
+class Camera:
+    """
+    Maps world coordinates (where nodes live) to the screen. offset is the world position
+    of the top left corner of the screen, zoom is screen pixels per world unit
+    """
+    MIN_ZOOM = 0.02
+    MAX_ZOOM = 4.0
+
+    def __init__(self, width : int, height : int):
+        self.width = width
+        self.height = height
+        self.offset = Point(0, 0)
+        self.zoom = 1.0
+
+    def to_screen(self, pos : Point) -> Point:
+        return Point((pos.x - self.offset.x) * self.zoom, (pos.y - self.offset.y) * self.zoom)
+
+    def to_world(self, pos : Point) -> Point:
+        return Point(pos.x / self.zoom + self.offset.x, pos.y / self.zoom + self.offset.y)
+
+    def scale(self, length : float) -> float:
+        return length * self.zoom
+
+    def zoom_at(self, factor : float, screen_pos : Point):
+        """
+        Zoom by factor, keeping the world point under screen_pos fixed
+        """
+        anchor = self.to_world(screen_pos)
+        self.zoom = min(self.MAX_ZOOM, max(self.MIN_ZOOM, self.zoom * factor))
+        self.offset = Point(anchor.x - screen_pos.x / self.zoom, anchor.y - screen_pos.y / self.zoom)
+
+    def viewport(self, margin : float = 0, area = None) -> Tuple[float, float, float, float]:
+        """
+        Visible world rectangle (min_x, min_y, max_x, max_y), grown by margin world units on each side.
+        area restricts it to part of the screen, given as a (x, y, w, h) screen rect
+        """
+        x, y, w, h = area if area is not None else (0, 0, self.width, self.height)
+        return (
+            self.offset.x + x / self.zoom - margin, self.offset.y + y / self.zoom - margin,
+            self.offset.x + (x + w) / self.zoom + margin, self.offset.y + (y + h) / self.zoom + margin
+        )
+
+class TextCache:
+    """
+    LRU cache of rendered text surfaces keyed on (text, color, font size), so labels and chat lines
+    are only rendered again when they change
+
+    :param default_size: Font size used when none is given
+    :param max_entries: Number of surfaces kept before the least recently used one is dropped
+    """
+    def __init__(self, default_size : int = 30, max_entries : int = 4096):
+        self.default_size = default_size
+        self.max_entries = max_entries
+        self.fonts : Dict[int, pygame.font.Font] = {}
+        self.surfaces : OrderedDict = OrderedDict()
+        self.hits = 0
+        self.renders = 0
+
+    def font(self, size : int = None) -> pygame.font.Font:
+        size = size or self.default_size
+        if size not in self.fonts:
+            self.fonts[size] = pygame.font.Font(None, size)
+        return self.fonts[size]
+
+    def render(self, text : str, color, size : int = None) -> pygame.Surface:
+        key = (text, color, size or self.default_size)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        surface = self.font(size).render(text, True, color)
+        self.renders += 1
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last = False)
+        return surface
+
+class SquareButton:
+    def __init__(self, pos : Point, size : int, text : str, on_click : Callable, is_toggle : bool = False):
+        self.pos = pos
+        self.size = size
+        self.on = False
+        self.text = text
+        self.on_click = on_click
+        self.is_toggle = is_toggle
+    
+    def scan(self, mouse_pos : Point):
+        """
+        Check if mouse is in button boundaries
+        """
+        if (mouse_pos.x > self.pos.x and mouse_pos.x < (self.pos.x + self.size)) \
+            and (mouse_pos.y > self.pos.y and mouse_pos.y < (self.pos.y + self.size)):
+            print("Pressed")
+            return True
+        return False
+    
+    def draw(self, screen, font, text_cache : TextCache = None):
+        button_rect = pygame.Rect(self.pos.x, self.pos.y, self.size, self.size)
+        pygame.draw.rect(screen, (0, 0, 0), button_rect)
+        if self.on:
+            pygame.draw.rect(screen, (0, 255, 0), button_rect, 2)
+        else:
+            pygame.draw.rect(screen, (255, 255, 255), button_rect, 2)
+        
+        if text_cache is not None:
+            text_surface = text_cache.render(self.text, (255, 255, 255))
+        else:
+            text_surface = font.render(self.text, True, (255, 255, 255))
+        text_rect = text_surface.get_rect(center=(self.pos + Point(self.size // 2, self.size // 2)).astuple())   
+
+        screen.blit(text_surface, button_rect)
+    
+    def toggle(self):
+        """
+        Button will change color to indicate it is being pressed
+        """
+        if self.is_toggle:
+            self.on = not self.on
+    
+    def click(self):
+        self.toggle()
+        self.on_click()
+
+class ChatLog:
+    def __init__(self, font, max_messages=10, text_cache : TextCache = None):
+        self.font = font
+        self.text_cache = text_cache
+        self.max_messages = max_messages
+        self.messages = []
+        self.colors = []
+        self.n_dropped = 0 # Lines that have scrolled out of the log
+
+        # What changed since take_dirty was last called
+        self.lines_shifted = False
+        self.dirty_handles = set()
+
+    def log(self, message, color) -> int:
+        """
+        Add a line, returns a handle that can be used to update it later
+        """
+        self.messages.append(message)
+        self.colors.append(color)
+        if len(self.messages) > self.max_messages:
+            self.messages.pop(0)
+            self.colors.pop(0)
+            self.n_dropped += 1
+        self.lines_shifted = True
+        return self.n_dropped + len(self.messages) - 1
+
+    def update(self, handle : int, message):
+        """
+        Replace the text of a line previously added with log (no-op if it has scrolled out)
+        """
+        index = handle - self.n_dropped
+        if index >= 0:
+            self.messages[index] = message
+            self.dirty_handles.add(handle)
+
+    def take_dirty(self) -> Tuple[bool, set]:
+        """
+        Returns (whether lines were added, handles of lines edited in place) since the last call
+        """
+        dirty = (self.lines_shifted, self.dirty_handles)
+        self.lines_shifted = False
+        self.dirty_handles = set()
+        return dirty
+
+    def line_rect(self, handle : int, x, y, width) -> pygame.Rect:
+        """
+        Screen rect of a line when the log is drawn with its newest line at (x, y)
+        """
+        i = len(self.messages) - 1 - (handle - self.n_dropped)
+        height = self.font.get_height()
+        return pygame.Rect(0, y - i * height, x + width, height)
+
+    def draw(self, screen, x, y):
+        for i, (message, color) in enumerate(reversed(list(zip(self.messages, self.colors)))):
+            if self.text_cache is not None:
+                message_surface = self.text_cache.render(message, color)
+            else:
+                message_surface = self.font.render(message, True, color)
+            screen.blit(message_surface, (x, y - i * self.font.get_height()))
+
+class GraphExplorer:
+    FONT_SIZE = 30
+    NODE_SIZE = 60
+    EDGE_THICKNESS = 2
+    ARROW_LENGTH = 50
+    ARROW_THICKNESS = 10
+    BUTTON_SIZE  = 100
+    NODE_SPACING = 90
+
+    # Level of detail, in on screen node radius (pixels)
+    LABEL_MIN_RADIUS = 30 # Smaller nodes are drawn without labels or arrowheads
+    POINT_MAX_RADIUS = 4 # Smaller nodes are drawn as points
+    CLUSTER_MIN_NODES = 1500 # With this many visible unlabeled nodes, nearby nodes are merged into clusters
+    CLUSTER_PIXELS = 24 # Screen size of a cluster cell
+    MAX_CLUSTER_LINKS = 1500
+    ZOOM_STEP = 1.15
+
+    # Redrawing
+    MAX_FPS = 60
+    INDICATOR_PERIOD_MS = 333 # Pending indicator animation step
+
+    # Profiling overlay (F3)
+    HUD_PERIOD_MS = 500 # Overlay text refresh
+    HUD_FONT_SIZE = 18
+    HUD_LINES = 3
+    PHASES = ["frame.events", "frame.replies", "frame.layout", "frame.chat", "frame.edges", "frame.nodes", "frame.buttons", "frame.flip"]
+    CHAT_EVENT = pygame.USEREVENT + 1
+    TUTOR_FOCUS = 3 # Most concepts a Tutor question is treated as being about
+
+    # Automatic layout
+    LAYOUT_BUDGET_MS = 8 # Time spent on layout per frame, big steps are spread over several frames
+
+    # Saving
+    AUTOSAVE_SECONDS = 2 # Changes to a saved graph are appended to its journal this often
+
+    def __init__(self, graph: DirectedGraph = None, resolution : Tuple[int,int] = (1900, 1000)):
+        if graph is None:
+            self.graph = DirectedGraph()
+        else:
+            self.graph = graph
+
+        pygame.init()
+
+        self.width = resolution[0]
+        self.height = resolution[1]
+
+        os.makedirs("./saves", exist_ok = True)
+        self.store : GraphStore = None # Set once the graph is saved to or loaded from a .lgraph file
+        self.dialog_root = None # Hidden tkinter root of the file dialogs, made when the first one opens
+        self.last_autosave = time.time()
+
+        self.screen = pygame.display.set_mode((resolution[0], resolution[1]))
+        self.text_cache = TextCache(self.FONT_SIZE)
+        self.font = self.text_cache.font()
+        self.running = True
+
+        self.node_centers : Dict[int,Tuple[int,Point]] = {}
+        self.positions_version = 0 # Bumped whenever a node moves
+        self.spatial = SpatialGrid(cell_size = 2 * self.NODE_SIZE) # Index over node_centers
+        self.cluster_cache = None
+        self.node_moves : Dict[int, int] = {} # Per node move counter, invalidates cached edge geometry
+        self.edge_cache : Dict[Tuple[int, int], tuple] = {} # Edge -> (start moves, end moves, world geometry)
+        self.geometry_builds = 0
+        self.edge_layer : pygame.Surface = None # Edges near the viewport, drawn again only when edge_layer_key changes
+        self.edge_layer_key = None
+        self.edge_frame_key = None # Camera, graph and positions the edges were last drawn for
+        self.edge_layer_draws = 0
+        self.edge_draw_calls = 0
+        self.edge_layer_blits = 0
+        self.layout = None
+        self.layout_new = set() # Automatically placed nodes, they start hot in the layout
+        self.reset_layout()
+        self.initialize_node_centers()
+
+        button_x = self.width - self.BUTTON_SIZE
+        button_y = lambda i: (self.height - ((self.BUTTON_SIZE + 2) * i))
+
+        def make_btn(y, txt, clk : Callable, **kwargs):
+            return SquareButton(Point(button_x, y), self.BUTTON_SIZE, txt, clk, **kwargs)
+
+        self.buttons : Dict[str, SquareButton] = {
+            "move_mode" : make_btn(button_y(1), "Move", self.on_click_move_mode, is_toggle = True),
+            "save_button" : make_btn(button_y(2), "Save", self.on_click_save),
+            "load_button" : make_btn(button_y(3), "Load", self.on_click_load),
+            "tag_vertex" : make_btn(button_y(4), "Mark Learned", self.on_click_tag),
+            "from_file" : make_btn(button_y(5), "From File", self.on_click_file),
+            "layout" : make_btn(button_y(6), "Layout", self.on_click_layout, is_toggle = True)
+        }
+        self.buttons["layout"].on = self.layout is not None
+
+        # Window controls
+        self.camera = Camera(self.width, self.height)
+
+        # Redrawing, only happens after something invalidated (part of) the screen
+        self.full_redraw = True
+        self.dirty_rects = []
+        self.indicator_state = None
+        self.indicator_rect = None
+        self.show_hud = False
+        self.hud_text = []
+        self.hud_updated = 0.0
+        self.profiling_before_hud = PROFILER.enabled
+        self.chat_input = "" # Buffer for the chat
+
+        # Trackers
+        self.selected_node : int = None
+        self.dragging_start_pos : Point = None
+        self.dragging_screen_start : Point = None
+
+        # Modes
+        self.move_mode : bool = False # Moving node
+        self.dragging_mode : bool = False # Moving screen
+
+        # Chatbots
+        self.chat_log = ChatLog(self.font, 60, self.text_cache)
+        self.active_chatbot = "BaseChat"
+        self.chat_stack = [self.active_chatbot]
+
+        self.chatbot_prompts = { # Prompt of each chatbot, chatbots are made when first sent a message
+            "BaseChat" : "LearnAssist/prompts/basechat.txt",
+            "Tutor" : "LearnAssist/prompts/tutor.txt"
+        }
+        self.chatbots : Dict[str, BaseChatHarness] = {} # ChatHarness with names
+        self.chat_colors = { # names and associated colors
+            "User" : (255, 255, 255),
+            "BaseChat" : (0, 255, 0),
+            "System" : (127, 127, 127),
+            "Tutor" : (0, 127, 127)
+        }
+
+        # Chatbot calls run in the background, replies are picked up in the main loop.
+        # Workers post a CHAT_EVENT so an idle loop wakes up when there is something to show
+        self.wake_posted = threading.Event()
+        self.workers = ChatWorkerPool(notify = self.wake)
+        self.live_replies : Dict[int, list] = {} # Request id -> state of its streamed chat line
+
+        PROFILER.gauge("requests_in_flight", lambda: len(self.workers.in_flight()))
+        PROFILER.gauge("transport_queued", lambda: shared_transport(default_backend()).waiting)
+
+    # ==== REDRAWING ====
+    def invalidate(self, rect = None):
+        """
+        Request a redraw of a screen rect, or of the whole screen if rect is None
+        """
+        if rect is None:
+            self.full_redraw = True
+        else:
+            self.dirty_rects.append(pygame.Rect(rect))
+
+    def node_rect(self, id : int) -> pygame.Rect:
+        """
+        Screen rect covering a node and its halos
+        """
+        if id is None or id not in self.node_centers:
+            return None
+        pos = self.camera.to_screen(self.node_centers[id])
+        r = self.camera.scale(self.NODE_SIZE) + 6
+        return pygame.Rect(pos.x - r, pos.y - r, 2 * r + 1, 2 * r + 1)
+
+    def select_node(self, id : int):
+        if id != self.selected_node:
+            for rect in (self.node_rect(self.selected_node), self.node_rect(id)):
+                if rect is not None:
+                    self.invalidate(rect)
+        self.selected_node = id
+
+    def wake(self):
+        """
+        Called from worker threads, wakes the main loop (at most one wake event queued at a time)
+        """
+        if not self.wake_posted.is_set():
+            self.wake_posted.set()
+            pygame.event.post(pygame.event.Event(self.CHAT_EVENT))
+
+    def chat_rect(self) -> pygame.Rect:
+        return pygame.Rect(0, self.height - self.font.get_height(), self.width - self.BUTTON_SIZE, self.font.get_height())
+
+    def invalidate_chat(self):
+        """
+        New chat lines shift the whole log so they need a full redraw, an edited (streaming) line only its own row
+        """
+        shifted, handles = self.chat_log.take_dirty()
+        if shifted:
+            self.invalidate()
+        else:
+            for handle in handles:
+                self.invalidate(self.chat_log.line_rect(handle, 10, self.height - self.font.get_height() * 2, self.width - self.BUTTON_SIZE))
+
+    # ==== BUTTONS ====
+    def check_button_clicks(self, mouse_pos : Point):
+        for key in self.buttons:
+            if self.buttons[key].scan(mouse_pos):
+                return key
+
+    def on_click_move_mode(self):
+        self.move_mode = not self.move_mode
+
+    def ask_path(self, save : bool = False, **options) -> str:
+        """
+        Path picked in a native file dialog, empty if cancelled. tkinter is only loaded when the first dialog opens
+        """
+        import tkinter
+        from tkinter import filedialog
+
+        if self.dialog_root is None:
+            self.dialog_root = tkinter.Tk()
+            self.dialog_root.withdraw() # Hide the main window
+        ask = filedialog.asksaveasfilename if save else filedialog.askopenfilename
+        return ask(parent = self.dialog_root, **options)
+
+    def on_click_save(self):
+        file_path = self.ask_path(
+            save = True,
+            defaultextension=".lgraph",
+            filetypes=[("Graph files", "*.lgraph"), ("Old graph files", "*.graph")],
+            initialdir="./saves"
+        )
+
+        if not file_path:
+            return
+        if not file_path.endswith(".graph") and GraphStore is None:
+            self.receive_text("Saving .lgraph files needs numpy, save as .graph instead", "System")
+            return
+        if file_path.endswith(".graph"):
+            self.data = {
+                "graph" : self.graph,
+                "node_pos" : self.node_centers
+            }
+            import joblib # Only needed for old saves
+            joblib.dump(self.data, file_path)
+            return
+
+        if self.store is None or self.store.path != file_path:
+            if self.store is not None:
+                self.store.detach()
+            self.store = GraphStore(file_path)
+        self.store.save(self.graph, self.saved_positions())
+        self.last_autosave = time.time()
+
+    def on_click_load(self):
+        # Open a file dialog to select the load path
+        file_path = self.ask_path(
+            defaultextension=".lgraph",
+            filetypes=[("Graph files", "*.lgraph"), ("Old graph files", "*.graph")],
+            initialdir="./saves"
+        )
+
+        if file_path:
+            self.load(file_path)
+
+    def load(self, file_path : str):
+        if not file_path.endswith(".graph") and GraphStore is None:
+            self.receive_text("Loading .lgraph files needs numpy", "System")
+            return
+        if self.store is not None:
+            self.autosave(force = True)
+            self.store.detach()
+            self.store = None
+
+        if file_path.endswith(".graph"):
+            import joblib # Only needed for old saves
+            self.data = joblib.load(file_path)
+            self.graph = self.data["graph"]
+            self.node_centers = self.data["node_pos"]
+        else:
+            self.store, self.graph, positions = GraphStore.open(file_path)
+            self.node_centers = {id : Point(x, y) for id, (x, y) in positions.items()}
+        self.rebuild_spatial_index()
+        self.reset_layout() # Saved positions are kept, only new nodes get laid out
+        self.initialize_node_centers()
+
+    def saved_positions(self) -> Dict[int, Tuple[float, float]]:
+        return {id : (pos.x, pos.y) for id, pos in self.node_centers.items()}
+
+    def autosave(self, force : bool = False):
+        """
+        Append changes to the journal of the open save, compacting it into a new base file once it gets long
+        """
+        if self.store is None:
+            return
+        now = time.time()
+        if not force and now - self.last_autosave < self.AUTOSAVE_SECONDS:
+            return
+        self.last_autosave = now
+        if self.store.needs_compaction():
+            self.store.save(self.graph, self.saved_positions())
+        else:
+            self.store.flush()
+
+    def on_click_tag(self):
+        id = self.selected_node
+
+        if id is None or id == -1:
+            return
+        
+        self.graph.set_tagged(id, not self.graph.tagged_vertices[id])
+
+    def on_click_file(self):
+        # Open a file dialog to select the load path
+        file_path = self.ask_path(
+            defaultextension=".txt",
+            filetypes=[("Text files", "*.txt")],
+            initialdir="./saves/graph_builder"
+        )
+
+        if file_path:
+            report = self.graph.from_builder_file(file_path)
+            self.receive_text(report.summary(), "System")
+            if report.errors:
+                self.receive_text("; ".join([f"line {lineno}: {reason}" for lineno, _, reason in report.errors[:5]]), "System")
+
+        self.initialize_node_centers()
+
+    def on_click_layout(self):
+        if self.layout is None:
+            self.buttons["layout"].on = False
+            self.receive_text("Automatic layout needs numpy", "System")
+        elif self.buttons["layout"].on:
+            self.layout.sync(self.graph, self.node_centers)
+            self.layout.reheat()
+
+    # ==== LAYOUT ====
+    def reset_layout(self):
+        self.layout_new.clear()
+        if ForceLayout is not None:
+            self.layout = ForceLayout(spacing = 2 * self.NODE_SPACING)
+
+    def step_layout(self):
+        """
+        Run layout iterations for up to LAYOUT_BUDGET_MS and move the nodes they touched
+        """
+        if self.layout is None or not self.buttons["layout"].on:
+            return
+        self.layout.sync(self.graph, self.node_centers, self.layout_new)
+        self.layout_new.clear()
+
+        moved = self.layout.run(self.LAYOUT_BUDGET_MS)
+        for id in moved:
+            self.set_node_center(id, Point(*self.layout.position(id)))
+        if moved:
+            self.invalidate()
+
+    def pin_node(self, id : int):
+        """
+        Keep a node where the user put it, its neighbours settle around it
+        """
+        if self.layout is not None and id in self.layout.index:
+            pos = self.node_centers[id]
+            self.layout.set_position(id, pos.x, pos.y, pin = True)
+            self.layout.warm([id], neighbours = self.graph)
+
+    # ==== BASE GAME FUNCTIONS ====
+    def set_node_center(self, id : int, pos : Point):
+        """
+        Move (or place) a node, keeping the spatial index in sync
+        """
+        self.node_centers[id] = pos
+        self.spatial.insert(id, pos.x, pos.y)
+        if self.store is not None:
+            self.store.move(id, pos.x, pos.y)
+        self.positions_version += 1
+        self.node_moves[id] = self.node_moves.get(id, 0) + 1
+
+    def delete_node(self, id : int):
+        """
+        Remove a node from the graph along with its position and cached edges
+        """
+        self.forget_node(self.graph.remove_node(id))
+
+    def merge_nodes(self, keep : int, drop : int):
+        """
+        Merge node drop into node keep (see DirectedGraph.merge_nodes). keep takes drop's place if it had none
+        """
+        if keep not in self.node_centers and drop in self.node_centers:
+            self.set_node_center(keep, self.node_centers[drop])
+        node = self.graph.V[drop]
+        self.graph.merge_nodes(keep, drop)
+        self.forget_node(node)
+
+    def forget_node(self, node : Node):
+        """
+        Drop the position and cached edges of a node removed from the graph
+        """
+        id = node.id
+        for nbr_id in node.forward_neighbors:
+            self.edge_cache.pop((id, nbr_id), None)
+        for nbr_id in node.backward_neighbors:
+            self.edge_cache.pop((nbr_id, id), None)
+
+        self.node_centers.pop(id, None)
+        self.node_moves.pop(id, None)
+        self.spatial.remove(id)
+        self.positions_version += 1
+        if self.selected_node == id:
+            self.selected_node = None
+        self.invalidate()
+
+    def rebuild_spatial_index(self):
+        self.positions_version += 1
+        self.edge_cache.clear()
+        self.spatial.clear()
+        for id, pos in self.node_centers.items():
+            self.spatial.insert(id, pos.x, pos.y)
+
+    def free_position(self, bounds : Tuple[int, int, int, int]) -> Point:
+        """
+        Free spot for a new node inside bounds (min_x, min_y, max_x, max_y), growing the region if it is full
+        """
+        x, y = self.spatial.find_free_position(bounds, self.NODE_SPACING)
+        return Point(round(x), round(y))
+
+    def initialize_node_centers(self):
+        """
+        Initializes starting positions of nodes that don't have one yet
+        """
+        # Default 1500x1500 box, grown up front for big graphs so most samples land on free space
+        side = max(1500, int(3 * self.NODE_SPACING * len(self.graph.V) ** 0.5))
+        bounds = (-500, -500, side - 500, side - 500)
+
+        for node_id in self.graph.V:
+            if node_id not in self.node_centers:
+                self.set_node_center(node_id, self.free_position(bounds))
+                self.layout_new.add(node_id)
+
+    def edge_geometry(self, id_start : int, id_end : int) -> tuple:
+        """
+        World space geometry of an edge arrow: (start x, start y, end x, end y, mid x, mid y, head 1 x, head 1 y,
+        head 2 x, head 2 y). Cached until one of the endpoints moves
+        """
+        moves_start = self.node_moves.get(id_start, 0)
+        moves_end = self.node_moves.get(id_end, 0)
+        entry = self.edge_cache.get((id_start, id_end))
+        if entry is not None and entry[0] == moves_start and entry[1] == moves_end:
+            return entry[2]
+
+        start = self.node_centers[id_start]
+        end = self.node_centers[id_end]
+
+        # Calculate the angle of the line
+        angle = math.atan2(end.y - start.y, end.x - start.x)
+
+        # Arrowhead size
+        arrowhead_length = self.ARROW_LENGTH
+        arrowhead_angle = math.pi / 6
+
+        mid_x, mid_y = (start.x + end.x) / 2, (start.y + end.y) / 2
+
+        # Calculate the positions of the two arrowhead lines
+        geometry = (
+            start.x, start.y, end.x, end.y, mid_x, mid_y,
+            mid_x - arrowhead_length * math.cos(angle + arrowhead_angle),
+            mid_y - arrowhead_length * math.sin(angle + arrowhead_angle),
+            mid_x - arrowhead_length * math.cos(angle - arrowhead_angle),
+            mid_y - arrowhead_length * math.sin(angle - arrowhead_angle)
+        )
+        self.edge_cache[(id_start, id_end)] = (moves_start, moves_end, geometry)
+        self.geometry_builds += 1
+        return geometry
+
+    def draw_edges(self, edges : Iterable[Tuple[int, int]], with_head : bool = True, surface : pygame.Surface = None):
+        """
+        Draw directed arrows for edges onto surface (the screen if not given). Geometry comes from the edge cache,
+        so a frame only applies the camera transform (no trig or Point allocations), and each arrowhead is a single polyline
+        """
+        zoom = self.camera.zoom
+        off_x, off_y = self.camera.offset.x, self.camera.offset.y
+        thickness = max(1, round(zoom * self.EDGE_THICKNESS))
+        head_thickness = max(1, round(zoom * self.ARROW_THICKNESS))
+        color = (255, 255, 255)
+        screen = self.screen if surface is None else surface
+        line = pygame.draw.line
+        lines = pygame.draw.lines
+        geometry = self.edge_geometry
+
+        for id_start, id_end in edges:
+            g = geometry(id_start, id_end)
+            line(screen, color, ((g[0] - off_x) * zoom, (g[1] - off_y) * zoom), ((g[2] - off_x) * zoom, (g[3] - off_y) * zoom), thickness)
+            if with_head:
+                lines(screen, color, False, (
+                    ((g[6] - off_x) * zoom, (g[7] - off_y) * zoom),
+                    ((g[4] - off_x) * zoom, (g[5] - off_y) * zoom),
+                    ((g[8] - off_x) * zoom, (g[9] - off_y) * zoom)
+                ), head_thickness)
+                self.edge_draw_calls += 1
+            self.edge_draw_calls += 1
+
+    def near_edges(self, area = None) -> List[Tuple[int, int]]:
+        """
+        Edges with either end near the viewport (or the area screen rect), so ones crossing into view are kept. Each is listed once
+        """
+        w, h = self.camera.width / self.camera.zoom, self.camera.height / self.camera.zoom
+        near = set(self.visible_nodes(max(w, h) / 4, area))
+        edges = []
+        for id in near:
+            node = self.graph.V[id]
+            edges.extend([(id, nbr_id) for nbr_id in node.forward_neighbors])
+            edges.extend([(nbr_id, id) for nbr_id in node.backward_neighbors if nbr_id not in near])
+        return edges
+
+    def draw_edge_layer(self, area = None, with_head : bool = True):
+        """
+        Draw the edges near the viewport (or the area screen rect). pygame can't draw many separate segments in one call,
+        so once the camera, the graph and node positions hold still for a frame the edges are drawn onto the edge layer,
+        and later frames blit it instead of making two draw calls per edge. While they keep changing (panning, zooming,
+        layout) edges are drawn straight to the screen, so a moving view doesn't pay for the layer too
+        """
+        key = (self.graph.version, self.positions_version, self.camera.offset.x, self.camera.offset.y, self.camera.zoom, with_head)
+        last_key, self.edge_frame_key = self.edge_frame_key, key
+        if key != self.edge_layer_key and key != last_key:
+            self.draw_edges(self.near_edges(area), with_head)
+            return
+
+        size = self.screen.get_size()
+        if self.edge_layer is None or self.edge_layer.get_size() != size:
+            self.edge_layer = pygame.Surface(size).convert()
+            self.edge_layer.set_colorkey((0, 0, 0)) # Only the edges cover what is already drawn
+            self.edge_layer_key = None
+        if key != self.edge_layer_key:
+            self.edge_layer.fill((0, 0, 0))
+            self.draw_edges(self.near_edges(), with_head, self.edge_layer)
+            self.edge_layer_key = key
+            self.edge_layer_draws += 1
+
+        if area is None:
+            self.screen.blit(self.edge_layer, (0, 0))
+        else:
+            area = pygame.Rect(area)
+            self.screen.blit(self.edge_layer, area.topleft, area)
+        self.edge_layer_blits += 1
+
+    def node_color(self, id : int):
+        if self.selected_node == id:
+            return (0, 0, 255)
+        if self.graph.tagged_vertices[id]:
+            return (0, 255, 0)
+        return (255, 255, 255)
+
+    def draw_node(self, pos: Point, text: str, id : int, with_label : bool = True):
+        """
+        Draw a node given its position, text on it, and its id
+        """
+        pos = self.camera.to_screen(pos)
+        radius = self.camera.scale(self.NODE_SIZE)
+
+        # Blue halo if it's selected 
+        if self.selected_node == id: 
+            pygame.draw.circle(self.screen, (0, 0, 255), pos.astuple(), radius + 5)
+        
+        # Green halo if it's learned concept
+        if self.graph.tagged_vertices[id]:
+            pygame.draw.circle(self.screen, (0, 255, 0), pos.astuple(), radius + 2)
+
+        pygame.draw.circle(self.screen, (255, 255, 255), pos.astuple(), radius)
+
+        if with_label:
+            text_surface = self.text_cache.render(text, (0, 0, 0))
+            text_rect = text_surface.get_rect(center=pos.astuple())
+            self.screen.blit(text_surface, text_rect)
+
+    def draw_point(self, pos : Point, id : int):
+        """
+        Lowest detail node: a small square
+        """
+        pos = self.camera.to_screen(pos)
+        self.screen.fill(self.node_color(id), (pos.x - 1, pos.y - 1, 3, 3))
+
+    def build_clusters(self, cell : float):
+        """
+        Group nodes into world space cells of size cell. Returns {cell : [count, mean x, mean y, any tagged]}
+        and the links between cells as (weight, cell a, cell b), heaviest first.
+        Cached until the cell size, the graph or a node position changes
+        """
+        key = (cell, self.graph.version, self.positions_version)
+        if self.cluster_cache is not None and self.cluster_cache[0] == key:
+            return self.cluster_cache[1]
+
+        node_cell = {}
+        clusters = {}
+        for id, pos in self.node_centers.items():
+            c_key = (int(pos.x // cell), int(pos.y // cell))
+            node_cell[id] = c_key
+            c = clusters.get(c_key)
+            if c is None:
+                c = clusters[c_key] = [0, 0.0, 0.0, False]
+            c[0] += 1
+            c[1] += pos.x
+            c[2] += pos.y
+            c[3] = c[3] or self.graph.tagged_vertices[id]
+        for c in clusters.values():
+            c[1] /= c[0]
+            c[2] /= c[0]
+
+        weights = {}
+        for a, b in self.graph.E:
+            a, b = node_cell[a], node_cell[b]
+            if a != b:
+                weights[(a, b)] = weights.get((a, b), 0) + 1
+        links = sorted(((w, a, b) for (a, b), w in weights.items()), reverse = True)
+
+        self.cluster_cache = (key, (clusters, links))
+        return clusters, links
+
+    def draw_clusters(self):
+        """
+        Zoomed far out: nodes in the same cell (about CLUSTER_PIXELS on screen) are drawn as one dot sized
+        by how many it holds, with one line per pair of connected cells (at most MAX_CLUSTER_LINKS, heaviest first).
+        Cells are powers of two in world units so panning and small zoom changes reuse the clustering
+        """
+        cell = 2 ** math.ceil(math.log2(self.CLUSTER_PIXELS / self.camera.zoom))
+        clusters, links = self.build_clusters(cell)
+
+        min_x, min_y, max_x, max_y = self.camera.viewport(cell)
+        def on_screen(c):
+            return min_x <= c[1] <= max_x and min_y <= c[2] <= max_y
+
+        to_screen = self.camera.to_screen
+        n_links = 0
+        for w, a, b in links:
+            ca, cb = clusters[a], clusters[b]
+            if on_screen(ca) or on_screen(cb):
+                pa, pb = to_screen(Point(ca[1], ca[2])), to_screen(Point(cb[1], cb[2]))
+                pygame.draw.line(self.screen, (90, 90, 90), pa.astuple(), pb.astuple(), 1)
+                n_links += 1
+                if n_links >= self.MAX_CLUSTER_LINKS:
+                    break
+
+        max_radius = self.CLUSTER_PIXELS // 2
+        for c in clusters.values():
+            if on_screen(c):
+                radius = min(max_radius, 2 + int(math.log2(c[0] + 1) * 2))
+                color = (0, 255, 0) if c[3] else (255, 255, 255)
+                pygame.draw.circle(self.screen, color, to_screen(Point(c[1], c[2])).astuple(), radius)
+
+    def visible_nodes(self, margin : float = 0, area = None):
+        """
+        Ids of nodes within margin world units of the viewport, or of the area screen rect (node radius is always included)
+        """
+        return self.spatial.query_rect(*self.camera.viewport(self.NODE_SIZE + margin, area))
+
+    def draw_graph(self, area = None):
+        """
+        Draw only what is on screen (or inside the area screen rect), with less detail the further out we are zoomed
+        """
+        radius = self.camera.scale(self.NODE_SIZE)
+        visible = self.visible_nodes()
+        if area is not None and not (radius < self.LABEL_MIN_RADIUS and len(visible) >= self.CLUSTER_MIN_NODES):
+            visible = self.visible_nodes(area = area)
+
+        if radius < self.LABEL_MIN_RADIUS and len(visible) >= self.CLUSTER_MIN_NODES:
+            with PROFILER.time("frame.nodes"):
+                self.draw_clusters()
+            return
+
+        with PROFILER.time("frame.edges"):
+            self.draw_edge_layer(area, with_head = radius >= self.LABEL_MIN_RADIUS)
+
+        with PROFILER.time("frame.nodes"):
+            if radius < self.POINT_MAX_RADIUS:
+                for id in visible:
+                    self.draw_point(self.node_centers[id], id)
+            else:
+                with_label = radius >= self.LABEL_MIN_RADIUS
+                for id in visible:
+                    self.draw_node(self.node_centers[id], self.graph.V[id].display_text, id, with_label)
+
+    def render_stats(self) -> Dict[str, int]:
+        """
+        Counters for the render caches. Diff two snapshots to get the work done per frame
+        """
+        return {
+            "text_renders" : self.text_cache.renders,
+            "text_hits" : self.text_cache.hits,
+            "text_cached" : len(self.text_cache.surfaces),
+            "edge_geometry_builds" : self.geometry_builds,
+            "edge_geometry_cached" : len(self.edge_cache),
+            "edge_draw_calls" : self.edge_draw_calls,
+            "edge_layer_draws" : self.edge_layer_draws,
+            "edge_layer_blits" : self.edge_layer_blits
+        }
+
+    def mouse_on_node(self, pos : Point):
+        """
+        Check if mouse_pos (in pos argument) is currently inside a node. If yes,
+        returns id of corresponding node, otherwise returns -1
+        """
+        # Screen to world coordinates, then look only at nearby grid cells
+        pos = self.camera.to_world(pos)
+        return self.spatial.nearest(pos.x, pos.y, self.NODE_SIZE)
+
+    # ==== CHAT RELATED ===
+    def parse_ids(self, params : List[str], n : int) -> List[Optional[int]]:
+        """
+        The first n command parameters as node IDs. All None if there are fewer or one isn't a number,
+        which no node has, so commands answer as they do for IDs missing from the graph
+        """
+        try:
+            return [int(params[i]) for i in range(n)]
+        except (ValueError, IndexError):
+            return [None] * n
+
+    def handle_commands(self, message : str, source : str):
+        """
+        Handles any and all commands. Returns True if a command was executed and false otherwise.
+        """
+        ind = message.find("/")
+        if ind != -1:
+            message = message[ind:]
+            if source == "BaseChat":
+                n_ind = message.find("\n")
+                quote_ind = message.find("\"")
+                if n_ind != -1:
+                    message = message[:n_ind]
+                elif quote_ind != -1:
+                    message = message[:quote_ind]
+            
+            if not message[1:].split():
+                return False
+            command = message[1:].split()[0]
+            msg = " ".join(message[1:].split()[1:])
+            params = msg.split(",")
+
+            if command == "help":
+                self.request_reply("BaseChat", msg, {"GRAPH" : self.graph.to_compact_str()})
+            
+            if command == "addnode":
+                concept = params[0]
+                new_id = self.graph.add_node(text = concept)
+                merged = merge_duplicates(self.graph, [new_id], merge = self.merge_nodes) if merge_duplicates is not None else {}
+                if new_id in merged:
+                    existing = merged[new_id]
+                    self.receive_text(f"'{concept}' is already in the graph as ID {existing} ({self.graph.V[existing].display_text})", "System")
+                    return True
+
+                center = self.camera.to_world(Point(self.width // 2, self.height // 2))
+                reach = self.NODE_SPACING
+                self.set_node_center(new_id, self.free_position((center.x - reach, center.y - reach, center.x + reach, center.y + reach)))
+                self.layout_new.add(new_id)
+
+                self.receive_text(f"Added node with ID {new_id} for concept '{concept}'", "System")
+
+            elif command == "addedge":
+                id1, id2 = self.parse_ids(params, 2)
+                if id1 not in self.graph.V or id2 not in self.graph.V:
+                    self.receive_text("Invalid node IDs provided", "System")
+                elif self.graph.add_edge(id1, id2):
+                    self.receive_text(f"Added edge from ID {id1} to ID {id2}", "System")
+                else:
+                    self.receive_text(f"Edge from ID {id1} to ID {id2} already exists", "System")
+
+            elif command == "searchid":
+                matches = self.graph.names.search(msg, k = 5)
+                if matches:
+                    found = ", ".join([f"{id} ({self.graph.V[id].display_text})" for id, _ in matches])
+                    self.receive_text(f"Closest matches for '{msg}': {found}", "System")
+                else:
+                    self.receive_text(f"No node matches '{msg}'", "System")
+
+            elif command == "rename":
+                id, concept = self.parse_ids(params, 1)[0], ",".join(params[1:]).strip()
+                if id in self.graph.V and concept:
+                    self.graph.rename_node(id, concept)
+                    self.invalidate()
+                    self.receive_text(f"Renamed node with ID {id} to '{concept}'", "System")
+                else:
+                    self.receive_text("Invalid node ID or name provided", "System")
+
+            elif command == "delnode":
+                id = self.parse_ids(params, 1)[0]
+                if id in self.graph.V:
+                    concept = self.graph.V[id].display_text
+                    self.delete_node(id)
+                    self.receive_text(f"Deleted node with ID {id} for concept '{concept}'", "System")
+                else:
+                    self.receive_text("Invalid node ID provided", "System")
+
+            elif command == "merge":
+                keep, drop = self.parse_ids(params, 2)
+                if keep in self.graph.V and drop in self.graph.V and keep != drop:
+                    self.merge_nodes(keep, drop)
+                    self.receive_text(f"Merged node with ID {drop} into ID {keep}", "System")
+                else:
+                    self.receive_text("Invalid node IDs provided", "System")
+
+            elif command == "dedupe":
+                if merge_duplicates is None:
+                    self.receive_text("Finding duplicates needs numpy", "System")
+                else:
+                    merged = merge_duplicates(self.graph, merge = self.merge_nodes)
+                    self.receive_text(f"Merged {len(merged)} near duplicate nodes", "System")
+
+            elif command == "deledge":
+                id1, id2 = self.parse_ids(params, 2)
+                if id1 in self.graph.V and id2 in self.graph.V and self.graph.remove_edge(id1, id2):
+                    self.edge_cache.pop((id1, id2), None)
+                    self.invalidate()
+                    self.receive_text(f"Deleted edge from ID {id1} to ID {id2}", "System")
+                else:
+                    self.receive_text("No edge between the IDs provided", "System")
+            return True
+        return False
+
+    def receive_text(self, message : str, source : str):
+        """
+        Receive text from any source
+        """
+
+        assert source in self.chat_colors, "Not a valid source for message"
+
+        def log(message, source):
+            self.chat_log.log(f"{source}: {message}", self.chat_colors[source])
+        
+        if message.find("\n") != -1:
+            for line in message.split("\n"):
+                log(line, source)
+        else:
+            log(message, source)
+
+        if source in ["User", "BaseChat"]: # Only user and base chat can do commands
+            if not self.handle_commands(message, source):
+                # If the message was not a command
+                self.ask_tutor(message)
+
+    def ask_tutor(self, message : str):
+        """
+        Ask the Tutor about message. Rather than every learned concept, the Tutor is sent the ones that lead to
+        the selected node and the concepts named in the message, with the prerequisite path to each
+        """
+        focus = [self.selected_node] if self.selected_node in self.graph.V else []
+        focus = list(dict.fromkeys(focus + self.graph.names.mentions(message)))[:self.TUTOR_FOCUS]
+        self.request_reply("Tutor", message, tutor_context(self.graph, focus))
+
+    def chatbot(self, name : str) -> BaseChatHarness:
+        """
+        The chatbot called name, reading its prompt and making it on first use
+        """
+        harness = self.chatbots.get(name)
+        if harness is None:
+            harness = self.chatbots[name] = BaseChatHarness(self.chatbot_prompts[name])
+        return harness
+
+    def request_reply(self, chatbot : str, message : str, decorations : Dict[str, str] = None, stream : bool = True):
+        """
+        Send message to a chatbot without blocking. Streamed text is shown as it arrives, otherwise
+        the reply is fed to receive_text once it is complete.
+        A newer request to the same chatbot supersedes one that is still pending.
+        """
+        request = self.workers.submit(chatbot, self.chatbot(chatbot), message, decorations, stream = stream)
+        if stream:
+            # [chat log handle, text of the line being streamed, whether a command was run, source]
+            self.live_replies[request.id] = [self.chat_log.log(f"{chatbot}: ", self.chat_colors[chatbot]), "", False, chatbot]
+
+    def receive_delta(self, request, delta : str):
+        """
+        Append streamed text to the live chat line. Completed lines from BaseChat are checked for
+        commands straight away instead of waiting for the whole reply
+        """
+        live = self.live_replies[request.id]
+        color = self.chat_colors[request.source]
+
+        lines = delta.split("\n")
+        for i, piece in enumerate(lines):
+            live[1] += piece
+            self.chat_log.update(live[0], f"{request.source}: {live[1]}")
+            if i < len(lines) - 1: # Line is complete
+                if request.source == "BaseChat" and live[1].find("/") != -1:
+                    live[2] = self.handle_commands(live[1], request.source) or live[2]
+                live[0] = self.chat_log.log(f"{request.source}: ", color)
+                live[1] = ""
+
+    def finish_stream(self, request, reply):
+        live = self.live_replies.pop(request.id)
+        if request.source == "BaseChat":
+            if live[1].find("/") != -1:
+                live[2] = self.handle_commands(live[1], request.source) or live[2]
+            if not live[2]:
+                self.ask_tutor(reply)
+
+    def collect_replies(self):
+        """
+        Feed chatbot output back on the main thread. Streamed deltas go to the live chat line,
+        complete replies go through receive_text (and so handle_commands)
+        """
+        for request, delta in self.workers.poll_deltas():
+            self.receive_delta(request, delta)
+
+        for request in self.workers.poll():
+            try:
+                reply = request.result()
+            except Exception as e:
+                self.live_replies.pop(request.id, None)
+                self.receive_text(f"{request.source} request failed : {e}", "System")
+                continue
+
+            if request.stream:
+                for delta in request.drain():
+                    self.receive_delta(request, delta)
+                self.finish_stream(request, reply)
+            else:
+                self.receive_text(reply, request.source)
+
+        # Drop live lines of requests that were cancelled or superseded
+        for request_id in set(self.live_replies) - {r.id for r in self.workers.pending if not r.cancelled}:
+            live = self.live_replies.pop(request_id)
+            self.chat_log.update(live[0], f"{live[3]}: {live[1]} [cancelled]")
+
+    def draw_pending_indicator(self):
+        """
+        Show which chatbots are still working on a reply
+        """
+        sources = self.workers.in_flight()
+        if not sources:
+            return
+        dots = "." * (1 + int(time.time() * 3) % 3)
+        text = f"{', '.join(sorted(set(sources)))} thinking{dots} (Esc to cancel)"
+        surface = self.text_cache.render(text, self.chat_colors["System"])
+        self.indicator_rect = self.screen.blit(surface, (10, 10))
+
+    def handle_event(self, event):
+        if event.type == pygame.QUIT:
+            self.running = False
+
+        elif event.type == self.CHAT_EVENT:
+            self.wake_posted.clear()
+
+        # Chatbox controls
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                if self.workers.cancel():
+                    self.receive_text("Cancelled pending requests", "System")
+            elif event.key == pygame.K_F3:
+                self.toggle_hud()
+            elif event.key == pygame.K_RETURN:
+                self.receive_text(self.chat_input, "User")
+                self.chat_input = ""
+            elif event.key == pygame.K_BACKSPACE:
+                self.chat_input = self.chat_input[:-1]
+            else:
+                self.chat_input += event.unicode
+            self.invalidate(self.chat_rect())
+
+        # Graph controls
+        elif event.type == pygame.MOUSEWHEEL:
+            self.camera.zoom_at(self.ZOOM_STEP ** event.y, Point(*pygame.mouse.get_pos()))
+            self.invalidate()
+
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button in (1, 2, 3): # Wheel is handled above
+            mouse_pos = Point(*pygame.mouse.get_pos())
+            # First check for button presses
+            button_pressed = self.check_button_clicks(mouse_pos)
+            if button_pressed:
+                self.buttons[button_pressed].click()
+                self.invalidate()
+            else:
+                mouse_node = self.mouse_on_node(mouse_pos) # -1 if no node, otherwise has an id
+                if mouse_node == -1:
+                    self.dragging_mode = True
+                    self.dragging_start_pos = mouse_pos
+                    self.dragging_screen_start = self.camera.offset
+                elif self.move_mode:
+                    if mouse_node != -1:
+                        self.select_node(mouse_node)
+                        self.dragging_start_pos = mouse_pos
+                    else:
+                        self.select_node(None)
+                else: # Select node
+                    self.select_node(mouse_node)
+
+        elif event.type == pygame.MOUSEMOTION:
+            if self.move_mode:
+                if self.selected_node is not None and self.dragging_start_pos is not None:
+                    mouse_pos = Point(*pygame.mouse.get_pos())
+                    delta = mouse_pos - self.dragging_start_pos
+                    delta = Point(delta.x / self.camera.zoom, delta.y / self.camera.zoom)
+                    self.set_node_center(self.selected_node, self.node_centers[self.selected_node] + delta)
+                    self.pin_node(self.selected_node)
+                    self.dragging_start_pos = mouse_pos
+                    self.invalidate()
+
+            # Screen moving
+            if self.dragging_mode:
+                delta = self.dragging_start_pos - Point(*pygame.mouse.get_pos())
+                self.camera.offset = self.dragging_screen_start + Point(delta.x / self.camera.zoom, delta.y / self.camera.zoom)
+                self.invalidate()
+
+        elif event.type == pygame.MOUSEBUTTONUP:
+            if self.dragging_mode:
+                self.dragging_mode = False
+            if self.move_mode:
+                if self.selected_node is not None:
+                    self.select_node(None)
+                    self.dragging_start_pos = None
+
+    def next_events(self):
+        """
+        Events to handle this iteration. With nothing to redraw, block until an event arrives
+        (or the pending indicator or the profiling overlay needs its next update) so an idle window uses no CPU
+        """
+        if not (self.full_redraw or self.dirty_rects):
+            if self.show_hud:
+                event = pygame.event.wait(self.HUD_PERIOD_MS)
+            elif self.workers.in_flight():
+                event = pygame.event.wait(self.INDICATOR_PERIOD_MS)
+            else:
+                event = pygame.event.wait()
+            if event.type != pygame.NOEVENT:
+                return [event] + pygame.event.get()
+        return pygame.event.get()
+
+    def update_indicator(self):
+        """
+        Invalidate the pending indicator when its text changes (including its animation)
+        """
+        sources = self.workers.in_flight()
+        state = (tuple(sorted(set(sources))), int(time.time() * 3) % 3) if sources else None
+        if state != self.indicator_state:
+            self.indicator_state = state
+            if self.indicator_rect is not None:
+                self.invalidate(self.indicator_rect)
+                self.indicator_rect = None
+            if state is not None:
+                self.invalidate((0, 0, self.width - self.BUTTON_SIZE, 10 + self.font.get_height()))
+
+    # ==== PROFILING ====
+    def toggle_hud(self):
+        """
+        Show or hide the profiling overlay. Profiling runs while it is shown (or if it was already enabled)
+        """
+        self.show_hud = not self.show_hud
+        if self.show_hud:
+            self.profiling_before_hud = PROFILER.enabled
+            if not self.profiling_before_hud:
+                PROFILER.reset() # Start from a clean slate, unless profiling (and maybe an exporter) was already counting
+            PROFILER.enabled = True
+        else:
+            PROFILER.enabled = self.profiling_before_hud
+            self.hud_text = []
+        self.invalidate(self.hud_rect())
+
+    def hud_rect(self) -> pygame.Rect:
+        line_height = self.text_cache.font(self.HUD_FONT_SIZE).get_height()
+        return pygame.Rect(0, 10 + self.font.get_height(), self.width - self.BUTTON_SIZE, line_height * self.HUD_LINES)
+
+    def update_hud(self):
+        """
+        Refresh the overlay text every HUD_PERIOD_MS, invalidating it when it changed
+        """
+        if not self.show_hud or (time.time() - self.hud_updated) * 1e3 < self.HUD_PERIOD_MS:
+            return
+        self.hud_updated = time.time()
+        text = PROFILER.hud_lines(self.PHASES)
+        if text != self.hud_text:
+            self.hud_text = text
+            self.invalidate(self.hud_rect())
+
+    def draw_hud(self):
+        if not self.show_hud:
+            return
+        rect = self.hud_rect()
+        line_height = rect.height // self.HUD_LINES
+        for i, line in enumerate(self.hud_text[:self.HUD_LINES]):
+            surface = self.text_cache.render(line, (255, 255, 0), self.HUD_FONT_SIZE)
+            self.screen.blit(surface, (10, rect.y + i * line_height))
+
+    def draw_frame(self, area = None):
+        self.screen.fill((0, 0, 0), area)
+
+        # Chat box surface
+        with PROFILER.time("frame.chat"):
+            chat_surface = self.text_cache.render(self.chat_input, (255, 255, 255))
+            self.screen.blit(chat_surface, (10, self.height - self.font.get_height()))
+            self.chat_log.draw(self.screen, 10, self.height - self.font.get_height() * 2)
+
+        # Edges with arrows and nodes with text, culled to the viewport
+        self.draw_graph(area)
+
+        # Buttons
+        with PROFILER.time("frame.buttons"):
+            for key in self.buttons:
+                self.buttons[key].draw(self.screen, self.font, self.text_cache)
+
+        self.draw_pending_indicator()
+        self.draw_hud()
+
+    def render(self):
+        """
+        Redraw what was invalidated. Small changes only redraw (and push to the display) their dirty rects
+        """
+        screen_area = self.width * self.height
+        rects = [rect.clip(self.screen.get_rect()) for rect in self.dirty_rects]
+        if not self.full_redraw and sum(r.width * r.height for r in rects) > screen_area // 2:
+            self.full_redraw = True
+
+        if self.full_redraw:
+            self.draw_frame()
+            with PROFILER.time("frame.flip"):
+                pygame.display.flip()
+        elif rects:
+            for rect in rects:
+                self.screen.set_clip(rect)
+                self.draw_frame(rect)
+            self.screen.set_clip(None)
+            with PROFILER.time("frame.flip"):
+                pygame.display.update(rects)
+
+        self.full_redraw = False
+        self.dirty_rects = []
+
+    def run(self):
+        self.clock = pygame.time.Clock()
+        self.invalidate()
+
+        while self.running:
+            events = self.next_events() # Not timed, it blocks while idle
+            with PROFILER.time("frame.events"):
+                for event in events:
+                    self.handle_event(event)
+
+            with PROFILER.time("frame.replies"):
+                self.collect_replies()
+            with PROFILER.time("frame.layout"):
+                self.step_layout()
+            self.autosave()
+            self.invalidate_chat()
+            self.update_indicator()
+            self.update_hud()
+
+            self.render()
+            PROFILER.frame()
+            self.clock.tick(self.MAX_FPS)
+
+        self.workers.shutdown()
+        self.autosave(force = True)
+        pygame.quit()
+
+# Example usage
+if __name__ == "__main__":
+    graph = DirectedGraph()
+    #graph.add_node(0, "A", [1])
+    #graph.add_node(1, "B", [2])
+    #graph.add_node(2, "C", [])
+
+    # Headless metrics, e.g. LEARNASSIST_METRICS=saves/metrics.prom (Prometheus text) or saves/metrics.jsonl
+    exporter = MetricsExporter(os.environ["LEARNASSIST_METRICS"]).start() if os.environ.get("LEARNASSIST_METRICS") else None
+
+    explorer = GraphExplorer(graph)
+    explorer.run()
+    if exporter is not None:
+        exporter.stop()
+        
+
@@ -0,0 +1,516 @@
+from typing import Iterable, Iterator, List, Optional, Tuple, Dict, Callable
+from array import array
+
+from LearnAssist.name_index import NameIndex
+from LearnAssist.builder import BuilderReport, load_commands
+from LearnAssist.reachability import ReachabilityIndex
+
+EMPTY = () # Neighbor list shared by every node without edges, replaced by a real list on the first edge
+
+class Node:
+    """
+    Vertex of a DirectedGraph. Uses __slots__, and nodes without edges share one empty tuple
+    instead of holding two empty lists, so large graphs stay small in memory
+    """
+    __slots__ = ("id", "forward_neighbors", "backward_neighbors", "display_text")
+
+    def __init__(self, id : int, forward_neighbors : Iterable[int] = EMPTY, backward_neighbors : Iterable[int] = EMPTY, display_text : str = ""):
+        self.id = id
+        self.forward_neighbors = list(forward_neighbors) or EMPTY
+        self.backward_neighbors = list(backward_neighbors) or EMPTY
+        self.display_text = display_text
+
+    def __repr__(self):
+        return f"Node(id={self.id}, forward_neighbors={list(self.forward_neighbors)}, backward_neighbors={list(self.backward_neighbors)}, display_text={self.display_text!r})"
+
+    def __getstate__(self):
+        return {slot : getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        # Also takes the __dict__ of nodes pickled before Node had slots
+        for slot in self.__slots__:
+            setattr(self, slot, state[slot])
+
+    def link(self, attr : str, id : int):
+        neighbors = getattr(self, attr)
+        if neighbors is EMPTY:
+            setattr(self, attr, [id])
+        else:
+            neighbors.append(id)
+
+    def unlink(self, attr : str, id : int):
+        neighbors = getattr(self, attr)
+        neighbors.remove(id)
+        if not neighbors:
+            setattr(self, attr, EMPTY)
+
+class EdgeSet:
+    """
+    Set of (start, end) edges, stored as ints packed into start << 32 | end in an open addressing hash table
+    (linear probing over an array of unsigned 64 bit ints). That is 8 bytes per slot, kept between about a third
+    and MAX_LOAD full, instead of an int object plus a set slot per edge. Membership, insertion and removal are O(1)
+    """
+    __slots__ = ("table", "count", "used", "hash_shift")
+    SHIFT = 32
+    MASK = (1 << 32) - 1
+    EMPTY = 0 # Never used slot. Slots hold key + 1, so edge (0, 0) isn't EMPTY
+    REMOVED = (1 << 64) - 1 # Slot of a removed edge, lookups probe past it
+    MULTIPLIER = 0x9E3779B97F4A7C15 # Fibonacci hashing: the top bits of key * MULTIPLIER (mod 2 ** 64) pick the slot
+    MIN_SIZE = 8
+    MAX_LOAD = 0.7 # Fraction of slots in use (removed ones included) before the table is rebuilt
+
+    def __init__(self, edges : Iterable[Tuple[int, int]] = ()):
+        self.table = array("Q")
+        self.resize(self.MIN_SIZE)
+        for id_start, id_end in edges:
+            self.add(id_start, id_end)
+
+    @classmethod
+    def from_table(cls, table : array, count : int) -> 'EdgeSet':
+        """
+        EdgeSet over a table built elsewhere with the same layout and hashing (see LearnAssist.storage)
+        """
+        edges = cls.__new__(cls)
+        edges.table, edges.count, edges.used = table, count, count
+        edges.hash_shift = 64 - (len(table).bit_length() - 1)
+        return edges
+
+    def resize(self, size : int):
+        """
+        Rebuild the table with size slots (a power of two), dropping removed slots
+        """
+        stored = [slot for slot in self.table if slot and slot != self.REMOVED]
+        table = array("Q", bytes(8 * size))
+        mask = size - 1
+        hash_shift = 64 - (size.bit_length() - 1)
+        multiplier = self.MULTIPLIER
+        for value in stored: # Every key is distinct and there is nothing removed yet, so each one just takes the first empty slot
+            i = (((value - 1) * multiplier) >> hash_shift) & mask
+            while table[i]:
+                i = (i + 1) & mask
+            table[i] = value
+        self.table, self.hash_shift = table, hash_shift
+        self.count = self.used = len(stored)
+
+    def fitting_size(self) -> int:
+        size = self.MIN_SIZE
+        while size * self.MAX_LOAD < 1.5 * self.count: # Room for half as many edges again, so growing doubles the table
+            size *= 2
+        return size
+
+    def find(self, key : int) -> int:
+        """
+        Slot holding key, -1 if it isn't there
+        """
+        table = self.table
+        mask = len(table) - 1
+        stored = key + 1
+        i = ((key * self.MULTIPLIER) >> self.hash_shift) & mask
+        while True:
+            slot = table[i]
+            if slot == stored:
+                return i
+            if not slot: # EMPTY
+                return -1
+            i = (i + 1) & mask
+
+    def insert(self, key : int) -> bool:
+        table = self.table
+        mask = len(table) - 1
+        stored = key + 1
+        i = ((key * self.MULTIPLIER) >> self.hash_shift) & mask
+        free = -1 # First removed slot on the way, reused
+        while True:
+            slot = table[i]
+            if slot == stored:
+                return False
+            if not slot: # EMPTY
+                break
+            if slot == self.REMOVED and free == -1:
+                free = i
+            i = (i + 1) & mask
+        if free == -1:
+            table[i] = stored
+            self.used += 1
+        else:
+            table[free] = stored
+        self.count += 1
+        if self.used > self.MAX_LOAD * len(table):
+            self.resize(self.fitting_size())
+        return True
+
+    def add(self, id_start : int, id_end : int) -> bool:
+        """
+        Returns False if the edge was already there
+        """
+        return self.insert((id_start << self.SHIFT) | id_end)
+
+    def discard(self, id_start : int, id_end : int) -> bool:
+        """
+        Returns False if there was no such edge
+        """
+        i = self.find((id_start << self.SHIFT) | id_end)
+        if i == -1:
+            return False
+        self.table[i] = self.REMOVED
+        self.count -= 1
+        if self.count < self.MAX_LOAD / 8 * len(self.table) and len(self.table) > self.MIN_SIZE:
+            self.resize(self.fitting_size()) # Mostly removed slots, which adds can reuse without ever shrinking the table
+        return True
+
+    def __contains__(self, edge : Tuple[int, int]) -> bool:
+        return self.find((edge[0] << self.SHIFT) | edge[1]) != -1
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        shift, mask = self.SHIFT, self.MASK
+        for slot in self.table:
+            if slot != self.EMPTY and slot != self.REMOVED:
+                yield ((slot - 1) >> shift, (slot - 1) & mask)
+
+    def __len__(self):
+        return self.count
+
+    def __getstate__(self):
+        return {"table" : self.table, "count" : self.count}
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple): # Pickled when the edges were a set of packed ints, as (None, {"keys" : set})
+            self.table = array("Q")
+            self.resize(self.MIN_SIZE)
+            for key in state[1]["keys"]:
+                self.insert(key)
+        else:
+            self.table, self.count = state["table"], state["count"]
+            self.used = len(self.table) - self.table.count(self.EMPTY)
+            self.hash_shift = 64 - (len(self.table).bit_length() - 1)
+
+class DirectedGraph:
+    def __init__(self):
+        self.V : Dict[int, Node] = {}
+        self.E = EdgeSet()
+
+        # Tagged vertices representing things the student already knows
+        self.tagged_vertices : Dict[int, bool] = {}
+
+        # Why an edge exists, e.g. the justification given when a concept was suggested. Most edges have none
+        self.notes : Dict[Tuple[int, int], str] = {}
+
+        # IDs are handed out in increasing order and never reused, even after a node is deleted
+        self.next_id = 0
+
+        self._init_caches()
+
+    def _init_caches(self):
+        # Serialized graph per format: {"lines" : {id : line}, "dirty" : set of ids, "text" : joined str or None}
+        self._render_cache : Dict[str, dict] = {}
+        self._tagged_text : str = None
+        self._names : NameIndex = None # Built on first use
+        self._similarity : 'SimilarityIndex' = None # Built on first use, numpy is only imported then
+        self._reach : ReachabilityIndex = None # Built on first use
+        self.journal = None # Receives every change as a tuple, see LearnAssist.storage
+        self.version = 0 # Bumped on every change, lets views know when to rebuild derived data
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_render_cache"], state["_tagged_text"], state["_names"], state["_similarity"], state["_reach"], state["journal"], state["version"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "notes" not in state:
+            self.notes = {}
+        if not isinstance(self.E, EdgeSet):
+            # Saved when E was a list. Its neighbor lists can be shared between nodes or hold repeats, so rebuild them from E
+            edges = self.E
+            self.E = EdgeSet()
+            for node in self.V.values():
+                node.forward_neighbors = node.backward_neighbors = EMPTY
+            for id_start, id_end in edges:
+                if id_start in self.V and id_end in self.V and self.E.add(id_start, id_end):
+                    self.V[id_start].link("forward_neighbors", id_end)
+                    self.V[id_end].link("backward_neighbors", id_start)
+            self.next_id = (max(self.V) + 1) if self.V else 0
+        self._init_caches()
+
+    def _touch(self, *ids : int):
+        """
+        Mark the serialized lines of nodes as stale
+        """
+        self.version += 1
+        for cache in self._render_cache.values():
+            cache["dirty"].update(ids)
+            cache["text"] = None
+
+    @property
+    def names(self) -> NameIndex:
+        """
+        Fuzzy name index over the nodes, kept up to date as nodes are added, renamed and removed
+        """
+        if self._names is None:
+            self._names = NameIndex()
+            for id, node in self.V.items():
+                self._names.add(id, node.display_text)
+        return self._names
+
+    @property
+    def similarity(self) -> Optional['SimilarityIndex']:
+        """
+        Name vectors for near duplicate detection, kept up to date like names. None without numpy
+        """
+        if self._similarity is None:
+            try:
+                from LearnAssist.similarity import SimilarityIndex
+            except ImportError: # numpy is not installed, near duplicates are not detected
+                return None
+            self._similarity = SimilarityIndex()
+            self._similarity.add_many((id, node.display_text) for id, node in self.V.items())
+        return self._similarity
+
+    @property
+    def reachability(self) -> ReachabilityIndex:
+        """
+        Learned ancestors of every node, kept up to date as edges and tags change
+        """
+        if self._reach is None:
+            self._reach = ReachabilityIndex(self)
+        return self._reach
+
+    def _record(self, *change):
+        if self.journal is not None:
+            self.journal.record(change)
+
+    def new_id(self) -> int:
+        id = self.next_id
+        self.next_id += 1
+        return id
+
+    def add_node(self, id : int = None, text : str = "", forward_neighbors : Iterable[int] = EMPTY, backward_neighbors : Iterable[int] = EMPTY) -> int:
+        """
+        Add a node, with edges to and from existing nodes. A new ID is allocated if id is None. Returns the ID
+        """
+        if id is None:
+            id = self.new_id()
+        assert (id not in self.V), "Cannot add node with already existing ID"
+        self.next_id = max(self.next_id, id + 1)
+
+        self.V[id] = Node(id, display_text = text)
+        self.tagged_vertices[id] = False # Start off assuming its false
+        if self._names is not None:
+            self._names.add(id, text)
+        if self._similarity is not None:
+            self._similarity.add(id, text)
+        self._touch(id)
+        self._record("add_node", id, text)
+
+        for id_f in forward_neighbors:
+            self.add_edge(id, id_f)
+        for id_b in backward_neighbors:
+            self.add_edge(id_b, id)
+        return id
+
+    def add_nodes(self, nodes : Iterable[Tuple[int, str]]) -> int:
+        """
+        Add (id, text) nodes without edges, marking the caches stale once for the whole batch. Returns the number added
+        """
+        ids = []
+        for id, text in nodes:
+            assert (id not in self.V), "Cannot add node with already existing ID"
+            self.V[id] = Node(id, display_text = text)
+            self.tagged_vertices[id] = False
+            if self._names is not None:
+                self._names.add(id, text)
+            self._record("add_node", id, text)
+            ids.append(id)
+        if self._similarity is not None:
+            self._similarity.add_many((id, self.V[id].display_text) for id in ids)
+        if ids:
+            self.next_id = max(self.next_id, max(ids) + 1)
+            self._touch(*ids)
+        return len(ids)
+
+    def add_edges(self, edges : Iterable[Tuple[int, int]]) -> int:
+        """
+        Add (start, end) edges, skipping ones that already exist. Returns the number added
+        """
+        starts = []
+        for id_start, id_end in edges:
+            start, end = self.V[id_start], self.V[id_end]
+            if self.E.add(id_start, id_end):
+                start.link("forward_neighbors", id_end)
+                end.link("backward_neighbors", id_start)
+                self._record("add_edge", id_start, id_end)
+                starts.append(id_start)
+                if self._reach is not None:
+                    self._reach.add_edge(id_start, id_end)
+        if starts:
+            self._touch(*starts)
+        return len(starts)
+
+    def add_edge(self, id_start : int, id_end : int) -> bool:
+        """
+        Returns False (and changes nothing) if the edge already exists
+        """
+        start, end = self.V[id_start], self.V[id_end]
+        if not self.E.add(id_start, id_end):
+            return False
+        start.link("forward_neighbors", id_end)
+        end.link("backward_neighbors", id_start)
+        self._touch(id_start)
+        self._record("add_edge", id_start, id_end)
+        if self._reach is not None:
+            self._reach.add_edge(id_start, id_end)
+        return True
+
+    def remove_edge(self, id_start : int, id_end : int) -> bool:
+        """
+        Returns False if there was no such edge
+        """
+        if not self.E.discard(id_start, id_end):
+            return False
+        self.V[id_start].unlink("forward_neighbors", id_end)
+        self.V[id_end].unlink("backward_neighbors", id_start)
+        self.notes.pop((id_start, id_end), None)
+        self._touch(id_start)
+        self._record("remove_edge", id_start, id_end)
+        if self._reach is not None:
+            self._reach.remove_edge(id_start, id_end)
+        return True
+
+    def remove_node(self, id : int) -> Node:
+        """
+        Remove a node and every edge touching it, in O(degree). Returns the removed node
+        """
+        node = self.V.pop(id)
+        for id_f in node.forward_neighbors:
+            self.E.discard(id, id_f)
+            self.notes.pop((id, id_f), None)
+            if id_f != id:
+                self.V[id_f].unlink("backward_neighbors", id)
+        for id_b in node.backward_neighbors:
+            if id_b != id:
+                self.E.discard(id_b, id)
+                self.notes.pop((id_b, id), None)
+                self.V[id_b].unlink("forward_neighbors", id)
+
+        if self.tagged_vertices.pop(id, False):
+            self._tagged_text = None
+        if self._names is not None:
+            self._names.remove(id)
+        if self._similarity is not None:
+            self._similarity.remove(id)
+        if self._reach is not None:
+            self._reach.remove_node(node)
+        self._touch(id, *node.backward_neighbors) # Nodes pointing here list it in their line
+        self._record("remove_node", id)
+        return node
+
+    def rename_node(self, id : int, text : str):
+        node = self.V[id]
+        node.display_text = text
+        if self.tagged_vertices[id]:
+            self._tagged_text = None
+        if self._names is not None:
+            self._names.rename(id, text)
+        if self._similarity is not None:
+            self._similarity.rename(id, text)
+        self._touch(id, *node.backward_neighbors)
+        self._record("rename_node", id, text)
+
+    def merge_nodes(self, keep : int, drop : int):
+        """
+        Merge node drop into node keep: drop's edges (and their notes, unless keep's edge has its own) are moved
+        to keep, edges between the two are dropped, keep is tagged if either was, then drop is removed
+        """
+        assert keep != drop, "Cannot merge a node into itself"
+        node = self.V[drop]
+        for id_f in list(node.forward_neighbors):
+            if id_f not in (drop, keep):
+                self.add_edge(keep, id_f)
+                if (drop, id_f) in self.notes and (keep, id_f) not in self.notes:
+                    self.set_note(keep, id_f, self.notes[(drop, id_f)])
+        for id_b in list(node.backward_neighbors):
+            if id_b not in (drop, keep):
+                self.add_edge(id_b, keep)
+                if (id_b, drop) in self.notes and (id_b, keep) not in self.notes:
+                    self.set_note(id_b, keep, self.notes[(id_b, drop)])
+        if self.tagged_vertices.get(drop) and not self.tagged_vertices[keep]:
+            self.set_tagged(keep, True)
+        self.remove_node(drop)
+
+    def set_note(self, id_start : int, id_end : int, text : str):
+        """
+        Attach text to an existing edge, replacing any earlier note
+        """
+        assert (id_start, id_end) in self.E, "Cannot annotate an edge that doesn't exist"
+        if self.notes.get((id_start, id_end)) == text:
+            return
+        self.notes[(id_start, id_end)] = text
+        self._record("set_note", id_start, id_end, text)
+
+    def resolve_name(self, name : str, min_score : float = 0.75) -> Optional[int]:
+        """
+        ID of the node called name, tolerating differences in case, punctuation and small typos.
+        None if no node is close enough
+        """
+        id = self.names.lookup(name)
+        if id is None:
+            matches = self.names.search(name, k = 1, min_score = min_score)
+            if matches:
+                id = matches[0][0]
+        return id
+
+    def set_tagged(self, id : int, tagged : bool):
+        self.tagged_vertices[id] = tagged
+        self._tagged_text = None
+        self.version += 1
+        self._record("set_tagged", id, tagged)
+        if self._reach is not None:
+            self._reach.set_tagged(id, tagged)
+
+    def _render(self, fmt : str, line : Callable[[Node], str]) -> str:
+        """
+        Serialize the graph one line per node, only re-rendering lines of nodes touched since the last call
+        """
+        cache = self._render_cache.get(fmt)
+        if cache is None:
+            cache = self._render_cache[fmt] = {"lines" : {}, "dirty" : set(self.V), "text" : None}
+        if cache["text"] is None:
+            lines = cache["lines"]
+            for id in cache["dirty"]:
+                if id in self.V:
+                    lines[id] = line(self.V[id])
+                else:
+                    lines.pop(id, None)
+            cache["dirty"].clear()
+            cache["text"] = "".join([lines[id] for id in self.V])
+        return cache["text"]
+
+    def _full_line(self, node : Node) -> str:
+        nbrs = "".join([f"{self.V[nbr_id].display_text} ({nbr_id}), " for nbr_id in node.forward_neighbors])
+        return f"{node.display_text} ({node.id} is connected to: {nbrs}\n"
+
+    def _compact_line(self, node : Node) -> str:
+        return f"{node.id}: {node.display_text} -> {','.join(map(str, node.forward_neighbors))}\n"
+
+    def __str__(self) -> str:
+        return self._render("full", self._full_line)
+
+    def to_compact_str(self) -> str:
+        """
+        ID indexed adjacency list, one "id: text -> forward neighbor ids" line per node.
+        Names appear once each, so this is much shorter than str(graph) when used in prompts
+        """
+        return self._render("compact", self._compact_line)
+
+    def get_tagged_node_names(self) -> str:
+        if self._tagged_text is None:
+            self._tagged_text = "".join([self.V[key].display_text + ", " for key in self.tagged_vertices if self.tagged_vertices[key]])
+        return self._tagged_text
+
+    def from_builder_file(self, path : str) -> BuilderReport:
+        """
+        Run the /addnode and /addedge lines of a graph builder file, streaming it line by line.
+        Returns a report with counts, throughput and the lines that failed
+        """
+        with open(path, 'r', encoding = "utf-8") as f:
+            return load_commands(self, f)
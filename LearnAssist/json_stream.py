@@ -0,0 +1,177 @@
+from typing import List, Optional, Tuple
+import json
+
+CLOSERS = {"{" : "}", "[" : "]"}
+FENCE = "```json"
+
+class ConceptStreamParser:
+    """
+    Incremental parser for ConceptExpanderChat replies. Feed it the reply as it streams in and it returns
+    each entry of the new_concepts list as soon as that entry's object closes.
+
+    Parsing starts at the first "{", or at the first one after a ```json fence once one is seen. A top level
+    object that closes without the field is taken as prose (or an example) and parsing starts again at the next "{".
+    Anything after the object with the field is ignored. If the reply is cut off, finish() still returns the
+    fields and entries that were complete.
+
+    :param field: Top level key of the list whose entries are returned
+    """
+    def __init__(self, field : str = "new_concepts"):
+        self.field = field
+        self.text = "" # Whole reply so far
+        self.fenced = False # A ```json fence was seen
+        self.other : Tuple[int, int] = None # Span of the last whole top level object without the field
+        self.end : int = None # End of the top level object with the field once it closes
+        self.entries : List[dict] = []
+        self.restart(None, 0)
+
+    def restart(self, start : Optional[int], pos : int):
+        """
+        Parse the object starting at start, or look for the next "{" from pos if start is None
+        """
+        self.start = start # Where the top level object being parsed starts
+        self.pos = pos if start is None else start # Next character of text to scan
+        self.stack : List[str] = [] # Open containers
+
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.last_string : Tuple[int, int] = None # Span of the last string that closed
+        self.key : str = None # Last key seen in the top level object
+        self.has_field = False # The field was a key of the top level object
+        self.list_depth : int = None # Stack depth inside the new_concepts list, None when not in it
+        self.entry_start : int = None
+
+        self.safe : Tuple[int, Tuple[str, ...]] = None # (end, open containers) of the longest prefix made of whole values
+
+    def feed(self, delta : str) -> List[dict]:
+        """
+        Consume the next piece of the reply. Returns the entries completed by it
+        """
+        if self.end is not None:
+            return []
+        self.text += delta
+
+        if not self.fenced:
+            search = max(0, len(self.text) - len(delta) - len(FENCE) + 1) # The fence may straddle two deltas
+            fence = self.text[search:].lower().find(FENCE)
+            if fence != -1:
+                self.fenced = True
+                if not (self.has_field or self.entries):
+                    self.restart(None, search + fence + len(FENCE)) # What came before it was prose
+
+        found = []
+        while True:
+            if self.start is None:
+                start = self.text.find("{", self.pos)
+                if start == -1:
+                    self.pos = len(self.text)
+                    return found
+                self.restart(start, start)
+            found.extend(self.scan())
+            if self.end is None or self.has_field:
+                return found
+            self.other = (self.start, self.end)
+            self.end = None
+            self.restart(None, self.other[1])
+
+    def scan(self) -> List[dict]:
+        text, stack = self.text, self.stack
+        found = []
+        i = self.pos
+        while i < len(text):
+            c = text[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    self.last_string = (self.string_start, i + 1)
+                    if self.list_depth is not None and len(stack) == self.list_depth:
+                        self.add_entry(text[self.string_start:i + 1], found) # Entry given as just a name
+            elif c == '"':
+                self.in_string = True
+                self.string_start = i
+            elif c == "{" or c == "[":
+                if c == "[" and len(stack) == 1 and self.key == self.field:
+                    self.list_depth = 2
+                stack.append(c)
+                if c == "{" and self.list_depth is not None and len(stack) == self.list_depth + 1:
+                    self.entry_start = i
+            elif c == "}" or c == "]":
+                if not stack:
+                    i += 1
+                    continue # Stray closer before the object, skip it
+                stack.pop()
+                if self.entry_start is not None and self.list_depth is not None and len(stack) == self.list_depth:
+                    self.add_entry(text[self.entry_start:i + 1], found)
+                    self.entry_start = None
+                if self.list_depth is not None and len(stack) < self.list_depth:
+                    self.list_depth = None
+                self.safe = (i + 1, tuple(stack))
+                if not stack:
+                    self.end = i + 1
+                    break
+            elif c == ":":
+                if len(stack) == 1 and self.last_string is not None:
+                    self.key = self.decode(*self.last_string)
+                    self.has_field = self.has_field or self.key == self.field
+            elif c == ",":
+                self.safe = (i, tuple(stack))
+            i += 1
+        self.pos = i + 1 if self.end is not None else i
+        return found
+
+    def decode(self, start : int, end : int):
+        try:
+            return json.loads(self.text[start:end])
+        except ValueError:
+            return None
+
+    def add_entry(self, source : str, found : List[dict]):
+        try:
+            entry = json.loads(source)
+        except ValueError:
+            return
+        if isinstance(entry, str):
+            entry = {"name" : entry}
+        if isinstance(entry, dict) and isinstance(entry.get("name"), str) and entry["name"].strip():
+            self.entries.append(entry)
+            found.append(entry)
+
+    def finish(self) -> dict:
+        """
+        The parsed reply. Cut off or malformed replies are repaired by dropping the unfinished value
+        and closing the open containers, and new_concepts only ever holds complete entries.
+        A reply without the field falls back to its last whole top level object.
+        Raises ValueError if the reply has no JSON object at all
+        """
+        if self.start is None and self.other is None:
+            raise ValueError("Couldn't find a JSON object in the reply")
+
+        data = None
+        if self.end is not None:
+            data = self.decode(self.start, self.end)
+        elif self.other is not None and not self.has_field:
+            data = self.decode(*self.other)
+        if data is None and self.start is not None and self.safe is not None:
+            end, open_containers = self.safe
+            repaired = self.text[self.start:end].rstrip().rstrip(",") + "".join(CLOSERS[c] for c in reversed(open_containers))
+            try:
+                data = json.loads(repaired)
+            except ValueError:
+                data = None
+        if not isinstance(data, dict):
+            data = {}
+        data[self.field] = list(self.entries)
+        return data
+
+def parse_concepts(reply : str) -> dict:
+    """
+    Parse a whole ConceptExpanderChat reply with ConceptStreamParser
+    """
+    parser = ConceptStreamParser()
+    parser.feed(reply)
+    return parser.finish()
@@ -0,0 +1,398 @@
+from typing import Dict, Iterable, List, Tuple
+import time
+
+import numpy as np
+
+class ForceLayout:
+    """
+    Incremental force directed (Fruchterman-Reingold) layout over a NumPy position array.
+
+    Every node has its own temperature (maximum step length). Only nodes that are still hot are moved and
+    have forces computed for them, so new nodes settle locally while the rest of the graph stays put.
+    Repulsion is approximated with a two level grid: exact within neighbouring fine cells, fine cell
+    centroids for the surrounding block and coarse cell centroids beyond that, so a step is close to linear
+    in the number of nodes instead of quadratic.
+
+    :param spacing: Ideal edge length (the k of Fruchterman-Reingold)
+    :param repulsion: Strength of node repulsion relative to edge attraction. Below 1 keeps big graphs compact
+    :param gravity: Pull towards the centroid, keeps disconnected components together
+    :param cooling: Temperature multiplier per step. Nodes moving steadily in one direction cool slower, oscillating ones faster
+    :param cell_occupancy: Target number of nodes per fine grid cell
+    :param exact_limit: Below this many nodes repulsion is computed exactly
+    """
+    BLOCK = 4 # Fine cells per coarse cell along each axis
+    MIN_HEAT = 0.5 # Nodes cooler than this no longer move
+    MIN_SLICE = 32 # Fewest nodes moved at once when a step is done in slices
+
+    def __init__(self, spacing : float = 150.0, repulsion : float = 0.2, gravity : float = 0.1, cooling : float = 0.97, cell_occupancy : int = 8, exact_limit : int = 1000):
+        self.k = spacing
+        self.repulsion = repulsion
+        self.gravity = gravity
+        self.cooling = cooling
+        self.cell_occupancy = cell_occupancy
+        self.exact_limit = exact_limit
+
+        self.ids : List[int] = []
+        self.index : Dict[int, int] = {}
+        self.pos = np.zeros((0, 2))
+        self.heat = np.zeros(0)
+        self.pinned = np.zeros(0, dtype = bool)
+        self.direction = np.zeros((0, 2)) # Direction of each node's last step
+        self.edges = np.zeros((0, 2), dtype = np.int64)
+        self.adj_start = np.zeros(1, dtype = np.int64) # Edges touching node i (either way) are adj[adj_start[i]:adj_start[i + 1]]
+        self.adj = np.zeros(0, dtype = np.int64)
+
+        self.graph_version = None
+        self.n_steps = 0
+
+        # Step in progress, see begin_step
+        self.step_targets : np.ndarray = None
+        self.step_done = 0
+        self.step_pos : np.ndarray = None
+        self.step_grid : dict = None
+        self.step_center : np.ndarray = None
+        self.resume_at = 0 # Node index an interrupted step stopped at, the next one starts there
+        self.seconds_per_node = 100e-6 # Measured as the layout runs, sizes the slices. Starts high so the first slice is small
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ==== KEEPING IN SYNC WITH THE GRAPH ====
+    def sync(self, graph, positions : Dict[int, object], hot : Iterable[int] = ()):
+        """
+        Add nodes that appeared in graph (at their position in positions), drop removed ones and refresh the edges.
+        Nodes in hot start hot (and warm up their neighbours), every other new node starts cold
+        """
+        if graph.version == self.graph_version and len(self.ids) == len(graph.V):
+            return
+        self.graph_version = graph.version
+
+        removed = [id for id in self.ids if id not in graph.V]
+        if removed:
+            keep = np.array([id in graph.V for id in self.ids])
+            self.ids = [id for id in self.ids if id in graph.V]
+            self.pos, self.heat, self.pinned, self.direction = self.pos[keep], self.heat[keep], self.pinned[keep], self.direction[keep]
+            self.index = {id : i for i, id in enumerate(self.ids)}
+
+        new = [id for id in graph.V if id not in self.index and id in positions]
+        if new:
+            start = len(self.ids)
+            self.ids.extend(new)
+            self.index.update({id : start + i for i, id in enumerate(new)})
+            self.pos = np.concatenate([self.pos, np.array([(positions[id].x, positions[id].y) for id in new], dtype = float).reshape(-1, 2)])
+            self.heat = np.concatenate([self.heat, np.zeros(len(new))])
+            self.pinned = np.concatenate([self.pinned, np.zeros(len(new), dtype = bool)])
+            self.direction = np.concatenate([self.direction, np.zeros((len(new), 2))])
+
+        index = self.index
+        pairs = [(index[a], index[b]) for a, b in graph.E if a in index and b in index and a != b]
+        self.edges = np.array(pairs, dtype = np.int64).reshape(-1, 2)
+        ends = np.concatenate([self.edges, self.edges[:, ::-1]])
+        self.adj = ends[np.argsort(ends[:, 0], kind = "stable"), 1]
+        self.adj_start = np.concatenate([[0], np.cumsum(np.bincount(ends[:, 0], minlength = len(self.ids)))])
+        if self.step_targets is not None: # Indices may have changed, start the step over from about where it was
+            self.resume_at = int(self.step_targets[self.step_done]) if self.step_done < len(self.step_targets) else 0
+            self.step_targets = self.step_pos = self.step_grid = None
+
+        hot = [id for id in hot if id in index]
+        if hot:
+            self.warm(hot, neighbours = graph)
+
+    def warm(self, ids : Iterable[int], neighbours = None):
+        """
+        Make nodes hot so they move again. If the graph is given as neighbours, their neighbours get some heat too
+        """
+        for id in ids:
+            i = self.index[id]
+            self.heat[i] = max(self.heat[i], 2 * self.k)
+            if neighbours is not None:
+                node = neighbours.V[id]
+                for nbr_id in list(node.forward_neighbors) + list(node.backward_neighbors):
+                    j = self.index.get(nbr_id)
+                    if j is not None:
+                        self.heat[j] = max(self.heat[j], 0.5 * self.k)
+
+    def reheat(self):
+        """
+        Lay out the whole graph again
+        """
+        self.heat[:] = 2 * self.k
+
+    def set_position(self, id : int, x : float, y : float, pin : bool = True):
+        """
+        Move a node by hand. Pinned nodes are never moved by the layout
+        """
+        i = self.index.get(id)
+        if i is not None:
+            self.pos[i] = (x, y)
+            self.pinned[i] = pin
+            if self.step_pos is not None:
+                self.step_pos[i] = (x, y) # Others feel it where it was put for the rest of the step
+
+    def active(self) -> np.ndarray:
+        return np.flatnonzero((self.heat > self.MIN_HEAT) & ~self.pinned)
+
+    def is_settled(self) -> bool:
+        return len(self.active()) == 0
+
+    # ==== FORCES ====
+    def _exact_repulsion(self, targets : np.ndarray, pos : np.ndarray) -> np.ndarray:
+        k2 = self.repulsion * self.k ** 2
+        px, py = pos[:, 0], pos[:, 1]
+        out = np.zeros((len(targets), 2))
+        for start in range(0, len(targets), 256):
+            chunk = targets[start:start + 256]
+            ddx = px[chunk, None] - px[None, :]
+            ddy = py[chunk, None] - py[None, :]
+            w = k2 / np.maximum(ddx * ddx + ddy * ddy, 1e-2) # A node's pull on itself is zero since ddx = ddy = 0
+            out[start:start + len(chunk), 0] = (ddx * w).sum(1)
+            out[start:start + len(chunk), 1] = (ddy * w).sum(1)
+        return out
+
+    def _build_grid(self, pos : np.ndarray) -> dict:
+        """
+        Fine and coarse cells of positions pos, with their masses and centroids
+        """
+        n = len(pos)
+        B = self.BLOCK
+
+        # Fine grid sized for cell_occupancy nodes per cell
+        mins = column_reduce(pos, np.min)
+        span = max(float((column_reduce(pos, np.max) - mins).max()), 1.0)
+        per_side = max(1, int(np.ceil(np.sqrt(n / self.cell_occupancy))))
+        size = span / per_side * (1 + 1e-9)
+        cell_xy = ((pos - mins) * (1 / size)).astype(np.int64) + 2 * B # Truncating is flooring, nothing is below mins. Padding keeps neighbour coordinates positive
+        M = per_side + 8 * B
+        fine_key = cell_xy[:, 0] * M + cell_xy[:, 1]
+
+        # One sort gives the cells, the cell of every node and the nodes of each cell back to back
+        order = np.argsort(fine_key) # Order within a cell doesn't matter
+        sorted_key = fine_key[order]
+        first = np.concatenate([[True], sorted_key[1:] != sorted_key[:-1]])
+        fine = sorted_key[first]
+        node_fine = np.empty(n, dtype = np.int64)
+        node_fine[order] = np.cumsum(first) - 1
+        fine_mass = np.bincount(node_fine).astype(float)
+        fine_center = np.stack([np.bincount(node_fine, pos[:, 0]), np.bincount(node_fine, pos[:, 1])], 1) / fine_mass[:, None]
+        fine_xy = np.stack([fine // M, fine % M], 1)
+
+        block_key = (fine_xy[:, 0] // B) * M + fine_xy[:, 1] // B
+        blocks, fine_block = np.unique(block_key, return_inverse = True)
+        block_mass = np.bincount(fine_block, fine_mass)
+        block_center = np.stack([np.bincount(fine_block, fine_center[:, 0] * fine_mass), np.bincount(fine_block, fine_center[:, 1] * fine_mass)], 1) / block_mass[:, None]
+
+        return {
+            "M" : M,
+            "cell_xy" : cell_xy,
+            "fine" : fine,
+            "node_fine" : node_fine,
+            "fine_mass" : fine_mass,
+            "fine_center" : fine_center,
+            "fine_xy" : fine_xy,
+            "order" : order,
+            "fine_start" : np.concatenate([[0], np.cumsum(fine_mass.astype(np.int64))[:-1]]),
+            "fine_block" : fine_block,
+            "block_mass" : block_mass,
+            "block_center" : block_center,
+            "block_xy" : np.stack([blocks // M, blocks % M], 1)
+        }
+
+    def _grid_repulsion(self, targets : np.ndarray, pos : np.ndarray, grid : dict = None) -> np.ndarray:
+        """
+        Repulsion on targets using grid, built from pos if not given. Near field forces use the positions
+        of the nodes in each cell, mid and far field ones the centroids of the grid
+        """
+        if grid is None:
+            grid = self._build_grid(pos)
+        M, fine, fine_mass, fine_center, fine_xy = grid["M"], grid["fine"], grid["fine_mass"], grid["fine_center"], grid["fine_xy"]
+        node_fine = grid["node_fine"]
+        k2 = self.repulsion * self.k ** 2
+        B = self.BLOCK
+
+        def lookup(keys):
+            idx = np.minimum(np.searchsorted(fine, keys), len(fine) - 1)
+            return idx, fine[idx] == keys
+
+        px, py = pos[:, 0], pos[:, 1]
+        out_x = np.zeros(len(targets))
+        out_y = np.zeros(len(targets))
+        t_xy = grid["cell_xy"][targets]
+
+        # Near field: exact against every node in the 3x3 fine neighbourhood (a node's pull on itself is zero)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                idx, found = lookup((t_xy[:, 0] + dx) * M + t_xy[:, 1] + dy)
+                rows, members = expand_ranges(grid["fine_start"][idx], np.where(found, fine_mass[idx], 0).astype(np.int64))
+                if len(rows) == 0:
+                    continue
+                j = grid["order"][members]
+                i = targets[rows]
+                ddx = px[i] - px[j]
+                ddy = py[i] - py[j]
+                w = k2 / np.maximum(ddx * ddx + ddy * ddy, 1e-2)
+                out_x += np.bincount(rows, ddx * w, minlength = len(targets))
+                out_y += np.bincount(rows, ddy * w, minlength = len(targets))
+
+        # Mid field: fine cell centroids inside the surrounding 3x3 coarse block, evaluated per fine cell
+        cells = np.unique(node_fine[targets])
+        c_xy = fine_xy[cells]
+        c_block = c_xy // B
+        cx, cy = fine_center[cells, 0], fine_center[cells, 1]
+        field_x = np.zeros(len(cells))
+        field_y = np.zeros(len(cells))
+        span = np.arange(-2 * B + 1, 2 * B)
+        offsets = np.stack(np.meshgrid(span, span, indexing = "ij"), -1).reshape(-1, 2)
+        offsets = offsets[(np.abs(offsets) > 1).any(1)] # Every offset at once, outside the near field
+        for start in range(0, len(cells), 256):
+            part = slice(start, start + 256)
+            o_xy = c_xy[part, None, :] + offsets[None]
+            idx, found = lookup(o_xy[:, :, 0] * M + o_xy[:, :, 1])
+            found &= (np.abs(o_xy // B - c_block[part, None, :]) <= 1).all(2)
+            ddx = cx[part, None] - fine_center[idx, 0]
+            ddy = cy[part, None] - fine_center[idx, 1]
+            w = np.where(found, fine_mass[idx] * k2 / np.maximum(ddx * ddx + ddy * ddy, 1e-2), 0.0)
+            field_x[part] = (ddx * w).sum(1)
+            field_y[part] = (ddy * w).sum(1)
+
+        # Far field: coarse cell centroids outside the 3x3 coarse block
+        block_mass, block_xy = grid["block_mass"], grid["block_xy"]
+        c_blocks = grid["fine_block"][cells]
+        bx, by = grid["block_center"][:, 0], grid["block_center"][:, 1]
+        for start in range(0, len(cells), 512):
+            part = slice(start, start + 512)
+            src = c_blocks[part]
+            ddx = cx[part, None] - bx[None, :]
+            ddy = cy[part, None] - by[None, :]
+            is_far = (np.abs(block_xy[src, None, 0] - block_xy[None, :, 0]) > 1) | (np.abs(block_xy[src, None, 1] - block_xy[None, :, 1]) > 1)
+            w = np.where(is_far, block_mass * k2 / np.maximum(ddx * ddx + ddy * ddy, 1e-2), 0.0)
+            field_x[part] += (ddx * w).sum(1)
+            field_y[part] += (ddy * w).sum(1)
+
+        cell_of_target = np.searchsorted(cells, node_fine[targets])
+        return np.stack([out_x + field_x[cell_of_target], out_y + field_y[cell_of_target]], 1)
+
+    def forces(self, targets : np.ndarray, pos : np.ndarray = None, grid : dict = None, center : np.ndarray = None) -> np.ndarray:
+        """
+        Net force on each node in targets at positions pos (the current ones if not given). grid and center
+        (the centroid gravity pulls towards) are computed from pos unless given, a step in slices computes
+        them once for the whole step
+        """
+        if pos is None:
+            pos = self.pos
+        if len(pos) <= self.exact_limit:
+            disp = self._exact_repulsion(targets, pos)
+        else:
+            disp = self._grid_repulsion(targets, pos, grid)
+
+        # Attraction along edges touching a target, in either direction
+        rows, slots = expand_ranges(self.adj_start[targets], self.adj_start[targets + 1] - self.adj_start[targets])
+        if len(rows):
+            d = pos[targets[rows]] - pos[self.adj[slots]]
+            pull = d * (np.sqrt((d ** 2).sum(1)) / self.k)[:, None]
+            disp[:, 0] -= np.bincount(rows, pull[:, 0], minlength = len(targets))
+            disp[:, 1] -= np.bincount(rows, pull[:, 1], minlength = len(targets))
+
+        disp -= self.gravity * (pos[targets] - (column_reduce(pos, np.mean) if center is None else center))
+        return disp
+
+    # ==== STEPPING ====
+    def begin_step(self):
+        """
+        Pick the hot nodes of the next step, and keep the positions (with their grid and centroid) that their
+        forces are computed from, so a step done in slices moves nodes exactly like one done at once
+        """
+        targets = self.active()
+        self.step_targets = np.roll(targets, -int(np.searchsorted(targets, self.resume_at))) # Edits every frame would otherwise starve the last nodes
+        self.resume_at = 0
+        self.step_done = 0
+        self.step_pos = self.pos.copy()
+        self.step_center = column_reduce(self.step_pos, np.mean) if len(self.step_pos) else None
+        self.step_grid = self._build_grid(self.step_pos) if len(self.step_pos) > self.exact_limit and len(self.step_targets) else None
+
+    def step_slice(self, n : int = None) -> np.ndarray:
+        """
+        Move the next n hot nodes of the step in progress (all that are left if n is None), starting one
+        if none is in progress. Returns the indices of nodes that moved
+        """
+        if self.step_targets is None:
+            self.begin_step()
+            if len(self.step_targets) == 0:
+                self.step_targets = self.step_pos = self.step_grid = None
+                return np.zeros(0, dtype = np.int64)
+        end = len(self.step_targets) if n is None else min(len(self.step_targets), self.step_done + n)
+        targets = self.step_targets[self.step_done:end]
+        pos, grid, center = self.step_pos, self.step_grid, self.step_center
+        self.step_done = end
+        if self.step_done == len(self.step_targets):
+            self.step_targets = self.step_pos = self.step_grid = None # Finished, the next slice starts a new step
+            self.n_steps += 1
+        targets = targets[~self.pinned[targets]] # Dragged by hand since the step started
+        if len(targets) == 0:
+            return targets
+
+        disp = self.forces(targets, pos, grid, center)
+        length = np.maximum(np.sqrt((disp ** 2).sum(1)), 1e-9)
+        direction = disp / length[:, None]
+        self.pos[targets] += direction * np.minimum(length, self.heat[targets])[:, None]
+
+        # Nodes still travelling the same way cool slowly, oscillating ones quickly
+        steady = (direction * self.direction[targets]).sum(1) > 0.5
+        self.heat[targets] *= np.where(steady, self.cooling ** 0.25, self.cooling ** 2)
+        self.direction[targets] = direction
+        return targets
+
+    def step(self) -> np.ndarray:
+        """
+        One iteration over the hot nodes (or what is left of the one in progress). Returns the indices of nodes that moved
+        """
+        return self.step_slice()
+
+    def run(self, budget_ms : float = 8.0, max_steps : int = 10) -> List[int]:
+        """
+        Move hot nodes until the time budget or max_steps whole steps run out. A step is done in slices
+        sized from the measured time per node to fit what is left of the budget, and continued on the
+        next call when it doesn't fit. Returns ids of the nodes that moved
+        """
+        start = time.perf_counter()
+        end = start + budget_ms / 1000
+        moved = set()
+        steps = self.n_steps + max_steps
+        while self.n_steps < steps and not self.is_settled():
+            now = time.perf_counter()
+            if now >= end:
+                break
+            if self.step_targets is None:
+                self.begin_step()
+                now = time.perf_counter()
+                if now >= end:
+                    break # Building the grid used up the budget, the step starts moving nodes on the next call
+            n = int((end - now) / self.seconds_per_node)
+            if n < self.MIN_SLICE and moved:
+                break # Even the smallest slice would overrun, continue on the next call
+            n = max(self.MIN_SLICE, n)
+            slice_start = time.perf_counter()
+            targets = self.step_slice(n)
+            if len(targets):
+                per_node = (time.perf_counter() - slice_start) / len(targets)
+                self.seconds_per_node = 0.5 * self.seconds_per_node + 0.5 * per_node
+            moved.update(targets.tolist())
+        return [self.ids[i] for i in moved]
+
+    def position(self, id : int) -> Tuple[float, float]:
+        x, y = self.pos[self.index[id]]
+        return float(x), float(y)
+
+def column_reduce(pos : np.ndarray, reduce) -> np.ndarray:
+    """
+    reduce (np.min, np.max, np.mean) of x and y. Much faster than reducing an (n, 2) array along axis 0
+    """
+    return np.array([reduce(pos[:, 0]), reduce(pos[:, 1])])
+
+def expand_ranges(starts : np.ndarray, counts : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For ranges [starts[r], starts[r] + counts[r]), (the range number r of every element, every element)
+    """
+    total = int(counts.sum())
+    rows = np.repeat(np.arange(len(counts)), counts)
+    within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return rows, np.repeat(starts, counts) + within
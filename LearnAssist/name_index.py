@@ -0,0 +1,162 @@
+from typing import Dict, List, Optional, Set, Tuple
+from collections import Counter
+import heapq
+import re
+import unicodedata
+
+APOSTROPHES = re.compile(r"['’`]")
+NON_WORD = re.compile(r"[^\w]+")
+
+def normalize(name : str) -> str:
+    """
+    Case, accent, apostrophe and punctuation insensitive form of a concept name,
+    e.g. "Euler's  Identity" and "eulers identity" both become "eulers identity"
+    """
+    if not name.isascii(): # Nothing to decompose in plain ASCII, which is most names
+        name = unicodedata.normalize("NFKD", name)
+        name = "".join([c for c in name if not unicodedata.combining(c)])
+    name = APOSTROPHES.sub("", name.lower())
+    return " ".join(NON_WORD.sub(" ", name).split())
+
+class NameIndex:
+    """
+    Fuzzy lookup of node IDs by name. Names are normalized, split into character n-grams and kept in
+    an inverted index (n-gram -> IDs). Candidates are scored by the mean of the Dice coefficient of their
+    n-gram sets and the fraction of query n-grams they contain, so partial names ("trig") still find
+    their concept. Searching only walks the postings of the query's rarest n-grams, enough of them that
+    every name above the score threshold must show up.
+
+    :param n: n-gram length
+    """
+    SAMPLE_SIZE = 2048 # Names scored up front to raise the search threshold
+
+    def __init__(self, n : int = 3):
+        self.n = n
+        self.keys : Dict[int, str] = {} # ID -> normalized name
+        self.exact : Dict[str, Set[int]] = {} # Normalized name -> IDs
+        self.postings : Dict[str, Set[int]] = {} # n-gram -> IDs
+        self.sizes : Dict[int, int] = {} # ID -> number of distinct n-grams in its name
+
+    def __len__(self):
+        return len(self.keys)
+
+    def grams(self, key : str) -> Set[str]:
+        padded = f" {key} "
+        return {padded[i:i + self.n] for i in range(max(1, len(padded) - self.n + 1))}
+
+    def add(self, id : int, name : str):
+        if id in self.keys:
+            self.remove(id)
+        key = normalize(name)
+        self.keys[id] = key
+        self.exact.setdefault(key, set()).add(id)
+        grams = self.grams(key)
+        self.sizes[id] = len(grams)
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(id)
+
+    def remove(self, id : int):
+        key = self.keys.pop(id, None)
+        if key is None:
+            return
+        del self.sizes[id]
+        self._discard(self.exact, key, id)
+        for gram in self.grams(key):
+            self._discard(self.postings, gram, id)
+
+    def rename(self, id : int, name : str):
+        self.add(id, name)
+
+    @staticmethod
+    def _discard(table : Dict[str, Set[int]], key : str, id : int):
+        ids = table[key]
+        ids.discard(id)
+        if not ids:
+            del table[key]
+
+    def lookup(self, name : str) -> Optional[int]:
+        """
+        ID of a node whose name normalizes to the same key (lowest ID if several), None if there is none
+        """
+        ids = self.exact.get(normalize(name))
+        return min(ids) if ids else None
+
+    def mentions(self, text : str, max_words : int = 6) -> List[int]:
+        """
+        IDs of the nodes named in free text ("how does calculus relate to limits?"), in order of appearance.
+        The longest name starting at each word wins and names don't overlap
+        """
+        words = normalize(text).split()
+        found = []
+        i = 0
+        while i < len(words):
+            for j in range(min(len(words), i + max_words), i, -1):
+                ids = self.exact.get(" ".join(words[i:j]))
+                if ids:
+                    found.append(min(ids))
+                    i = j
+                    break
+            else:
+                i += 1
+        return found
+
+    def _score(self, id : int, key : str, shared : int, n_query_grams : int) -> float:
+        if self.keys[id] == key:
+            return 1.0
+        return (2 * shared / (n_query_grams + self.sizes[id]) + shared / n_query_grams) / 2
+
+    @staticmethod
+    def _min_shared(threshold : float, n_query_grams : int) -> int:
+        """
+        Fewest shared n-grams a name can have and still score threshold. A name sharing s n-grams has
+        at least s of its own, so its score is at most (2s / (q + s) + s / q) / 2
+        """
+        q = n_query_grams
+        for s in range(1, q + 1):
+            if (2 * s / (q + s) + s / q) / 2 >= threshold - 1e-9:
+                return s
+        return q
+
+    def search(self, query : str, k : int = 5, min_score : float = 0.4) -> List[Tuple[int, float]]:
+        """
+        Up to k (id, score) pairs with score >= min_score, best first. Score is 1 for a normalized exact match
+        """
+        key = normalize(query)
+        query_grams = sorted(self.grams(key), key = lambda gram: len(self.postings.get(gram, ())))
+        q = len(query_grams)
+
+        # Score the names sharing the rarest n-grams first. The k-th best of those is a lower bound on the
+        # final k-th best score, so it can replace min_score and cut down the postings walked below
+        threshold = min_score
+        sample = set(self.postings.get(query_grams[0], ())) if query_grams else set()
+        for gram in query_grams[1:]:
+            ids = self.postings.get(gram, ())
+            if len(sample) + len(ids) > self.SAMPLE_SIZE:
+                break
+            sample.update(ids)
+        if len(sample) >= k:
+            counts = Counter()
+            for gram in query_grams:
+                counts.update(self.postings.get(gram, set()).intersection(sample))
+            scores = [self._score(id, key, s, q) for id, s in counts.items()]
+            threshold = max(threshold, heapq.nlargest(k, scores)[-1])
+
+        # Every name scoring at least threshold shares min_shared n-grams with the query,
+        # so it must appear in the postings of the q - min_shared + 1 rarest ones
+        min_shared = self._min_shared(threshold, q)
+        probe = query_grams[:q - min_shared + 1]
+        rest = query_grams[q - min_shared + 1:]
+
+        shared = Counter()
+        for gram in probe:
+            shared.update(self.postings.get(gram, ()))
+        for gram in rest:
+            shared.update(self.postings.get(gram, set()).intersection(shared))
+
+        scored = []
+        for id, s in shared.items():
+            if s >= min_shared:
+                score = self._score(id, key, s, q)
+                if score >= threshold:
+                    scored.append((score, -id))
+        return [(-neg_id, score) for score, neg_id in heapq.nlargest(k, scored)]
@@ -0,0 +1,253 @@
+"""
+Lightweight timers and counters for finding out where time goes in the explorer and the chat harnesses.
+
+Everything records into the shared PROFILER, which starts disabled unless LEARNASSIST_PROFILE is set.
+While disabled, PROFILER.time(...) hands back one shared no-op context and count/observe return
+immediately, so instrumented code costs about one attribute check per call.
+
+    with PROFILER.time("frame.edges"):
+        self.draw_edges(edges)
+    PROFILER.observe("chat.prompt_tokens", n_tokens)
+
+The explorer shows an overlay of FPS, per phase milliseconds and requests in flight with F3.
+For headless runs, a MetricsExporter writes snapshots periodically, as JSON lines or in the Prometheus
+text format (for node_exporter's textfile collector):
+
+    LEARNASSIST_METRICS=saves/metrics.prom python -m LearnAssist.game
+    python -m LearnAssist.expander saves/calculus.lgraph "Calculus" --metrics saves/expand.jsonl
+"""
+from typing import Callable, Dict, List, Optional
+from collections import deque
+import json
+import os
+import re
+import threading
+import time
+
+class _Timer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler : 'Profiler', name : str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.observe(self.name + "_ms", (time.perf_counter() - self.start) * 1e3)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_TIMER = _NullTimer()
+
+class Series:
+    """
+    Running count and sum of a measurement, plus its most recent values for averages and percentiles
+    """
+    __slots__ = ("count", "total", "recent")
+
+    def __init__(self, window : int):
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen = window)
+
+    def add(self, value : float):
+        self.count += 1
+        self.total += value
+        self.recent.append(value)
+
+    def mean(self) -> float:
+        return sum(self.recent) / len(self.recent) if self.recent else 0.0
+
+    def percentile(self, p : float) -> float:
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else 0.0
+
+class Profiler:
+    """
+    Named timings, measurements, counters and gauges. Thread safe, chat requests record from worker threads
+
+    :param enabled: Record anything at all
+    :param window: Recent values kept per measurement
+    """
+    def __init__(self, enabled : bool = False, window : int = 120):
+        self.enabled = enabled
+        self.window = window
+        self.lock = threading.Lock()
+        self.series : Dict[str, Series] = {}
+        self.counters : Dict[str, float] = {}
+        self.gauges : Dict[str, Callable[[], float]] = {} # Read when a snapshot is taken, so they cost nothing in between
+        self.frames = deque(maxlen = window) # perf_counter at the end of each frame
+
+    def time(self, name : str):
+        """
+        Context that records how long its body took as the measurement name_ms
+        """
+        return _Timer(self, name) if self.enabled else NULL_TIMER
+
+    def observe(self, name : str, value : float):
+        if not self.enabled:
+            return
+        with self.lock:
+            series = self.series.get(name)
+            if series is None:
+                series = self.series[name] = Series(self.window)
+            series.add(value)
+
+    def count(self, name : str, value : float = 1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name : str, read : Callable[[], float]):
+        """
+        Register a value that is read on every snapshot, e.g. the number of requests in flight
+        """
+        self.gauges[name] = read
+
+    def frame(self):
+        """
+        Mark the end of a frame of the main loop
+        """
+        if self.enabled:
+            self.frames.append(time.perf_counter())
+
+    def fps(self) -> float:
+        if len(self.frames) < 2:
+            return 0.0
+        return (len(self.frames) - 1) / max(1e-9, self.frames[-1] - self.frames[0])
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+            self.counters.clear()
+            self.frames.clear()
+
+    def snapshot(self) -> dict:
+        """
+        Current values: fps, counters, gauges and count / sum / mean / p50 / p99 of every measurement
+        """
+        gauges = {}
+        for name, read in list(self.gauges.items()):
+            try:
+                gauges[name] = float(read())
+            except Exception:
+                continue # A gauge whose owner went away
+        with self.lock:
+            return {
+                "time" : time.time(),
+                "fps" : round(self.fps(), 2),
+                "counters" : dict(self.counters),
+                "gauges" : gauges,
+                "series" : {
+                    name : {
+                        "count" : series.count,
+                        "sum" : round(series.total, 4),
+                        "mean" : round(series.mean(), 4),
+                        "p50" : round(series.percentile(50), 4),
+                        "p99" : round(series.percentile(99), 4)
+                    }
+                    for name, series in self.series.items()
+                }
+            }
+
+    def hud_lines(self, phases : List[str]) -> List[str]:
+        """
+        Text of the in-window overlay: FPS, mean milliseconds of each phase (timed as phase) and the gauges
+        """
+        snapshot = self.snapshot()
+        series = snapshot["series"]
+        lines = [f"{snapshot['fps']:.0f} fps"]
+        lines.append("  ".join(
+            f"{phase.rsplit('.', 1)[-1]} {series[phase + '_ms']['mean']:.1f}" for phase in phases if phase + "_ms" in series
+        ) + " ms")
+        if snapshot["gauges"]:
+            lines.append("  ".join(f"{name} {value:g}" for name, value in snapshot["gauges"].items()))
+        return lines
+
+PROFILER = Profiler(enabled = bool(os.environ.get("LEARNASSIST_PROFILE")))
+
+# ==== EXPORT ====
+PROMETHEUS_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+def to_prometheus(snapshot : dict, prefix : str = "learnassist") -> str:
+    """
+    Snapshot in the Prometheus text exposition format. Measurements become summaries with 0.5 and 0.99 quantiles
+    """
+    def metric(name):
+        return f"{prefix}_{PROMETHEUS_NAME.sub('_', name)}"
+
+    lines = [f"# TYPE {prefix}_fps gauge", f"{prefix}_fps {snapshot['fps']}"]
+    for name, value in sorted(snapshot["counters"].items()):
+        lines += [f"# TYPE {metric(name)}_total counter", f"{metric(name)}_total {value}"]
+    for name, value in sorted(snapshot["gauges"].items()):
+        lines += [f"# TYPE {metric(name)} gauge", f"{metric(name)} {value}"]
+    for name, values in sorted(snapshot["series"].items()):
+        lines += [
+            f"# TYPE {metric(name)} summary",
+            f'{metric(name)}{{quantile="0.5"}} {values["p50"]}',
+            f'{metric(name)}{{quantile="0.99"}} {values["p99"]}',
+            f"{metric(name)}_sum {values['sum']}",
+            f"{metric(name)}_count {values['count']}"
+        ]
+    return "\n".join(lines) + "\n"
+
+class MetricsExporter:
+    """
+    Writes profiler snapshots to a file every interval seconds from a background thread.
+    Paths ending in .prom are rewritten with the latest snapshot in the Prometheus text format
+    (atomically, as the textfile collector expects), anything else gets one JSON line appended per snapshot.
+    Starting an exporter enables the profiler.
+
+    :param path: File to write
+    :param interval: Seconds between snapshots
+    :param profiler: Profiler to export, the shared one by default
+    """
+    def __init__(self, path : str, interval : float = 10.0, profiler : Profiler = None):
+        self.path = path
+        self.interval = interval
+        self.profiler = profiler if profiler is not None else PROFILER
+        self.prometheus = path.endswith(".prom")
+        self.stopped = threading.Event()
+        self.thread : Optional[threading.Thread] = None
+
+    def write(self):
+        snapshot = self.profiler.snapshot()
+        if self.prometheus:
+            tmp = self.path + ".tmp"
+            with open(tmp, 'w') as f:
+                f.write(to_prometheus(snapshot))
+            os.replace(tmp, self.path)
+        else:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(snapshot) + "\n")
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def start(self) -> 'MetricsExporter':
+        self.profiler.enabled = True
+        self.thread = threading.Thread(target = self.run, name = "metrics-exporter", daemon = True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the thread and write a last snapshot
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.write()
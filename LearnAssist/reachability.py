@@ -0,0 +1,262 @@
+"""
+Which learned concepts lead to a concept, and what is left to learn on the way there.
+
+An edge a -> b reads "a comes before b" (the builder's /addedge and downward expansion both point from the
+more basic concept to the more advanced one), so the prerequisites of a concept are its ancestors.
+"""
+from typing import Dict, Iterable, List, Optional
+from collections import deque
+
+class ReachabilityIndex:
+    """
+    For every node, the set of learned (tagged) nodes it can be reached from, as a bitset: an int with one
+    bit per learned node. Only learned nodes get a bit, so memory grows with nodes * learned nodes / 8 bytes
+    rather than quadratically, and "which learned concepts come before X" is a single lookup.
+
+    Kept up to date as edges and tags change. Additions only ever set bits, so they propagate forward from
+    the change and stop where nothing new arrives. Removals clear the bits that might have come through
+    the removed edge or node in the part of the graph below it, then propagate again from its boundary.
+    Cycles are fine, propagation stops once nothing changes.
+
+    :param graph: DirectedGraph to index, see DirectedGraph.reachability for one that is kept up to date
+    """
+    def __init__(self, graph):
+        self.graph = graph
+        self.slots : Dict[int, int] = {} # Learned node ID -> bit
+        self.slot_ids : Dict[int, int] = {} # Bit -> learned node ID
+        self.free : List[int] = [] # Bits of nodes that were unlearned, reused first
+        self.learned_before : Dict[int, int] = {} # Node ID -> bitset of learned ancestors, missing means none
+        self.rebuild()
+
+    def rebuild(self):
+        self.slots.clear()
+        self.slot_ids.clear()
+        self.free.clear()
+        self.learned_before.clear()
+        learned = [id for id, tagged in self.graph.tagged_vertices.items() if tagged and id in self.graph.V]
+        for id in learned:
+            self._assign(id)
+        self._propagate(learned)
+
+    def _assign(self, id : int):
+        slot = self.free.pop() if self.free else len(self.slots)
+        self.slots[id] = slot
+        self.slot_ids[slot] = id
+
+    def bit(self, id : int) -> int:
+        slot = self.slots.get(id)
+        return 0 if slot is None else 1 << slot
+
+    def passed_on(self, id : int) -> int:
+        """
+        Bits a node hands to the nodes after it: its learned ancestors, plus itself if learned
+        """
+        return self.learned_before.get(id, 0) | self.bit(id)
+
+    def _propagate(self, queue : Iterable[int]):
+        """
+        Push the bits of the queued nodes forward until nothing changes
+        """
+        queue = deque(queue)
+        V, learned_before = self.graph.V, self.learned_before
+        while queue:
+            id = queue.popleft()
+            if id not in V:
+                continue
+            bits = self.passed_on(id)
+            if not bits:
+                continue
+            for id_f in V[id].forward_neighbors:
+                old = learned_before.get(id_f, 0)
+                if bits & ~old:
+                    learned_before[id_f] = old | bits
+                    queue.append(id_f)
+
+    def _retract(self, starts : Iterable[int], bits : int):
+        """
+        Recompute, for the nodes below starts, the given bits, which may have arrived through something removed
+        """
+        if not bits:
+            return
+        V, learned_before = self.graph.V, self.learned_before
+        # Only nodes holding one of the bits can lose it, and they pass it on only to nodes after them
+        region = set()
+        queue = deque(id for id in starts if id in V and learned_before.get(id, 0) & bits)
+        region.update(queue)
+        while queue:
+            id = queue.popleft()
+            for id_f in V[id].forward_neighbors:
+                if id_f not in region and learned_before.get(id_f, 0) & bits:
+                    region.add(id_f)
+                    queue.append(id_f)
+
+        for id in region:
+            remaining = learned_before[id] & ~bits
+            if remaining:
+                learned_before[id] = remaining
+            else:
+                del learned_before[id]
+        # Bits still held just outside the region flow back in
+        boundary = {id_b for id in region for id_b in V[id].backward_neighbors if id_b not in region}
+        self._propagate(boundary | {id for id in region if id in self.slots})
+
+    # ==== UPDATES ====
+    def add_edge(self, id_start : int, id_end : int):
+        bits = self.passed_on(id_start)
+        if bits & ~self.learned_before.get(id_end, 0):
+            self.learned_before[id_end] = self.learned_before.get(id_end, 0) | bits
+            self._propagate([id_end])
+
+    def remove_edge(self, id_start : int, id_end : int):
+        self._retract([id_end], self.passed_on(id_start))
+
+    def remove_node(self, node):
+        """
+        Call after node has been removed from the graph
+        """
+        bits = self.learned_before.pop(node.id, 0) | self.bit(node.id)
+        self._unassign(node.id)
+        self._retract(node.forward_neighbors, bits)
+
+    def set_tagged(self, id : int, tagged : bool):
+        if tagged and id not in self.slots:
+            self._assign(id)
+            self._propagate([id])
+        elif not tagged and id in self.slots:
+            bit = self.bit(id)
+            self._unassign(id)
+            self._retract(self.graph.V[id].forward_neighbors, bit) # Nothing else can hold its bit
+
+    def _unassign(self, id : int):
+        slot = self.slots.pop(id, None)
+        if slot is not None:
+            del self.slot_ids[slot]
+            self.free.append(slot)
+
+    # ==== QUERIES ====
+    def learned_ancestors(self, id : int) -> List[int]:
+        """
+        Learned nodes that id can be reached from
+        """
+        bits = self.learned_before.get(id, 0)
+        found = []
+        while bits:
+            low = bits & -bits
+            found.append(self.slot_ids[low.bit_length() - 1])
+            bits ^= low
+        return [ancestor for ancestor in found if ancestor != id]
+
+    def is_learned_ancestor(self, ancestor : int, id : int) -> bool:
+        return ancestor != id and bool(self.learned_before.get(id, 0) & self.bit(ancestor))
+
+    def learned_neighbors(self, id : int) -> List[int]:
+        """
+        Learned nodes directly before or after id
+        """
+        node = self.graph.V[id]
+        tagged = self.graph.tagged_vertices
+        return [nbr for nbr in dict.fromkeys(list(node.backward_neighbors) + list(node.forward_neighbors)) if nbr != id and tagged.get(nbr)]
+
+    def prerequisite_path(self, id : int) -> List[int]:
+        """
+        Shortest path of prerequisites ending at id, starting from the closest learned node, or from the
+        closest node without prerequisites if nothing learned leads to id. [id] if it is learned or has no prerequisites
+
+        Unlike learned_ancestors this is not a lookup but a breadth first search backwards from id, so its cost
+        grows with the ancestors of id. When something learned leads to id it only enters nodes with learned
+        ancestors and stops at the closest learned node, costing the ancestors nearer than that. Otherwise it
+        stops at the closest node without prerequisites, which can mean visiting every ancestor
+        """
+        V, learned_before = self.graph.V, self.learned_before
+        if id in self.slots or not V[id].backward_neighbors:
+            return [id]
+        # Going backwards, only nodes that lead to something learned are worth entering
+        toward_learned = learned_before.get(id, 0) != 0
+        came_from = {id : None}
+        queue = deque([id])
+        while queue:
+            current = queue.popleft()
+            if current != id and (current in self.slots if toward_learned else not V[current].backward_neighbors):
+                path = [current]
+                while came_from[path[-1]] is not None:
+                    path.append(came_from[path[-1]])
+                return path
+            for id_b in V[current].backward_neighbors:
+                if id_b not in came_from and (not toward_learned or id_b in self.slots or learned_before.get(id_b, 0)):
+                    came_from[id_b] = current
+                    queue.append(id_b)
+        return [id] # Only a cycle leads here
+
+def topological(graph, ids : Iterable[int]) -> List[int]:
+    """
+    ids ordered so that, within the subgraph they induce, every node comes after its prerequisites.
+    Nodes on a cycle keep their ID order at the end
+    """
+    ids = list(dict.fromkeys(ids))
+    members = set(ids)
+    indegree = {id : sum(1 for id_b in graph.V[id].backward_neighbors if id_b in members and id_b != id) for id in ids}
+    queue = deque(id for id in ids if indegree[id] == 0)
+    order = []
+    while queue:
+        id = queue.popleft()
+        order.append(id)
+        for id_f in graph.V[id].forward_neighbors:
+            if id_f in members and id_f != id:
+                indegree[id_f] -= 1
+                if indegree[id_f] == 0:
+                    queue.append(id_f)
+    if len(order) < len(ids):
+        placed = set(order)
+        order.extend(sorted(id for id in ids if id not in placed))
+    return order
+
+def tutor_context(graph, focus : List[int], max_concepts : int = 30) -> Dict[str, Optional[str]]:
+    """
+    Decorations for the Tutor about the concepts a question is about (focus): the learned concepts that
+    lead to them or sit next to them, the shortest prerequisite path to each, and the edges between all of
+    those. Without a focus only the learned concepts are listed. Keys with nothing to say map to None
+    """
+    index = graph.reachability
+    names = lambda ids: ", ".join(graph.V[id].display_text for id in ids)
+    tagged = graph.tagged_vertices
+
+    if not focus:
+        learned = [id for id in graph.V if tagged.get(id)]
+        text = names(learned[:max_concepts]) + (f" (and {len(learned) - max_concepts} more)" if len(learned) > max_concepts else "")
+        return {"LEARNED CONCEPTS" : text, "PREREQUISITES" : None, "RELEVANT GRAPH" : None}
+
+    paths = {id : index.prerequisite_path(id) for id in focus}
+    # Closest first: what touches the focus or is on a path to it, then the other learned ancestors
+    relevant = [id for id in focus if tagged.get(id)]
+    for id in focus:
+        relevant += [nbr for nbr in index.learned_neighbors(id)]
+        relevant += [step for step in paths[id] if tagged.get(step)]
+    for id in focus:
+        relevant += index.learned_ancestors(id)
+    relevant = list(dict.fromkeys(relevant))[:max_concepts]
+
+    lines = []
+    for id in focus:
+        path = paths[id]
+        name = graph.V[id].display_text
+        if tagged.get(id):
+            lines.append(f"{name}: already learned")
+        elif len(path) == 1:
+            lines.append(f"{name}: no prerequisites in the graph")
+        else:
+            start = "from learned " if tagged.get(path[0]) else "from "
+            missing = [step for step in path[1:-1] if not tagged.get(step)]
+            first = f" (learn first: {names(missing)})" if missing else ""
+            lines.append(f"{name}: {start}{' -> '.join(graph.V[step].display_text for step in path)}{first}")
+
+    shown = topological(graph, relevant + [step for path in paths.values() for step in path] + list(focus))
+    members = set(shown)
+    edges = [
+        f"{graph.V[id].display_text} -> {graph.V[id_f].display_text}"
+        for id in shown for id_f in graph.V[id].forward_neighbors if id_f in members and id_f != id
+    ]
+    return {
+        "LEARNED CONCEPTS" : names(topological(graph, relevant)) or "None of the prerequisites",
+        "PREREQUISITES" : "\n ".join(lines),
+        "RELEVANT GRAPH" : "\n ".join(edges[:4 * max_concepts]) or None
+    }
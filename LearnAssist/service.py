@@ -0,0 +1,488 @@
+"""
+Many chat sessions in one process, behind a small asyncio HTTP server (standard library only).
+
+Each session is a named BaseChatHarness, ConceptExpanderChat or Tutor with its own history. Sessions of a
+kind share one message_base, so the prompt is held once however many sessions there are. A session's
+history is kept within a token budget by its ContextWindow, sessions idle for a while (or the least recently
+used ones, past max_sessions) are written to disk and loaded back on their next message, and upstream
+requests are scheduled round robin over sessions so one busy session can't hold up the rest.
+
+    python -m LearnAssist.service --port 8766
+    curl -X POST localhost:8766/sessions/alice -d '{"kind" : "tutor"}'
+    curl -X POST localhost:8766/sessions/alice/messages -d '{"message" : "What is a limit?", "decorations" : {"LEARNED CONCEPTS" : "Functions"}}'
+
+    POST   /sessions/<name>           {"kind" : "base" | "expander" | "tutor"}, creates the session
+    POST   /sessions/<name>/messages  {"message" : ..., "decorations" : {...}, "kind" : ...}, kind creates the session if missing
+    POST   /sessions/<name>/reset     forget the history
+    GET    /sessions/<name>           kind, turns and history
+    DELETE /sessions/<name>
+    GET    /stats
+
+Load test against a fake backend with python -m benchmarks.service.
+"""
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http import HTTPStatus
+from urllib.parse import quote, unquote, urlsplit
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+
+from LearnAssist.backends import CompletionBackend, default_backend
+from LearnAssist.chat_harness import BaseChatHarness, ConceptExpanderChat
+from LearnAssist.context import ContextWindow
+from LearnAssist.profiling import PROFILER
+from LearnAssist.transport import shared_transport
+
+@dataclass
+class SessionKind:
+    harness_class : type
+    prompt : str
+
+KINDS = {
+    "base" : SessionKind(BaseChatHarness, "LearnAssist/prompts/basechat.txt"),
+    "expander" : SessionKind(ConceptExpanderChat, "LearnAssist/prompts/json_prompt.txt"),
+    "tutor" : SessionKind(BaseChatHarness, "LearnAssist/prompts/tutor.txt")
+}
+
+class ServiceError(Exception):
+    """
+    Request that can't be served, with the HTTP status to answer with
+    """
+    def __init__(self, message : str, status : int = 400):
+        super().__init__(message)
+        self.status = status
+
+class Session:
+    __slots__ = ("name", "kind", "harness", "turns", "last_used", "pending", "busy")
+
+    def __init__(self, name : str, kind : str, harness : BaseChatHarness, turns : int = 0):
+        self.name = name
+        self.kind = kind
+        self.harness = harness
+        self.turns = turns
+        self.last_used = time.monotonic()
+        self.pending : Deque[Tuple[Callable[[], Any], asyncio.Future]] = deque() # Turns waiting to run, in order
+        self.busy = False # A turn is running
+
+    @property
+    def idle(self) -> bool:
+        return not self.busy and not self.pending
+
+    def history(self) -> List[dict]:
+        """
+        Messages after the shared message_base
+        """
+        return self.harness.messages[len(self.harness.message_base):]
+
+class FairScheduler:
+    """
+    Runs session turns on a thread pool, at most max_concurrency at once. Sessions with turns waiting take
+    turns round robin: after each turn a session goes to the back of the line, so a session with many queued
+    messages gets one slot in turn like everyone else. A session never has two turns running, so its
+    history sees them in the order they were sent.
+
+    :param max_concurrency: Turns running at once, at most the transport's limit is useful
+    """
+    def __init__(self, max_concurrency : int = 8):
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_workers = max_concurrency, thread_name_prefix = "session")
+        self.ready : Deque[Session] = deque() # Sessions with a turn waiting and none running
+        self.running = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(session.pending) for session in self.ready)
+
+    def submit(self, session : Session, turn : Callable[[], Any]) -> asyncio.Future:
+        """
+        Queue turn() to run for session, the result is awaited on the returned future
+        """
+        future = asyncio.get_running_loop().create_future()
+        session.pending.append((turn, future))
+        if not session.busy and len(session.pending) == 1:
+            self.ready.append(session)
+        self._dispatch()
+        return future
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while self.running < self.max_concurrency and self.ready:
+            session = self.ready.popleft()
+            turn, future = session.pending.popleft()
+            if future.cancelled(): # Client went away while waiting
+                if session.pending:
+                    self.ready.append(session)
+                continue
+            session.busy = True
+            self.running += 1
+            task = loop.run_in_executor(self.executor, turn)
+            task.add_done_callback(lambda task, session = session, future = future: self._finished(session, future, task))
+
+    def _finished(self, session : Session, future : asyncio.Future, task : asyncio.Future):
+        self.running -= 1
+        session.busy = False
+        session.last_used = time.monotonic()
+        if not future.cancelled():
+            if task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+        if session.pending:
+            self.ready.append(session)
+        self._dispatch()
+
+    def shutdown(self):
+        self.executor.shutdown(wait = False, cancel_futures = True)
+
+class SessionManager:
+    """
+    Named sessions, created on demand, evicted to state_dir (one JSON file per session) when idle for
+    idle_seconds or when more than max_sessions are in memory, and loaded back when used again.
+    Decorations are saved with the history.
+
+    :param state_dir: Directory for evicted sessions
+    :param backend: Backend of every session, the default backend if None
+    :param max_sessions: Sessions kept in memory, the least recently used idle ones are evicted past this
+    :param idle_seconds: Sessions unused for this long are evicted
+    :param max_session_tokens: Token budget of each session's history, older turns are dropped past it
+    :param max_concurrency: Upstream requests in flight over all sessions
+    :param engine: Model of every session
+    """
+    def __init__(self, state_dir : str, backend : CompletionBackend = None, max_sessions : int = 1000, idle_seconds : float = 600,
+        max_session_tokens : int = 2000, max_concurrency : int = 8, engine : str = "gpt-3.5-turbo"):
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok = True)
+        self.backend = backend if backend is not None else default_backend()
+        self.transport = shared_transport(self.backend)
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.max_session_tokens = max_session_tokens
+        self.engine = engine
+
+        self.scheduler = FairScheduler(max_concurrency)
+        self.sessions : 'OrderedDict[str, Session]' = OrderedDict() # Least recently used first
+        self.bases : Dict[str, List[dict]] = {} # Kind -> message_base shared by its sessions
+
+        self.created = 0
+        self.evicted = 0
+        self.loaded = 0
+
+    # ==== SESSIONS ====
+    def make_harness(self, kind : str) -> BaseChatHarness:
+        if kind not in KINDS:
+            raise ServiceError(f"Unknown kind {kind}, one of {', '.join(KINDS)}")
+        spec = KINDS[kind]
+        context = ContextWindow(budget = self.max_session_tokens, engine = self.engine)
+        harness = spec.harness_class(spec.prompt, engine = self.engine, context = context, backend = self.backend,
+            transport = self.transport, message_base = self.bases.get(kind))
+        self.bases.setdefault(kind, harness.message_base)
+        return harness
+
+    def path(self, name : str) -> str:
+        return os.path.join(self.state_dir, quote(name, safe = "") + ".json")
+
+    def get(self, name : str, kind : str = None) -> Session:
+        """
+        The session called name, loaded from disk if it was evicted. Created if missing and kind is given
+        """
+        session = self.sessions.get(name)
+        if session is None:
+            session = self.load(name)
+        if session is None:
+            if kind is None:
+                raise ServiceError(f"No session {name}", 404)
+            session = Session(name, kind, self.make_harness(kind))
+            self.created += 1
+        elif kind is not None and kind != session.kind:
+            raise ServiceError(f"Session {name} is a {session.kind} session", 409)
+
+        self.sessions[name] = session
+        self.sessions.move_to_end(name)
+        session.last_used = time.monotonic()
+        self.enforce_limit(keep = name)
+        return session
+
+    def load(self, name : str) -> Optional[Session]:
+        path = self.path(name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding = "utf-8") as f:
+            state = json.load(f)
+        harness = self.make_harness(state["kind"])
+        harness.messages = harness.messages + state["messages"]
+        for key, val in state["decorations"].items():
+            harness.update_decoration(key, val)
+        os.remove(path) # Memory holds the latest state until the next eviction
+        self.loaded += 1
+        return Session(name, state["kind"], harness, state["turns"])
+
+    def evict(self, session : Session):
+        state = {
+            "kind" : session.kind,
+            "turns" : session.turns,
+            "messages" : session.history(),
+            "decorations" : session.harness.message_decorators
+        }
+        path = self.path(session.name)
+        with open(path + ".tmp", 'w', encoding = "utf-8") as f:
+            json.dump(state, f, ensure_ascii = False)
+        os.replace(path + ".tmp", path)
+        del self.sessions[session.name]
+        self.evicted += 1
+
+    def enforce_limit(self, keep : str = None):
+        """
+        Evict the least recently used idle sessions past max_sessions, other than keep (about to be used)
+        """
+        excess = len(self.sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        for session in [session for session in self.sessions.values() if session.idle and session.name != keep][:excess]:
+            self.evict(session)
+
+    def evict_idle(self) -> int:
+        cutoff = time.monotonic() - self.idle_seconds
+        stale = [session for session in self.sessions.values() if session.idle and session.last_used < cutoff]
+        for session in stale:
+            self.evict(session)
+        return len(stale)
+
+    def delete(self, name : str):
+        session = self.sessions.pop(name, None)
+        if session is not None:
+            for _, future in session.pending:
+                future.cancel()
+        elif os.path.exists(self.path(name)):
+            os.remove(self.path(name))
+        else:
+            raise ServiceError(f"No session {name}", 404)
+
+    # ==== TURNS ====
+    async def converse(self, name : str, message : str, decorations : Dict[str, Optional[str]] = None, kind : str = None):
+        """
+        Send message in session name and wait for the reply (a dict for expander sessions)
+        """
+        session = self.get(name, kind)
+        harness = session.harness
+
+        def turn():
+            for key, val in (decorations or {}).items():
+                harness.update_decoration(key, val)
+            reply = harness.converse(message)
+            if isinstance(reply, dict) or (isinstance(reply, str) and not reply.startswith("API Error : ")):
+                session.turns += 1 # Counted while the session is busy, it can be evicted as soon as the scheduler lets go of it
+            return reply
+
+        try:
+            reply = await self.scheduler.submit(session, turn)
+        except ValueError as e: # Expander reply without a JSON object
+            raise ServiceError(f"Unusable reply: {e}", 502)
+        if isinstance(reply, str) and reply.startswith("API Error : "): # converse returns API errors as text
+            raise ServiceError(reply, 502)
+        if not isinstance(reply, (str, dict)):
+            raise ServiceError(f"Unusable reply {reply!r}", 502)
+        return reply
+
+    async def reset(self, name : str):
+        session = self.get(name)
+
+        def reset():
+            session.harness.reset()
+            session.turns = 0
+
+        await self.scheduler.submit(session, reset) # After the turns already queued
+
+    def stats(self) -> dict:
+        stats = {
+            "sessions_in_memory" : len(self.sessions),
+            "sessions_on_disk" : sum(1 for file in os.listdir(self.state_dir) if file.endswith(".json")),
+            "created" : self.created,
+            "evicted" : self.evicted,
+            "loaded" : self.loaded,
+            "running" : self.scheduler.running,
+            "queued" : self.scheduler.queued
+        }
+        stats["transport"] = self.transport.stats()
+        return stats
+
+    async def sweep(self, period : float = None):
+        """
+        Evict idle sessions forever, every period seconds (a quarter of idle_seconds by default)
+        """
+        period = period if period is not None else max(1.0, self.idle_seconds / 4)
+        while True:
+            await asyncio.sleep(period)
+            self.evict_idle()
+
+    def shutdown(self):
+        """
+        Write every session to disk, so a restarted service picks up where this one stopped
+        """
+        self.scheduler.shutdown()
+        for session in list(self.sessions.values()):
+            self.evict(session)
+
+# ==== HTTP ====
+class ChatService:
+    """
+    HTTP/1.1 front end of a SessionManager, JSON in and out, with keep-alive
+
+    :param manager: Sessions to serve
+    :param max_body: Largest request body in bytes
+    """
+    def __init__(self, manager : SessionManager, max_body : int = 1 << 20):
+        self.manager = manager
+        self.max_body = max_body
+        self.server : asyncio.AbstractServer = None
+        self.connections = set() # Handler task of every open connection
+
+    async def route(self, method : str, path : str, body : dict) -> Tuple[int, Any]:
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        manager = self.manager
+        if parts == ["stats"] and method == "GET":
+            return 200, manager.stats()
+        if len(parts) < 2 or parts[0] != "sessions":
+            raise ServiceError(f"Unknown path {path}", 404)
+
+        name, action = parts[1], "/".join(parts[2:])
+        if action == "" and method == "POST":
+            kind = body.get("kind", "base")
+            existed = name in manager.sessions or os.path.exists(manager.path(name))
+            session = manager.get(name, kind)
+            return (200 if existed else 201), {"name" : name, "kind" : session.kind}
+        if action == "" and method == "GET":
+            session = manager.get(name)
+            return 200, {"name" : name, "kind" : session.kind, "turns" : session.turns, "messages" : session.history()}
+        if action == "" and method == "DELETE":
+            manager.delete(name)
+            return 200, {"name" : name}
+        if action == "messages" and method == "POST":
+            if not isinstance(body.get("message"), str):
+                raise ServiceError("message must be a string")
+            PROFILER.count("service.messages")
+            with PROFILER.time("service.turn"):
+                reply = await manager.converse(name, body["message"], body.get("decorations"), body.get("kind"))
+            return 200, {"reply" : reply}
+        if action == "reset" and method == "POST":
+            await manager.reset(name)
+            return 200, {"name" : name}
+        raise ServiceError(f"Unknown request {method} {path}", 404)
+
+    @staticmethod
+    def response(status : int, data : Any, keep_alive : bool) -> bytes:
+        payload = json.dumps(data, ensure_ascii = False).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(payload)}"
+        ]
+        if not keep_alive:
+            head.append("Connection: close")
+        return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload
+
+    async def handle(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                method, target, version = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    key, _, val = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = val.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body:
+                    writer.write(self.response(413, {"error" : "Body too large"}, False))
+                    await writer.drain()
+                    break
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    try:
+                        data = json.loads(body) if body else {}
+                    except ValueError:
+                        raise ServiceError("Body is not JSON")
+                    if not isinstance(data, dict):
+                        raise ServiceError("Body must be a JSON object")
+                    status, result = await self.route(method, urlsplit(target).path, data)
+                except ServiceError as e:
+                    status, result = e.status, {"error" : str(e)}
+                except Exception as e:
+                    status, result = 500, {"error" : f"{type(e).__name__}: {e}"}
+
+                writer.write(self.response(status, result, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+            pass # Client went away, sent something that isn't HTTP, or the service is stopping
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    async def start(self, host : str = "127.0.0.1", port : int = 8766) -> asyncio.AbstractServer:
+        """
+        Start listening, port 0 picks a free port (see server.sockets[0].getsockname())
+        """
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def stop(self):
+        """
+        Stop listening and drop open connections, abandoning the requests they are waiting on
+        """
+        self.server.close()
+        for task in list(self.connections):
+            task.cancel()
+        await asyncio.gather(*self.connections, return_exceptions = True)
+        await self.server.wait_closed()
+
+async def serve(manager : SessionManager, host : str, port : int):
+    service = ChatService(manager)
+    server = await service.start(host, port)
+    sweeper = asyncio.create_task(manager.sweep())
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        pass # Windows, only Ctrl+C saves the sessions
+    print(f"Serving sessions on http://{host}:{server.sockets[0].getsockname()[1]}")
+    try:
+        await server.serve_forever()
+    finally:
+        sweeper.cancel()
+        await service.stop()
+        manager.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description = "Serve many chat sessions from one process over HTTP")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8766)
+    parser.add_argument("--state-dir", default = "saves/sessions", help = "Where idle sessions are written")
+    parser.add_argument("--max-sessions", type = int, default = 1000, help = "Sessions kept in memory")
+    parser.add_argument("--idle", type = float, default = 600, help = "Seconds before an unused session is written to disk")
+    parser.add_argument("--max-session-tokens", type = int, default = 2000, help = "Token budget of each session's history")
+    parser.add_argument("--concurrency", type = int, default = 8, help = "Upstream requests in flight over all sessions")
+    args = parser.parse_args()
+
+    manager = SessionManager(args.state_dir, max_sessions = args.max_sessions, idle_seconds = args.idle,
+        max_session_tokens = args.max_session_tokens, max_concurrency = args.concurrency)
+    try:
+        asyncio.run(serve(manager, args.host, args.port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass # Sessions were written to disk on the way out
+
+if __name__ == "__main__":
+    main()
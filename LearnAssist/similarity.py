@@ -0,0 +1,263 @@
+from typing import Callable, Dict, Iterable, List, Tuple
+from collections import Counter
+import math
+import re
+import zlib
+
+import numpy as np
+
+from LearnAssist.name_index import normalize
+
+class SimilarityIndex:
+    """
+    Vectors for node names, for finding near duplicate concepts ("Euler identity" / "Eulers Identity").
+
+    A name is normalized (and plurals folded) and split into character n-grams, weighted by TF-IDF and hashed (with a sign)
+    into a fixed number of dimensions, then scaled to unit length. Rows live in one float32 matrix so
+    cosine similarity is a matrix product. Whole graph duplicate search uses random hyperplane LSH:
+    names only become a candidate pair if their sign bits agree on a whole band, so it is close to linear
+    in the number of names instead of quadratic.
+
+    :param dim: Hashed vector size
+    :param n: n-gram length
+    :param bands: LSH bands, more finds more true pairs and more candidates to check
+    :param rows: Bits per band, more makes candidates rarer
+    :param seed: Seed of the LSH hyperplanes
+    """
+    REWEIGHT_GROWTH = 2 # Vectors are recomputed with fresh IDF weights once the index grows by this factor
+
+    def __init__(self, dim : int = 256, n : int = 3, bands : int = 32, rows : int = 18, seed : int = 0):
+        self.dim = dim
+        self.n = n
+        self.bands = bands
+        self.rows = rows
+        self.planes = np.random.default_rng(seed).standard_normal((dim, bands * rows)).astype(np.float32)
+        self.bit_weights = (1 << np.arange(rows, dtype = np.int64))
+
+        self.ids : List[int] = []
+        self.index : Dict[int, int] = {} # ID -> row
+        self.keys : Dict[int, str] = {} # ID -> folded name
+        self.vectors = np.zeros((0, dim), dtype = np.float32)
+        self.df = Counter() # n-gram -> names containing it
+        self.slots : Dict[str, Tuple[int, float]] = {} # n-gram -> (dimension, sign) it hashes to
+        self.weighted_at = 0 # Number of names when the vectors were last weighted
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def fold(name : str) -> str:
+        """
+        Normalized name with plural "s" endings dropped, so "Eulers Identity" and "Euler identity" match
+        """
+        return " ".join(word[:-1] if len(word) > 3 and word[-1] == "s" and word[-2] != "s" else word for word in normalize(name).split())
+
+    def grams(self, key : str) -> Counter:
+        padded = f" {key} "
+        return Counter(padded[i:i + self.n] for i in range(max(1, len(padded) - self.n + 1)))
+
+    def embed(self, key : str) -> np.ndarray:
+        """
+        Unit vector of a normalized name under the current IDF weights
+        """
+        vector = np.zeros(self.dim, dtype = np.float32)
+        n_docs = len(self.ids) + 1
+        for gram, count in self.grams(key).items():
+            slot = self.slots.get(gram)
+            if slot is None:
+                h = zlib.crc32(gram.encode("utf-8"))
+                slot = self.slots[gram] = (h % self.dim, 1.0 if (h >> 16) & 1 else -1.0)
+            idf = math.log((1 + n_docs) / (1 + self.df.get(gram, 0))) + 1
+            vector[slot[0]] += slot[1] * count * idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def insert(self, id : int, name : str) -> str:
+        if id in self.index:
+            self.remove(id)
+        key = self.fold(name)
+        self.df.update(self.grams(key).keys())
+        self.keys[id] = key
+        self.index[id] = len(self.ids)
+        self.ids.append(id)
+        if len(self.ids) > len(self.vectors):
+            grown = np.zeros((max(16, 2 * len(self.vectors)), self.dim), dtype = np.float32)
+            grown[:len(self.vectors)] = self.vectors
+            self.vectors = grown
+        return key
+
+    def add(self, id : int, name : str):
+        key = self.insert(id, name)
+        if len(self.ids) >= max(16, self.REWEIGHT_GROWTH * self.weighted_at):
+            self.reweight()
+        else:
+            self.vectors[len(self.ids) - 1] = self.embed(key)
+
+    def add_many(self, items : Iterable[Tuple[int, str]]):
+        """
+        Add (id, name) pairs, embedding each name once at the end instead of as it comes in
+        """
+        start = len(self.ids)
+        for id, name in items:
+            self.insert(id, name)
+        if len(self.ids) >= max(16, self.REWEIGHT_GROWTH * self.weighted_at):
+            self.reweight()
+        else:
+            for row in range(start, len(self.ids)):
+                self.vectors[row] = self.embed(self.keys[self.ids[row]])
+
+    def remove(self, id : int):
+        row = self.index.pop(id, None)
+        if row is None:
+            return
+        self.df.subtract(self.grams(self.keys.pop(id)).keys())
+        last = len(self.ids) - 1
+        if row != last: # Move the last row into the hole
+            moved = self.ids[last]
+            self.ids[row] = moved
+            self.index[moved] = row
+            self.vectors[row] = self.vectors[last]
+        self.ids.pop()
+
+    def rename(self, id : int, name : str):
+        self.add(id, name)
+
+    def reweight(self):
+        self.weighted_at = len(self.ids)
+        for row, id in enumerate(self.ids):
+            self.vectors[row] = self.embed(self.keys[id])
+
+    def matrix(self) -> np.ndarray:
+        return self.vectors[:len(self.ids)]
+
+    # ==== QUERIES ====
+    def top_k(self, names : List[str], k : int = 5, batch : int = 256) -> List[List[Tuple[int, float]]]:
+        """
+        For each name, the k most similar indexed names as (id, cosine) pairs, best first
+        """
+        matrix = self.matrix()
+        k = min(k, len(self.ids))
+        out = []
+        for start in range(0, len(names), batch):
+            queries = np.stack([self.embed(self.fold(name)) for name in names[start:start + batch]])
+            if k == 0:
+                out.extend([] for _ in queries)
+                continue
+            scores = queries @ matrix.T
+            best = np.argpartition(-scores, k - 1, axis = 1)[:, :k]
+            for row, cols in enumerate(best):
+                cols = cols[np.argsort(-scores[row, cols])]
+                out.append([(self.ids[col], float(scores[row, col])) for col in cols])
+        return out
+
+    def similar_to(self, ids : List[int], threshold : float) -> List[Tuple[int, int, float]]:
+        """
+        (id, other id, cosine) for every indexed name at least threshold similar to one of ids
+        """
+        rows = np.array([self.index[id] for id in ids if id in self.index], dtype = np.int64)
+        if len(rows) == 0:
+            return []
+        matrix = self.matrix()
+        pairs = []
+        for start in range(0, len(rows), 256):
+            chunk = rows[start:start + 256]
+            scores = matrix[chunk] @ matrix.T
+            scores[np.arange(len(chunk)), chunk] = 0 # Not similar to itself
+            hit_rows, hit_cols = np.nonzero(scores >= threshold)
+            for r, c in zip(hit_rows.tolist(), hit_cols.tolist()):
+                pairs.append((self.ids[chunk[r]], self.ids[c], float(scores[r, c])))
+        return pairs
+
+    def signatures(self) -> np.ndarray:
+        """
+        LSH band keys, one int per band for each row
+        """
+        bits = (self.matrix() @ self.planes) > 0
+        return bits.reshape(len(self.ids), self.bands, self.rows).astype(np.int64) @ self.bit_weights
+
+    def candidate_pairs(self, window : int = 32) -> np.ndarray:
+        """
+        Row pairs (a < b) that share a band key. Within each band rows are sorted by key and compared
+        with the next window rows, which bounds the work when many names fall in one bucket
+        """
+        n = len(self.ids)
+        if n < 2:
+            return np.zeros((0, 2), dtype = np.int64)
+        keys = self.signatures()
+        found = []
+        for band in range(self.bands):
+            order = np.argsort(keys[:, band], kind = "stable")
+            sorted_keys = keys[order, band]
+            for offset in range(1, min(window, n - 1) + 1):
+                same = np.nonzero(sorted_keys[offset:] == sorted_keys[:-offset])[0]
+                if len(same) == 0:
+                    break # Runs are contiguous, so no run is longer than offset
+                a, b = order[same], order[same + offset]
+                found.append(np.minimum(a, b) * n + np.maximum(a, b))
+        if not found:
+            return np.zeros((0, 2), dtype = np.int64)
+        packed = np.unique(np.concatenate(found))
+        return np.stack([packed // n, packed % n], axis = 1)
+
+    def duplicate_pairs(self, threshold : float) -> List[Tuple[int, int, float]]:
+        """
+        (id, id, cosine) for name pairs at least threshold similar, most similar first
+        """
+        pairs = self.candidate_pairs()
+        matrix = self.matrix()
+        out = []
+        for start in range(0, len(pairs), 1 << 16):
+            chunk = pairs[start:start + (1 << 16)]
+            scores = np.einsum("ij,ij->i", matrix[chunk[:, 0]], matrix[chunk[:, 1]])
+            for (a, b), score in zip(chunk[scores >= threshold].tolist(), scores[scores >= threshold].tolist()):
+                out.append((self.ids[a], self.ids[b], score))
+        out.sort(key = lambda pair: -pair[2])
+        return out
+
+NUMBER = re.compile(r"\d+")
+EXACT_SEARCH_LIMIT = 1024 # Most new nodes checked against the whole index exactly by merge_duplicates
+
+def same_numbers(key_a : str, key_b : str) -> bool:
+    """
+    "Calculus 1" and "Calculus 2" are close as text but different concepts
+    """
+    return NUMBER.findall(key_a) == NUMBER.findall(key_b)
+
+def merge_duplicates(graph, ids : Iterable[int] = None, threshold : float = 0.9, merge : Callable[[int, int], None] = None) -> Dict[int, int]:
+    """
+    Merge near duplicate nodes of graph into one another. With ids, only those nodes are checked (against
+    the whole graph), otherwise every pair is. The older node (lower ID) is kept.
+    Returns {merged away ID : ID it was merged into}
+
+    :param merge: Called as merge(keep, drop) instead of graph.merge_nodes, e.g. to also move positions
+    """
+    merge = merge or graph.merge_nodes
+    index = graph.similarity
+    if index is None:
+        return {}
+    if ids is None:
+        pairs = index.duplicate_pairs(threshold)
+    else:
+        ids = list(ids)
+        if len(ids) <= EXACT_SEARCH_LIMIT:
+            pairs = sorted(index.similar_to(ids, threshold), key = lambda pair: -pair[2])
+        else: # Checking every new name against every name would be quadratic, use the LSH candidates instead
+            wanted = set(ids)
+            pairs = [pair for pair in index.duplicate_pairs(threshold) if pair[0] in wanted or pair[1] in wanted]
+
+    merged : Dict[int, int] = {}
+    def find(id):
+        while id in merged:
+            id = merged[id]
+        return id
+
+    for a, b, _ in pairs:
+        a, b = find(a), find(b)
+        if a == b or a not in graph.V or b not in graph.V:
+            continue
+        if not same_numbers(index.keys[a], index.keys[b]):
+            continue
+        keep, drop = min(a, b), max(a, b)
+        merge(keep, drop)
+        merged[drop] = keep
+    return {drop : find(drop) for drop in merged}
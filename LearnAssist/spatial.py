@@ -0,0 +1,143 @@
+from typing import Dict, List, Tuple, Set, Iterable
+import math
+import random
+
+class SpatialGrid:
+    """
+    Uniform grid hash over node positions. Each point lives in the cell that contains it,
+    so point, radius and rectangle queries only look at the cells they overlap.
+
+    :param cell_size: Side length of a grid cell in world units. Works best around the node diameter
+    """
+    def __init__(self, cell_size : float = 120):
+        self.cell_size = cell_size
+        self.cells : Dict[Tuple[int, int], Set[int]] = {}
+        self.positions : Dict[int, Tuple[float, float]] = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, id : int):
+        return id in self.positions
+
+    def _cell(self, x : float, y : float) -> Tuple[int, int]:
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def insert(self, id : int, x : float, y : float):
+        if id in self.positions:
+            self.move(id, x, y)
+            return
+        self.positions[id] = (x, y)
+        self.cells.setdefault(self._cell(x, y), set()).add(id)
+
+    def move(self, id : int, x : float, y : float):
+        old = self._cell(*self.positions[id])
+        new = self._cell(x, y)
+        self.positions[id] = (x, y)
+        if old != new:
+            self._discard(old, id)
+            self.cells.setdefault(new, set()).add(id)
+
+    def remove(self, id : int):
+        pos = self.positions.pop(id, None)
+        if pos is not None:
+            self._discard(self._cell(*pos), id)
+
+    def _discard(self, cell : Tuple[int, int], id : int):
+        members = self.cells[cell]
+        members.discard(id)
+        if not members:
+            del self.cells[cell]
+
+    def clear(self):
+        self.cells.clear()
+        self.positions.clear()
+
+    def _cells_in(self, x0 : float, y0 : float, x1 : float, y1 : float) -> Iterable[Set[int]]:
+        cx0, cy0 = self._cell(x0, y0)
+        cx1, cy1 = self._cell(x1, y1)
+        n_cells = (cx1 - cx0 + 1) * (cy1 - cy0 + 1)
+        if n_cells > len(self.cells):
+            # Rectangle covers more cells than are occupied, walk the occupied ones instead
+            for (cx, cy), members in self.cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    yield members
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    members = self.cells.get((cx, cy))
+                    if members:
+                        yield members
+
+    def query_rect(self, x0 : float, y0 : float, x1 : float, y1 : float) -> List[int]:
+        """
+        Ids of all points inside the rectangle [x0, x1] x [y0, y1]
+        """
+        out = []
+        positions = self.positions
+        for members in self._cells_in(x0, y0, x1, y1):
+            for id in members:
+                x, y = positions[id]
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    out.append(id)
+        return out
+
+    def query_radius(self, x : float, y : float, radius : float) -> List[int]:
+        """
+        Ids of all points within radius of (x, y)
+        """
+        out = []
+        r2 = radius * radius
+        positions = self.positions
+        for members in self._cells_in(x - radius, y - radius, x + radius, y + radius):
+            for id in members:
+                px, py = positions[id]
+                if (px - x) ** 2 + (py - y) ** 2 <= r2:
+                    out.append(id)
+        return out
+
+    def nearest(self, x : float, y : float, radius : float) -> int:
+        """
+        Id of the closest point within radius of (x, y), -1 if there is none
+        """
+        best, best_d2 = -1, radius * radius
+        positions = self.positions
+        for members in self._cells_in(x - radius, y - radius, x + radius, y + radius):
+            for id in members:
+                px, py = positions[id]
+                d2 = (px - x) ** 2 + (py - y) ** 2
+                if d2 <= best_d2:
+                    best, best_d2 = id, d2
+        return best
+
+    def is_free(self, x : float, y : float, spacing : float) -> bool:
+        """
+        True if no point is within spacing of (x, y) on either axis
+        """
+        positions = self.positions
+        for members in self._cells_in(x - spacing, y - spacing, x + spacing, y + spacing):
+            for id in members:
+                px, py = positions[id]
+                if abs(px - x) < spacing and abs(py - y) < spacing:
+                    return False
+        return True
+
+    def find_free_position(self, bounds : Tuple[float, float, float, float], spacing : float, tries : int = 30, rng : random.Random = random) -> Tuple[float, float]:
+        """
+        Random position inside bounds (min_x, min_y, max_x, max_y) that is at least spacing away from every point.
+        Each check only touches nearby cells, and after tries failed samples the region is grown around its center,
+        so placement always finishes in bounded time.
+        """
+        min_x, min_y, max_x, max_y = bounds
+        while True:
+            for _ in range(tries):
+                x = rng.uniform(min_x, max_x)
+                y = rng.uniform(min_y, max_y)
+                if self.is_free(x, y, spacing):
+                    return (x, y)
+
+            # Region is (nearly) full, grow it by half in every direction
+            grow_x = (max_x - min_x) / 4 + spacing
+            grow_y = (max_y - min_y) / 4 + spacing
+            min_x, max_x = min_x - grow_x, max_x + grow_x
+            min_y, max_y = min_y - grow_y, max_y + grow_y
@@ -0,0 +1,429 @@
+"""
+On disk graph format.
+
+A graph lives in a base file (.lgraph) plus an append only journal next to it (.lgraph.journal).
+
+The base file is an 8 byte magic, a little endian uint32 header length and a JSON header, followed by
+64 byte aligned sections:
+    ids            int64[n]      node IDs, one row per node
+    pos            float64[n, 2] node positions, NaN when a node has none
+    tagged         uint8[n]      1 for nodes the student already knows
+    edge_offsets   int64[n + 1]  CSR row offsets into edge_targets
+    edge_targets   int64[m]      forward neighbor IDs
+    text_offsets   int64[n + 1]  offsets into text
+    text           uint8[...]    UTF-8 node names back to back (the string table)
+    notes          uint8[...]    UTF-8 JSON list of [start, end, note] edge notes
+Sections are read through a single memory map, so opening is cheap and node names are only decoded when used.
+
+The journal is JSON lines. The first line names the base generation it applies to, every other line is one
+change, e.g. ["add_node", 12, "Fourier Series"] or ["move", 12, 310.0, -42.5]. Saving after a change only
+appends to it, and once it grows past a limit the graph is compacted into a new base file.
+
+Convert pickled .graph saves with:
+    python -m LearnAssist.storage convert saves/old.graph saves/old.lgraph
+"""
+from typing import Dict, List, Optional, Tuple
+from array import array
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+
+from LearnAssist.graph import DirectedGraph, Node, EdgeSet, EMPTY
+
+MAGIC = b"LGRAPH\x00\x00"
+FORMAT_VERSION = 1
+JOURNAL_FORMAT = "lgraph-journal"
+ALIGN = 64
+
+SECTIONS = [ # name, dtype, columns
+    ("ids", "<i8", 1),
+    ("pos", "<f8", 2),
+    ("tagged", "u1", 1),
+    ("edge_offsets", "<i8", 1),
+    ("edge_targets", "<i8", 1),
+    ("text_offsets", "<i8", 1),
+    ("text", "u1", 1),
+    ("notes", "u1", 1)
+]
+
+Positions = Dict[int, Tuple[float, float]]
+
+# ==== BASE FILE ====
+def write_graph(path : str, graph : DirectedGraph, positions : Positions, generation : int = 0):
+    """
+    Write graph and node positions as a base file. The file is written next to path and renamed over it,
+    so a crash never leaves a half written base behind
+    """
+    ids = list(graph.V)
+    nodes = [graph.V[id] for id in ids]
+    n = len(ids)
+
+    pos = np.full((n, 2), np.nan)
+    for row, id in enumerate(ids):
+        if id in positions:
+            pos[row] = positions[id]
+
+    degrees = np.fromiter((len(node.forward_neighbors) for node in nodes), dtype = np.int64, count = n)
+    edge_offsets = np.zeros(n + 1, dtype = np.int64)
+    np.cumsum(degrees, out = edge_offsets[1:])
+    edge_targets = np.fromiter((id for node in nodes for id in node.forward_neighbors), dtype = np.int64, count = int(edge_offsets[-1]))
+
+    texts = [node.display_text.encode("utf-8") for node in nodes]
+    text_offsets = np.zeros(n + 1, dtype = np.int64)
+    np.cumsum(np.fromiter(map(len, texts), dtype = np.int64, count = n), out = text_offsets[1:])
+
+    arrays = {
+        "ids" : np.array(ids, dtype = np.int64),
+        "pos" : pos,
+        "tagged" : np.fromiter((graph.tagged_vertices[id] for id in ids), dtype = np.uint8, count = n),
+        "edge_offsets" : edge_offsets,
+        "edge_targets" : edge_targets,
+        "text_offsets" : text_offsets,
+        "text" : np.frombuffer(b"".join(texts), dtype = np.uint8),
+        "notes" : np.frombuffer(json.dumps([[a, b, note] for (a, b), note in graph.notes.items()], ensure_ascii = False).encode("utf-8"), dtype = np.uint8)
+    }
+
+    # Section offsets depend on the header size, so lay the sections out relative to the first one
+    layout, cursor = {}, 0
+    for name, dtype, _ in SECTIONS:
+        layout[name] = [cursor, arrays[name].astype(dtype, copy = False).nbytes]
+        cursor += -(-layout[name][1] // ALIGN) * ALIGN
+
+    header = {
+        "version" : FORMAT_VERSION,
+        "generation" : generation,
+        "n_nodes" : n,
+        "n_edges" : int(edge_offsets[-1]),
+        "next_id" : graph.next_id,
+        "sections" : layout
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 4 + len(header_bytes)) // ALIGN) * ALIGN
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for name, dtype, _ in SECTIONS:
+            offset, _ = layout[name]
+            f.seek(data_start + offset)
+            f.write(arrays[name].astype(dtype, copy = False).tobytes())
+        f.truncate(data_start + cursor)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class GraphFile:
+    """
+    Read only, memory mapped view of a base file. Sections are exposed as NumPy arrays
+    """
+    def __init__(self, path : str):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a graph file")
+            (header_len,) = struct.unpack("<I", f.read(4))
+            self.header = json.loads(f.read(header_len).decode("utf-8"))
+
+        if self.header["version"] > FORMAT_VERSION:
+            raise ValueError(f"{path} uses format version {self.header['version']}, this version reads up to {FORMAT_VERSION}")
+
+        data_start = -(-(len(MAGIC) + 4 + header_len) // ALIGN) * ALIGN
+        self.data = np.memmap(path, dtype = np.uint8, mode = 'r')
+        self.sections : Dict[str, np.ndarray] = {}
+        for name, dtype, columns in SECTIONS:
+            if name not in self.header["sections"]:
+                continue
+            offset, size = self.header["sections"][name]
+            section = self.data[data_start + offset:data_start + offset + size].view(dtype)
+            self.sections[name] = section.reshape(-1, columns) if columns > 1 else section
+
+    def __getattr__(self, name : str) -> np.ndarray:
+        sections = self.__dict__.get("sections", {})
+        if name in sections:
+            return sections[name]
+        raise AttributeError(name)
+
+    def text(self, row : int) -> str:
+        start, end = self.sections["text_offsets"][row:row + 2]
+        return self.sections["text"][start:end].tobytes().decode("utf-8")
+
+    def close(self):
+        self.sections = {}
+        self.data = None
+
+    def to_graph(self) -> Tuple[DirectedGraph, Positions]:
+        """
+        Build a DirectedGraph from the file. Adjacency comes straight from the CSR arrays and node names
+        stay in the file until they are first read
+        """
+        ids = self.ids.tolist()
+        offsets = self.edge_offsets.tolist()
+        targets = self.edge_targets.tolist()
+        tagged = self.tagged.astype(bool).tolist()
+
+        # Backward neighbors are the same edges grouped by target
+        sources = np.repeat(self.ids, np.diff(self.edge_offsets))
+        order = np.argsort(self.edge_targets, kind = "stable")
+        by_target = self.edge_targets[order]
+        backward_sources = sources[order].tolist()
+        starts = np.searchsorted(by_target, self.ids, side = "left").tolist()
+        ends = np.searchsorted(by_target, self.ids, side = "right").tolist()
+
+        graph = DirectedGraph()
+        for row, id in enumerate(ids):
+            node = LazyNode(id, self, row)
+            node.forward_neighbors = targets[offsets[row]:offsets[row + 1]] or EMPTY
+            node.backward_neighbors = backward_sources[starts[row]:ends[row]] or EMPTY
+            graph.V[id] = node
+            graph.tagged_vertices[id] = tagged[row]
+        graph.E = edge_set((sources.astype(np.int64) << EdgeSet.SHIFT) | self.edge_targets)
+        graph.next_id = max(self.header["next_id"], (max(ids) + 1) if ids else 0)
+        if "notes" in self.sections:
+            graph.notes = {(a, b) : note for a, b, note in json.loads(self.sections["notes"].tobytes().decode("utf-8"))}
+
+        positions = {}
+        for id, (x, y) in zip(ids, self.pos.tolist()):
+            if x == x and y == y: # NaN marks a node without a position
+                positions[id] = (x, y)
+        return graph, positions
+
+def edge_set(keys : np.ndarray) -> EdgeSet:
+    """
+    EdgeSet of distinct packed edges, with its hash table filled in rounds instead of one edge at a time:
+    every edge not placed yet tries the next slot of its probe sequence, and the first one to reach an empty slot gets it
+    """
+    size = EdgeSet.MIN_SIZE
+    while size * EdgeSet.MAX_LOAD < len(keys):
+        size *= 2
+    keys = keys.astype(np.uint64)
+    table = np.zeros(size, dtype = np.uint64)
+    slots = (keys * np.uint64(EdgeSet.MULTIPLIER)) >> np.uint64(64 - (size.bit_length() - 1)) # Wraps mod 2 ** 64 like EdgeSet's hash
+    waiting = np.arange(len(keys))
+    while len(waiting):
+        empty = table[slots[waiting]] == 0
+        claimed, first = np.unique(slots[waiting[empty]], return_index = True)
+        placed = waiting[empty][first]
+        table[claimed] = keys[placed] + np.uint64(1)
+        waiting = waiting[table[slots[waiting]] != keys[waiting] + np.uint64(1)]
+        slots[waiting] = (slots[waiting] + np.uint64(1)) & np.uint64(size - 1)
+    return EdgeSet.from_table(array("Q", table.tobytes()), len(keys))
+
+_TEXT_SLOT = Node.display_text # Slot descriptor LazyNode stores decoded names in
+
+class LazyNode(Node):
+    """
+    Node whose name is decoded from the file's string table the first time it is read
+    """
+    __slots__ = ("_source", "_row")
+
+    def __init__(self, id : int, source : GraphFile, row : int):
+        self.id = id
+        self.forward_neighbors = EMPTY
+        self.backward_neighbors = EMPTY
+        self._source = source
+        self._row = row
+
+    @property
+    def display_text(self) -> str:
+        try:
+            return _TEXT_SLOT.__get__(self, Node)
+        except AttributeError:
+            text = self._source.text(self._row)
+            _TEXT_SLOT.__set__(self, text)
+            self._source = None
+            return text
+
+    @display_text.setter
+    def display_text(self, text : str):
+        _TEXT_SLOT.__set__(self, text)
+        self._source = None
+
+    def __reduce__(self):
+        # Pickles as a plain Node so saves don't depend on this module or the mapped file
+        return (Node, (self.id, self.forward_neighbors, self.backward_neighbors, self.display_text))
+
+# ==== JOURNAL ====
+class GraphStore:
+    """
+    A base file plus its journal. Attach it to a graph and every change the graph makes is queued,
+    node moves are coalesced, and flush() appends the queue to the journal.
+
+    :param path: Path of the base file, the journal is path + ".journal"
+    :param compact_after: Journal lines after which needs_compaction() is True. Defaults to the larger of
+        10000 and twice the number of nodes
+    """
+    def __init__(self, path : str, compact_after : int = None):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.compact_after = compact_after
+        self.generation = 0
+        self.file : GraphFile = None
+        self.graph : DirectedGraph = None
+
+        self.pending : List[tuple] = []
+        self.moves : Dict[int, Tuple[float, float]] = {}
+        self.journal_lines = 0
+
+    @classmethod
+    def open(cls, path : str, compact_after : int = None) -> Tuple['GraphStore', DirectedGraph, Positions]:
+        """
+        Load a graph (base file plus journal) and attach a store to it
+        """
+        store = cls(path, compact_after)
+        store.file = GraphFile(path)
+        store.generation = store.file.header["generation"]
+        graph, positions = store.file.to_graph()
+        store.replay(graph, positions)
+        store.attach(graph)
+        return store, graph, positions
+
+    def attach(self, graph : DirectedGraph):
+        if self.graph is not None:
+            self.graph.journal = None
+        self.graph = graph
+        graph.journal = self
+
+    def detach(self):
+        if self.graph is not None:
+            self.graph.journal = None
+            self.graph = None
+
+    # Called by the graph
+    def record(self, change : tuple):
+        self.pending.append(change)
+        if change[0] == "remove_node":
+            self.moves.pop(change[1], None)
+
+    def move(self, id : int, x : float, y : float):
+        self.moves[id] = (float(x), float(y))
+
+    def dirty(self) -> bool:
+        return bool(self.pending or self.moves)
+
+    def flush(self):
+        """
+        Append queued changes to the journal. Costs O(changes since the last flush)
+        """
+        if not self.dirty():
+            return
+        lines = [json.dumps(change, ensure_ascii = False) for change in self.pending]
+        lines += [json.dumps(["move", id, x, y]) for id, (x, y) in self.moves.items()]
+        self.pending = []
+        self.moves = {}
+
+        if not os.path.exists(self.journal_path):
+            lines.insert(0, json.dumps({"format" : JOURNAL_FORMAT, "version" : FORMAT_VERSION, "generation" : self.generation}))
+        with open(self.journal_path, 'a', encoding = "utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_lines += len(lines)
+
+    def needs_compaction(self) -> bool:
+        limit = self.compact_after
+        if limit is None:
+            limit = max(10000, 2 * len(self.graph.V) if self.graph is not None else 0)
+        return self.journal_lines > limit
+
+    def save(self, graph : DirectedGraph, positions : Positions):
+        """
+        Write the whole graph as a new base file and start an empty journal (compaction)
+        """
+        self.generation += 1
+        write_graph(self.path, graph, positions, self.generation) # Reads every name, so lazy nodes no longer need the old file
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.pending = []
+        self.moves = {}
+        self.journal_lines = 0
+        self.attach(graph)
+
+    def replay(self, graph : DirectedGraph, positions : Positions):
+        """
+        Apply the journal to a graph loaded from the base file
+        """
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'r', encoding = "utf-8") as f:
+            lines = f.read().split("\n")
+
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            header = {}
+        if header.get("format") != JOURNAL_FORMAT or header.get("generation") != self.generation:
+            # Left over from before the last compaction, its changes are already in the base file
+            os.remove(self.journal_path)
+            return
+
+        for line in lines[1:]:
+            try:
+                change = json.loads(line)
+            except ValueError:
+                break # Last line was cut off by a crash, everything before it is intact
+            self.apply(graph, positions, change)
+            self.journal_lines += 1
+
+    @staticmethod
+    def apply(graph : DirectedGraph, positions : Positions, change : list):
+        op, args = change[0], change[1:]
+        if op == "move":
+            id, x, y = args
+            positions[id] = (x, y)
+        elif op == "add_node":
+            graph.add_node(*args)
+        elif op == "add_edge":
+            graph.add_edge(*args)
+        elif op == "remove_edge":
+            graph.remove_edge(*args)
+        elif op == "remove_node":
+            graph.remove_node(*args)
+            positions.pop(args[0], None)
+        elif op == "rename_node":
+            graph.rename_node(*args)
+        elif op == "set_tagged":
+            graph.set_tagged(*args)
+        elif op == "set_note":
+            graph.set_note(*args)
+        else:
+            raise ValueError(f"Unknown journal entry {change}")
+
+# ==== CONVERSION ====
+def convert(src : str, dst : str):
+    """
+    Convert a pickled .graph save (joblib dump of {"graph", "node_pos"}) to the current format
+    """
+    import joblib # Only needed for old saves
+    data = joblib.load(src)
+    positions = {id : (float(pos.x), float(pos.y)) for id, pos in data["node_pos"].items()}
+    write_graph(dst, data["graph"], positions)
+    if os.path.exists(dst + ".journal"):
+        os.remove(dst + ".journal")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Graph file tools")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    convert_parser = commands.add_parser("convert", help = "Convert a pickled .graph save")
+    convert_parser.add_argument("src")
+    convert_parser.add_argument("dst", nargs = "?")
+    info_parser = commands.add_parser("info", help = "Print the header of a graph file")
+    info_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        dst = args.dst or os.path.splitext(args.src)[0] + ".lgraph"
+        convert(args.src, dst)
+        print(f"Wrote {dst}")
+    elif args.command == "info":
+        print(json.dumps(GraphFile(args.path).header, indent = 2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+from typing import Callable, Dict, Iterator, List, Optional, TypeVar
+from collections import deque
+from contextlib import contextmanager
+import random
+import threading
+import time
+
+from LearnAssist.backends import BackendError, CompletionBackend, Messages
+from LearnAssist.cache import ResponseCache
+
+T = TypeVar("T")
+
+class _Call:
+    """
+    A request in flight that identical requests wait on instead of sending their own
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.reply : str = None
+        self.error : Exception = None
+
+class _Stream:
+    """
+    A streamed request in flight. Identical requests read its deltas as they arrive, from the first one
+    """
+    def __init__(self):
+        self.deltas : List[str] = []
+        self.finished = False
+        self.error : Exception = None
+        self.changed = threading.Condition()
+
+    def push(self, delta : str):
+        with self.changed:
+            self.deltas.append(delta)
+            self.changed.notify_all()
+
+    def close(self, error : Exception = None):
+        with self.changed:
+            self.finished = True
+            self.error = error
+            self.changed.notify_all()
+
+    def follow(self) -> Iterator[str]:
+        seen = 0
+        while True:
+            with self.changed:
+                while seen == len(self.deltas) and not self.finished:
+                    self.changed.wait()
+                new, finished, error = self.deltas[seen:], self.finished, self.error
+            seen += len(new)
+            yield from new
+            if finished: # Every delta was pushed before the stream was closed, so none are left
+                if error is not None:
+                    raise error
+                return
+
+class Transport:
+    """
+    Sends the requests of every harness using a backend. On top of the backend it adds
+    - a limit on requests in flight, the rest queue up
+    - coalescing: an identical request (same key as the response cache) made while one is in flight waits for its reply,
+      or for a stream, reads the same deltas as they arrive. If the harness sending a stream stops reading it
+      part way, the others get an error, as they would if the stream had failed
+    - retries of transient failures (BackendError.retryable, connection errors) with exponential backoff and
+      full jitter, waiting at least as long as a Retry-After asks
+    - metrics, see stats()
+
+    :param backend: Backend requests go to
+    :param max_concurrency: Requests in flight at once
+    :param max_retries: Retries per request after the first attempt
+    :param backoff: Backoff before the first retry in seconds, doubled for every retry after it
+    :param max_backoff: Longest backoff in seconds (a longer Retry-After is still honoured)
+    :param coalesce: Set to False to send identical requests separately
+    """
+    def __init__(self, backend : CompletionBackend, max_concurrency : int = 8, max_retries : int = 4, backoff : float = 0.5,
+        max_backoff : float = 20.0, coalesce : bool = True):
+        self.backend = backend
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.coalesce = coalesce
+
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.lock = threading.Lock()
+        self.calls : Dict[str, _Call] = {}
+        self.streams : Dict[str, _Stream] = {}
+
+        self.waiting = 0 # Queue depth, requests waiting for a slot
+        self.in_flight = 0
+        self.requests = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failures = 0
+        self.latencies = deque(maxlen = 1000) # Seconds per successful attempt, most recent
+
+    @contextmanager
+    def slot(self):
+        with self.lock:
+            self.waiting += 1
+        self.slots.acquire()
+        with self.lock:
+            self.waiting -= 1
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            self.slots.release()
+
+    @staticmethod
+    def retry_info(error : Exception):
+        """
+        (whether the error is worth retrying, seconds the server asked to wait or None)
+        """
+        if isinstance(error, BackendError):
+            return error.retryable, error.retry_after
+        return isinstance(error, (ConnectionError, TimeoutError)), None
+
+    def delay(self, attempt : int, retry_after : Optional[float]) -> float:
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def attempt(self, send : Callable[[], T]) -> T:
+        """
+        Run send() in a slot, retrying it on transient failures
+        """
+        with self.lock:
+            self.requests += 1
+        for attempt in range(self.max_retries + 1):
+            with self.slot():
+                start = time.perf_counter()
+                try:
+                    result = send()
+                    with self.lock:
+                        self.latencies.append(time.perf_counter() - start)
+                    return result
+                except Exception as e:
+                    error = e
+
+            retryable, retry_after = self.retry_info(error)
+            if not retryable or attempt == self.max_retries:
+                with self.lock:
+                    self.failures += 1
+                raise error
+            with self.lock:
+                self.retries += 1
+            time.sleep(self.delay(attempt, retry_after)) # Slot is free while waiting
+
+    def complete(self, model : str, messages : Messages, temperature : float) -> str:
+        if not self.coalesce:
+            return self.attempt(lambda: self.backend.complete(model, messages, temperature))
+
+        key = ResponseCache.make_key(model, messages, temperature)
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.reply
+
+        try:
+            call.reply = self.attempt(lambda: self.backend.complete(model, messages, temperature))
+            return call.reply
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    def stream(self, model : str, messages : Messages, temperature : float) -> Iterator[str]:
+        """
+        Streams hold their slot until the last delta. Failures before the first delta are retried,
+        after it the error is raised since part of the reply has already been shown
+        """
+        if not self.coalesce:
+            yield from self.attempt_stream(model, messages, temperature)
+            return
+
+        key = ResponseCache.make_key(model, messages, temperature)
+        with self.lock:
+            call = self.streams.get(key)
+            leader = call is None
+            if leader:
+                call = self.streams[key] = _Stream()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            yield from call.follow()
+            return
+
+        error = None
+        try:
+            for delta in self.attempt_stream(model, messages, temperature):
+                call.push(delta)
+                yield delta
+        except GeneratorExit:
+            error = BackendError("Stream was closed by the request sending it")
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            with self.lock:
+                del self.streams[key]
+            call.close(error)
+
+    def attempt_stream(self, model : str, messages : Messages, temperature : float) -> Iterator[str]:
+        """
+        Stream from the backend in a slot, retrying failures before the first delta
+        """
+        with self.lock:
+            self.requests += 1
+        for attempt in range(self.max_retries + 1):
+            started = False
+            with self.slot():
+                start = time.perf_counter()
+                try:
+                    for delta in self.backend.stream(model, messages, temperature):
+                        if not started:
+                            started = True
+                            with self.lock:
+                                self.latencies.append(time.perf_counter() - start) # Time to first delta
+                        yield delta
+                    return
+                except Exception as e:
+                    error = e
+
+            retryable, retry_after = self.retry_info(error)
+            if started or not retryable or attempt == self.max_retries:
+                with self.lock:
+                    self.failures += 1
+                raise error
+            with self.lock:
+                self.retries += 1
+            time.sleep(self.delay(attempt, retry_after))
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {
+                "queue_depth" : self.waiting,
+                "in_flight" : self.in_flight,
+                "requests" : self.requests,
+                "coalesced" : self.coalesced,
+                "retries" : self.retries,
+                "failures" : self.failures,
+                "p50_ms" : latencies[len(latencies) // 2] * 1e3 if latencies else 0.0,
+                "p99_ms" : latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3 if latencies else 0.0
+            }
+        pool = getattr(self.backend, "pool", None)
+        if pool is not None:
+            stats["connections_opened"] = pool.opened
+            stats["connections_reused"] = pool.reused
+        return stats
+
+_transports_lock = threading.Lock()
+
+def shared_transport(backend : CompletionBackend) -> Transport:
+    """
+    The Transport every harness using backend shares, made on first use
+    """
+    with _transports_lock:
+        transport = getattr(backend, "transport", None)
+        if transport is None:
+            transport = backend.transport = Transport(backend)
+        return transport
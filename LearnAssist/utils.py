@@ -1,6 +1,6 @@
-def prettyprint(d : dict):
-    # Dictionary output from model
-    concept = d['concept']
-    topic = d['topic']
-    scope = d['scope']
+def prettyprint(d : dict):
+    # Dictionary output from model
+    concept = d['concept']
+    topic = d['topic']
+    scope = d['scope']
     new_concepts = d['new_concepts']
\ No newline at end of file
@@ -0,0 +1,183 @@
+from typing import Dict, List, Tuple, Any, Callable
+from concurrent.futures import ThreadPoolExecutor, Future
+import itertools
+import queue
+import threading
+import time
+
+class RateLimiter:
+    """
+    Token bucket shared between threads, acquire() blocks until another request may go out
+
+    :param rate: Requests per second
+    :param burst: Requests that may go out back to back after an idle period
+    """
+    def __init__(self, rate : float, burst : int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class ChatRequest:
+    """
+    Handle for a harness call running on the worker pool
+
+    :param source: Name of the chatbot the request was sent to (reply is attributed to it)
+    :param message: Message sent to the chatbot
+    :param stream: If True the reply is streamed, with text deltas collected through drain()
+    """
+    _ids = itertools.count()
+
+    def __init__(self, source : str, message : str, stream : bool = False):
+        self.id = next(self._ids)
+        self.source = source
+        self.message = message
+        self.stream = stream
+        self.future : Future = None
+        self.cancelled = False
+        self.deltas = queue.SimpleQueue()
+
+    def drain(self) -> List[str]:
+        """
+        Take every text delta that has arrived so far
+        """
+        out = []
+        while True:
+            try:
+                out.append(self.deltas.get_nowait())
+            except queue.Empty:
+                return out
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+class ChatWorkerPool:
+    """
+    Runs chat harness calls on background threads so the game loop never blocks on the API.
+    Calls to the same harness are serialized (harnesses keep conversation state), calls to
+    different harnesses run concurrently. Finished requests are collected with poll() on the main thread.
+
+    :param max_workers: Number of worker threads
+    :param notify: Called (from the worker thread) whenever a request produces output or finishes, e.g. to wake the UI
+    """
+    def __init__(self, max_workers : int = 4, notify : Callable[[], None] = None):
+        self.executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = "chat")
+        self.notify = notify
+        self.harness_locks : Dict[int, threading.Lock] = {}
+        self.pending : List[ChatRequest] = []
+
+    def _lock_for(self, harness) -> threading.Lock:
+        key = id(harness)
+        if key not in self.harness_locks:
+            self.harness_locks[key] = threading.Lock()
+        return self.harness_locks[key]
+
+    def submit(self, source : str, harness, message : str, decorations : Dict[str, Any] = None, supersede : bool = True, stream : bool = False) -> ChatRequest:
+        """
+        Queue harness(message). Decorations are applied right before the call, under the harness lock.
+        If supersede is set, any request still pending for the same source is cancelled.
+        With stream set the harness is driven through converse_stream and deltas are queued on the request.
+        """
+        if supersede:
+            self.cancel(source)
+
+        request = ChatRequest(source, message, stream)
+        lock = self._lock_for(harness)
+
+        def run():
+            with lock:
+                if request.cancelled:
+                    return None
+                before = set(map(id, harness.messages))
+                for key, val in (decorations or {}).items():
+                    harness.update_decoration(key, val)
+
+                if stream:
+                    reply = None
+                    gen = harness.converse_stream(message)
+                    while not request.cancelled:
+                        try:
+                            request.deltas.put(next(gen))
+                            if self.notify is not None:
+                                self.notify()
+                        except StopIteration as stop:
+                            reply = stop.value
+                            break
+                    gen.close()
+                else:
+                    reply = harness(message)
+
+                # A request superseded mid-flight should not leave its exchange in the history
+                if request.cancelled:
+                    while harness.messages and id(harness.messages[-1]) not in before:
+                        harness.messages.pop()
+                return reply
+
+        request.future = self.executor.submit(run)
+        if self.notify is not None:
+            request.future.add_done_callback(lambda _: self.notify())
+        self.pending.append(request)
+        return request
+
+    def cancel(self, source : str = None) -> int:
+        """
+        Cancel pending requests (all of them, or only those for source). Returns how many were cancelled
+        """
+        n = 0
+        for request in self.pending:
+            if (source is None or request.source == source) and not request.cancelled:
+                request.cancelled = True
+                request.future.cancel()
+                n += 1
+        return n
+
+    def poll(self) -> List[ChatRequest]:
+        """
+        Remove and return every finished request that was not cancelled. Call from the main loop
+        """
+        finished = []
+        still_pending = []
+        for request in self.pending:
+            if request.done():
+                if not request.cancelled:
+                    finished.append(request)
+            else:
+                still_pending.append(request)
+        self.pending = still_pending
+        return finished
+
+    def poll_deltas(self) -> List[Tuple[ChatRequest, str]]:
+        """
+        Collect text deltas that streaming requests have produced since the last call
+        """
+        out = []
+        for request in self.pending:
+            if request.stream and not request.cancelled:
+                out.extend((request, delta) for delta in request.drain())
+        return out
+
+    def in_flight(self, source : str = None) -> List[str]:
+        """
+        Sources with requests still running (optionally filtered by source)
+        """
+        return [r.source for r in self.pending if not r.cancelled and (source is None or r.source == source)]
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait = False, cancel_futures = True)
@@ -0,0 +1,72 @@
+"""
+Memory per node and per edge of DirectedGraph, plus timings of the basic operations.
+
+    python -m benchmarks.graph_memory --nodes 100000 --edges 200000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from LearnAssist.graph import DirectedGraph, EdgeSet
+
+def measure_memory(texts, pairs):
+    """
+    Bytes allocated for the nodes and for the edges (including neighbor lists)
+    """
+    tracemalloc.start()
+    graph = DirectedGraph()
+    for text in texts:
+        graph.add_node(text = text)
+    node_bytes = tracemalloc.get_traced_memory()[0]
+    for id_start, id_end in pairs:
+        graph.add_edge(id_start, id_end)
+    edge_bytes = tracemalloc.get_traced_memory()[0] - node_bytes
+    tracemalloc.stop()
+    return node_bytes, edge_bytes, len(graph.E) # Random pairs can repeat, duplicates are not stored
+
+def measure_edge_set(pairs) -> float:
+    """
+    Bytes per edge of the EdgeSet alone, the rest of the edge bytes are the neighbor lists
+    """
+    tracemalloc.start()
+    edges = EdgeSet(pairs)
+    edge_set_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return edge_set_bytes / len(edges)
+
+def timed(fn, items) -> float:
+    """
+    Microseconds per call of fn(*item)
+    """
+    start = time.perf_counter()
+    for item in items:
+        fn(*item)
+    return (time.perf_counter() - start) / max(1, len(items)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type = int, default = 100000)
+    parser.add_argument("--edges", type = int, default = 200000)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [f"concept {i}" for i in range(args.nodes)] # Allocated up front so label text is not counted
+    pairs = [(rng.randrange(args.nodes), rng.randrange(args.nodes)) for _ in range(args.edges)]
+
+    node_bytes, edge_bytes, n_edges = measure_memory(texts, pairs)
+    print(f"nodes : {args.nodes}, edges : {n_edges}")
+    print(f"bytes per node : {node_bytes / args.nodes:.1f}")
+    print(f"bytes per edge : {edge_bytes / n_edges:.1f} (EdgeSet {measure_edge_set(pairs):.1f})")
+
+    graph = DirectedGraph()
+    print(f"add_node : {timed(lambda text: graph.add_node(text = text), [(text,) for text in texts]):.2f} us")
+    print(f"add_edge : {timed(graph.add_edge, pairs):.2f} us")
+    print(f"add_edge (duplicate) : {timed(graph.add_edge, pairs[:10000]):.2f} us")
+    print(f"remove_edge : {timed(graph.remove_edge, pairs[:10000]):.2f} us")
+    removed = rng.sample(list(graph.V), min(10000, args.nodes))
+    print(f"remove_node : {timed(graph.remove_node, [(id,) for id in removed]):.2f} us")
+
+if __name__ == "__main__":
+    main()
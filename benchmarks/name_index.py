@@ -0,0 +1,75 @@
+"""
+Latency of the fuzzy name index on synthetic concept names with typos.
+
+    python -m benchmarks.name_index --names 100000
+"""
+import argparse
+import random
+import time
+
+from LearnAssist.name_index import NameIndex
+
+SYLLABLES = [c + v for c in "bcdfghklmnprstvz" for v in ("a", "e", "i", "o", "u", "ar", "en", "is", "on")]
+
+def make_names(n : int, rng : random.Random):
+    words = list({"".join(rng.choices(SYLLABLES, k = rng.randint(2, 4))) for _ in range(20000)})
+    return [" ".join(rng.choices(words, k = rng.randint(1, 4))).title() for _ in range(n)]
+
+def typo(name : str, rng : random.Random) -> str:
+    i = rng.randrange(len(name))
+    kind = rng.randrange(3)
+    if kind == 0:
+        return name[:i] + name[i + 1:] # Drop a character
+    if kind == 1 and i + 1 < len(name):
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:] # Swap two
+    return name[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + name[i:] # Insert one
+
+def percentile(values, p : float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--names", type = int, default = 100000)
+    parser.add_argument("--queries", type = int, default = 1000)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = make_names(args.names, rng)
+
+    index = NameIndex()
+    start = time.perf_counter()
+    for id, name in enumerate(names):
+        index.add(id, name)
+    build = time.perf_counter() - start
+    print(f"names : {args.names}, build : {build:.2f} s ({build / args.names * 1e6:.1f} us per add)")
+
+    targets = rng.sample(range(args.names), args.queries)
+    searches = (
+        ("exact, top 5", lambda name: name.lower(), 5, 0.4),
+        ("typo, top 5", lambda name: typo(name, rng), 5, 0.4),
+        ("typo, best match", lambda name: typo(name, rng), 1, 0.75) # What the builder loader uses
+    )
+    for label, make_query, k, min_score in searches:
+        times, hits = [], 0
+        for id in targets:
+            query = make_query(names[id])
+            start = time.perf_counter()
+            matches = index.search(query, k = k, min_score = min_score)
+            times.append((time.perf_counter() - start) * 1e3)
+            hits += any(names[match] == names[id] for match, _ in matches) # Synthetic names can repeat
+        print(f"search ({label}) : p50 {percentile(times, 50):.2f} ms, p99 {percentile(times, 99):.2f} ms, found : {hits / args.queries:.1%}")
+
+    start = time.perf_counter()
+    for id in targets:
+        index.rename(id, typo(names[id], rng))
+    print(f"rename : {(time.perf_counter() - start) / args.queries * 1e6:.1f} us")
+
+    start = time.perf_counter()
+    for id in targets:
+        index.remove(id)
+    print(f"remove : {(time.perf_counter() - start) / args.queries * 1e6:.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Build time, update latency and query latency of the reachability index on a random layered graph,
+shaped like a course graph: edges point from earlier layers to later ones.
+
+    python -m benchmarks.reachability --nodes 100000 --learned 500
+"""
+import argparse
+import random
+import time
+
+from LearnAssist.graph import DirectedGraph
+from LearnAssist.reachability import tutor_context
+
+def percentile(values, p : float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+def timed(fn, args) -> str:
+    times = []
+    for arg in args:
+        start = time.perf_counter()
+        fn(*arg)
+        times.append((time.perf_counter() - start) * 1e6)
+    return f"p50 {percentile(times, 50):.1f} us, p99 {percentile(times, 99):.1f} us"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type = int, default = 100000)
+    parser.add_argument("--edges-per-node", type = int, default = 2)
+    parser.add_argument("--layers", type = int, default = 20)
+    parser.add_argument("--learned", type = int, default = 500)
+    parser.add_argument("--queries", type = int, default = 1000)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    n = args.nodes
+    layer = lambda id: id * args.layers // n
+    graph = DirectedGraph()
+    graph.add_nodes((id, f"concept {id}") for id in range(n))
+    edges = []
+    while len(edges) < args.edges_per_node * n:
+        a, b = rng.randrange(n), rng.randrange(n)
+        if layer(a) < layer(b):
+            edges.append((a, b))
+    graph.add_edges(edges)
+    for id in rng.sample(range(n // 2), args.learned):
+        graph.tagged_vertices[id] = True
+
+    start = time.perf_counter()
+    index = graph.reachability
+    print(f"nodes : {n}, edges : {len(graph.E)}, learned : {args.learned}, build : {time.perf_counter() - start:.2f} s")
+
+    targets = [(id,) for id in rng.sample(range(n), args.queries)]
+    print(f"learned_ancestors : {timed(index.learned_ancestors, targets)}")
+    print(f"prerequisite_path : {timed(index.prerequisite_path, targets)}")
+    print(f"tutor_context : {timed(lambda id: tutor_context(graph, [id]), targets[:100])}")
+
+    fresh = [(a, b) for a, b in ((rng.randrange(n), rng.randrange(n)) for _ in range(4 * args.queries)) if layer(a) < layer(b)][:args.queries]
+    print(f"add_edge : {timed(graph.add_edge, fresh)}")
+    print(f"remove_edge : {timed(graph.remove_edge, fresh)}")
+    tags = [(id,) for id in rng.sample(range(n), args.queries // 10)]
+    print(f"tag : {timed(lambda id: graph.set_tagged(id, True), tags)}")
+    print(f"untag : {timed(lambda id: graph.set_tagged(id, False), tags)}")
+
+if __name__ == "__main__":
+    main()
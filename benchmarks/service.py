@@ -0,0 +1,137 @@
+"""
+Load test of the session service against a fake backend with latency, over real HTTP on localhost.
+
+Many light sessions each send a few messages one after another, while a few heavy sessions queue up many
+messages at once. With fair scheduling the light sessions' latency stays close to the backend latency
+times the number of sessions competing for a slot, rather than waiting behind the heavy queues. max_sessions
+is set below the number of sessions so eviction to disk and loading back are exercised too.
+
+    python -m benchmarks.service --sessions 500 --turns 4 --max-sessions 100
+"""
+import os
+os.environ.setdefault("LEARNASSIST_BACKEND", "fake")
+
+import argparse
+import asyncio
+import json
+import resource
+import tempfile
+import time
+
+from LearnAssist.backends import FakeBackend
+from LearnAssist.service import ChatService, SessionManager
+
+def percentile(values, p : float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else 0.0
+
+class Client:
+    """
+    Keep-alive HTTP/1.1 connection sending JSON requests one at a time
+    """
+    def __init__(self, port : int):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method : str, path : str, data : dict = None) -> dict:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        body = json.dumps(data).encode("utf-8") if data is not None else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if not line.strip():
+                break
+            key, _, val = line.decode("latin-1").partition(":")
+            if key.strip().lower() == "content-length":
+                length = int(val)
+        result = json.loads(await self.reader.readexactly(length))
+        if status != 200 and status != 201:
+            raise RuntimeError(f"HTTP {status}: {result}")
+        return result
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+async def light_session(port : int, name : str, turns : int, latencies : list):
+    client = Client(port)
+    try:
+        for turn in range(turns):
+            start = time.perf_counter()
+            await client.request("POST", f"/sessions/{name}/messages", {"message" : f"question {turn} " + "lorem ipsum " * 20, "kind" : "tutor"})
+            latencies.append(time.perf_counter() - start)
+    finally:
+        client.close()
+
+async def heavy_session(port : int, name : str, queued : int, latencies : list):
+    clients = [Client(port) for _ in range(queued)] # One connection per queued message, all sent at once
+    async def send(client, turn):
+        start = time.perf_counter()
+        await client.request("POST", f"/sessions/{name}/messages", {"message" : f"bulk {turn}", "kind" : "base"})
+        latencies.append(time.perf_counter() - start)
+    try:
+        await asyncio.gather(*(send(client, turn) for turn, client in enumerate(clients)))
+    finally:
+        for client in clients:
+            client.close()
+
+async def run(args):
+    backend = FakeBackend(latency = args.latency, jitter = args.latency / 2)
+    with tempfile.TemporaryDirectory() as state_dir:
+        manager = SessionManager(state_dir, backend = backend, max_sessions = args.max_sessions,
+            max_session_tokens = args.max_session_tokens, max_concurrency = args.concurrency)
+        service = ChatService(manager)
+        server = await service.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        light, heavy = [], []
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(args.clients) # Light sessions talking at once
+        async def limited(name):
+            async with semaphore:
+                await light_session(port, name, args.turns, light)
+        await asyncio.gather(
+            *(limited(f"user-{i}") for i in range(args.sessions)),
+            *(heavy_session(port, f"bulk-{i}", args.heavy_queue, heavy) for i in range(args.heavy))
+        )
+        seconds = time.perf_counter() - start
+
+        stats = Client(port)
+        summary = await stats.request("GET", "/stats")
+        history = await stats.request("GET", "/sessions/user-0")
+        stats.close()
+        await service.stop()
+        manager.shutdown()
+
+    n = len(light) + len(heavy)
+    print(f"{n} messages in {seconds:.1f}s ({n / seconds:.0f}/s), backend latency {args.latency * 1e3:.0f} ms, {args.concurrency} upstream slots")
+    print(f"light p50 {percentile(light, 50) * 1e3:.0f} ms, p99 {percentile(light, 99) * 1e3:.0f} ms")
+    if heavy:
+        print(f"heavy p50 {percentile(heavy, 50) * 1e3:.0f} ms, p99 {percentile(heavy, 99) * 1e3:.0f} ms")
+    print(
+        f"sessions created {summary['created']}, evicted {summary['evicted']}, loaded {summary['loaded']}, "
+        f"in memory at the end {summary['sessions_in_memory']}, user-0 turns {history['turns']}"
+    )
+    print(f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Load test the session service against a fake backend")
+    parser.add_argument("--sessions", type = int, default = 500, help = "Light sessions")
+    parser.add_argument("--turns", type = int, default = 4, help = "Messages per light session, sent one after another")
+    parser.add_argument("--clients", type = int, default = 100, help = "Light sessions talking at once")
+    parser.add_argument("--heavy", type = int, default = 2, help = "Heavy sessions")
+    parser.add_argument("--heavy-queue", type = int, default = 100, help = "Messages each heavy session sends at once")
+    parser.add_argument("--latency", type = float, default = 0.02, help = "Backend seconds per request")
+    parser.add_argument("--concurrency", type = int, default = 8)
+    parser.add_argument("--max-sessions", type = int, default = 100)
+    parser.add_argument("--max-session-tokens", type = int, default = 2000)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Near duplicate search over synthetic concept names, a few of which are made into plural or typo variants.
+
+    python -m benchmarks.similarity --names 100000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.name_index import make_names
+from LearnAssist.similarity import SimilarityIndex
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--names", type = int, default = 100000)
+    parser.add_argument("--duplicates", type = int, default = 1000)
+    parser.add_argument("--threshold", type = float, default = 0.9)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = list(dict.fromkeys(make_names(args.names, rng)))
+    originals = rng.sample(range(len(names)), args.duplicates)
+    planted = {}
+    for id in originals:
+        planted[len(names)] = id
+        names.append(names[id] + "s")
+
+    index = SimilarityIndex()
+    start = time.perf_counter()
+    index.add_many(enumerate(names))
+    print(f"names : {len(names)}, build : {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    candidates = index.candidate_pairs()
+    print(f"LSH candidates : {len(candidates)} in {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    pairs = index.duplicate_pairs(args.threshold)
+    found = {(a, b) for a, b, _ in pairs}
+    recall = sum((planted[b], b) in found or (b, planted[b]) in found for b in planted) / len(planted)
+    print(f"duplicate pairs : {len(pairs)} in {time.perf_counter() - start:.2f} s, planted found : {recall:.1%}")
+
+    queries = [names[b] for b in rng.sample(list(planted), min(256, len(planted)))]
+    start = time.perf_counter()
+    index.top_k(queries, k = 5)
+    print(f"top 5 : {(time.perf_counter() - start) / len(queries) * 1e3:.2f} ms per name, batched")
+
+    start = time.perf_counter()
+    for b in list(planted)[:100]:
+        index.similar_to([b], args.threshold)
+    print(f"similar to one new node : {(time.perf_counter() - start) / 100 * 1e3:.2f} ms")
+
+if __name__ == "__main__":
+    main()
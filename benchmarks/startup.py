@@ -0,0 +1,117 @@
+"""
+Cold start of main.py and the explorer: wall clock of fresh interpreters, and the import time measured
+by python -X importtime with the slowest modules. Each command runs --repeat times and the fastest run counts.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --against HEAD~1 --top 5   # also run a git revision of the tree, side by side
+
+Commands run with the fake backend and SDL's dummy video driver, so no API key or display is needed.
+Run it from the repository root.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> arguments to python
+COMMANDS = {
+    "python" : ["-c", "pass"],
+    "main.py --help" : ["main.py", "--help"],
+    "import LearnAssist.chat_harness" : ["-c", "import LearnAssist.chat_harness"],
+    "import LearnAssist.graph" : ["-c", "import LearnAssist.graph"],
+    "import LearnAssist.game" : ["-c", "import LearnAssist.game"],
+    "GraphExplorer()" : ["-c", "import os; from LearnAssist.game import GraphExplorer; GraphExplorer(); os._exit(0)"]
+}
+
+def environment(tree : str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({"SDL_VIDEODRIVER" : "dummy", "SDL_AUDIODRIVER" : "dummy", "PYGAME_HIDE_SUPPORT_PROMPT" : "1", "LEARNASSIST_BACKEND" : "fake"})
+    env["PYTHONPATH"] = os.pathsep.join([tree] + [path for path in env.get("PYTHONPATH", "").split(os.pathsep) if path and os.path.abspath(path) != ROOT])
+    return env
+
+def parse_importtime(stderr : str) -> Tuple[float, List[Tuple[float, str]]]:
+    """
+    (milliseconds importing after interpreter startup, [(self milliseconds, module)] of every import)
+    """
+    total, modules, started = 0.0, [], False
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((int(self_us) / 1e3, name.strip()))
+        if started and not name[1:].startswith(" "): # Top level import of the command itself (nested ones are indented further)
+            total += int(cumulative_us) / 1e3
+        if name.strip() == "site":
+            started = True
+    return total, modules
+
+def measure(tree : str, args : List[str], repeat : int) -> Optional[Tuple[float, float, List[Tuple[float, str]]]]:
+    """
+    (best wall clock ms, best import ms, slowest imports of the best import run), None if the command fails in this tree
+    """
+    try:
+        return _measure(tree, args, repeat)
+    except subprocess.CalledProcessError:
+        return None
+
+def _measure(tree : str, args : List[str], repeat : int) -> Tuple[float, float, List[Tuple[float, str]]]:
+    env = environment(tree)
+    best_wall, best_import, modules = float("inf"), float("inf"), []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd = tree, env = env, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, check = True)
+        best_wall = min(best_wall, (time.perf_counter() - start) * 1e3)
+
+        stderr = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd = tree, env = env, stdout = subprocess.DEVNULL,
+            stderr = subprocess.PIPE, text = True, check = True).stderr
+        total, run_modules = parse_importtime(stderr)
+        if total < best_import:
+            best_import, modules = total, run_modules
+    return best_wall, best_import, sorted(modules, reverse = True)
+
+def checkout(revision : str, into : str) -> str:
+    """
+    Files of a git revision extracted into a directory
+    """
+    archive = os.path.join(into, "tree.tar")
+    with open(archive, 'wb') as f:
+        subprocess.run(["git", "archive", revision], cwd = ROOT, stdout = f, check = True)
+    tree = os.path.join(into, "tree")
+    with tarfile.open(archive) as tar:
+        tar.extractall(tree)
+    return tree
+
+def main():
+    parser = argparse.ArgumentParser(description = "Cold start time of main.py and the explorer")
+    parser.add_argument("--repeat", type = int, default = 5)
+    parser.add_argument("--against", default = None, help = "Git revision to measure side by side with the working tree")
+    parser.add_argument("--top", type = int, default = 0, help = "Show the slowest imports of each command")
+    parser.add_argument("--only", nargs = "+", default = None, choices = list(COMMANDS))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        trees = {"current" : ROOT}
+        if args.against is not None:
+            trees = {args.against : checkout(args.against, tmp), "current" : ROOT}
+
+        width = max(len(name) for name in COMMANDS)
+        print(f"{'':<{width}}  " + "  ".join(f"{label[:20]:>20}" for label in trees) + "   (wall ms / import ms)")
+        for name, command in COMMANDS.items():
+            if args.only is not None and name not in args.only:
+                continue
+            results = {label : measure(tree, command, args.repeat) for label, tree in trees.items()}
+            print(f"{name:<{width}}  " + "  ".join(
+                f"{result[0]:>10.0f} / {result[1]:>7.0f}" if result is not None else f"{'failed':>20}" for result in results.values()
+            ))
+            for label, result in results.items():
+                if args.top and result is not None:
+                    print(f"    {label}: " + ", ".join(f"{module} {ms:.0f}" for ms, module in result[2][:args.top]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Save and load times of the .lgraph format against the old joblib pickles, plus the cost of an autosave.
+
+    python -m benchmarks.storage --nodes 100000 --edges 200000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import joblib
+
+from LearnAssist.graph import DirectedGraph
+from LearnAssist.storage import GraphStore
+
+def timed(fn) -> float:
+    """
+    Milliseconds taken by fn()
+    """
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1e3
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type = int, default = 100000)
+    parser.add_argument("--edges", type = int, default = 200000)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    graph = DirectedGraph()
+    for i in range(args.nodes):
+        graph.add_node(text = f"concept {i}")
+    for _ in range(args.edges):
+        graph.add_edge(rng.randrange(args.nodes), rng.randrange(args.nodes))
+    positions = {id : (rng.uniform(-1e4, 1e4), rng.uniform(-1e4, 1e4)) for id in graph.V}
+    print(f"nodes : {args.nodes}, edges : {len(graph.E)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path = os.path.join(tmp, "bench.graph")
+        print(f"joblib save : {timed(lambda: joblib.dump({'graph' : graph, 'node_pos' : positions}, pickle_path)):.0f} ms, {os.path.getsize(pickle_path) / 1e6:.1f} MB")
+        print(f"joblib load : {timed(lambda: joblib.load(pickle_path)):.0f} ms")
+
+        path = os.path.join(tmp, "bench.lgraph")
+        store = GraphStore(path)
+        print(f"lgraph save : {timed(lambda: store.save(graph, positions)):.0f} ms, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        opened = {}
+        print(f"lgraph open : {timed(lambda: opened.update(zip(('store', 'graph', 'positions'), GraphStore.open(path)))):.0f} ms")
+        print(f"first name read : {timed(lambda: opened['graph'].V[args.nodes // 2].display_text) * 1e3:.1f} us")
+
+        # One autosave after a typical edit: a node, an edge and a drag
+        store, loaded = opened["store"], opened["graph"]
+        def edit_and_flush():
+            id = loaded.add_node(text = "new concept")
+            loaded.add_edge(0, id)
+            store.move(id, 0.0, 0.0)
+            store.flush()
+        print(f"autosave after one edit : {timed(edit_and_flush):.2f} ms")
+        print(f"lgraph compaction : {timed(lambda: store.save(loaded, opened['positions'])):.0f} ms")
+
+if __name__ == "__main__":
+    main()
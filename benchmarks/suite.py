@@ -0,0 +1,245 @@
+"""
+Headless benchmark suite: graph operations, rendering and chat harness overhead, all offline.
+Pygame draws to SDL's dummy video driver and the harness talks to a FakeBackend, so no window or
+API key is needed. Results are written as JSON and compared against a stored baseline; a metric slower
+than its baseline by more than --tolerance is reported as a regression and the exit code is 1.
+Timings are the best of several runs, and on a noisy machine --repeat helps more than a looser tolerance.
+The stored baseline is only meaningful on the machine it was recorded on.
+
+    python -m benchmarks.suite                          # compare against benchmarks/baseline.json
+    python -m benchmarks.suite --quick --out results.json
+    python -m benchmarks.suite --update-baseline --repeat 3   # after an intended change, or on a new machine
+
+Run it from the repository root, the game loads its prompts from relative paths.
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+os.environ.setdefault("LEARNASSIST_BACKEND", "fake")
+
+from typing import Callable, Dict, List
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import pygame
+
+from LearnAssist.backends import FakeBackend
+from LearnAssist.chat_harness import BaseChatHarness
+from LearnAssist.context import ContextWindow
+from LearnAssist.game import GraphExplorer, Point
+from LearnAssist.graph import DirectedGraph
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+UNITS = {"s" : 1.0, "ms" : 1e3, "us" : 1e6}
+
+Results = Dict[str, dict]
+
+def record(results : Results, name : str, seconds : float, unit : str):
+    results[name] = {"value" : round(seconds * UNITS[unit], 4), "unit" : unit}
+
+def per_call(fn : Callable, args : list, chunk : int = 100) -> float:
+    """
+    Seconds per fn(*arg) over args, the median over chunks of calls so a pause in one chunk does not count
+    """
+    times = []
+    for i in range(0, len(args), chunk):
+        start = time.perf_counter()
+        for arg in args[i:i + chunk]:
+            fn(*arg)
+        times.append((time.perf_counter() - start) / len(args[i:i + chunk]))
+    return statistics.median(times)
+
+def best_time(fn : Callable, repeat : int, number : int = 1) -> float:
+    """
+    Seconds per call of fn(), the best of repeat runs of number calls each. Like timeit, the fastest run is
+    the one least disturbed by the rest of the machine
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return min(times)
+
+def make_graph(n : int, rng : random.Random, edges_per_node : int = 2) -> DirectedGraph:
+    graph = DirectedGraph()
+    graph.add_nodes((id, f"concept {id}") for id in range(n))
+    graph.add_edges((rng.randrange(n), rng.randrange(n)) for _ in range(edges_per_node * n))
+    return graph
+
+# ==== GRAPH ====
+def bench_graph(results : Results, n : int, rng : random.Random):
+    texts = [f"concept {i}" for i in range(n)]
+    pairs = [(rng.randrange(n), rng.randrange(n)) for _ in range(2 * n)]
+
+    graph = DirectedGraph()
+    record(results, f"graph.add_node[n={n}]", per_call(lambda text: graph.add_node(text = text), [(text,) for text in texts]), "us")
+    record(results, f"graph.add_edge[n={n}]", per_call(graph.add_edge, pairs), "us")
+
+    def cold():
+        graph._render_cache.clear()
+        str(graph)
+    record(results, f"graph.str_cold[n={n}]", best_time(cold, 3), "ms")
+    def one_change():
+        graph.rename_node(0, graph.V[0].display_text)
+        str(graph)
+    record(results, f"graph.str_after_change[n={n}]", best_time(one_change, 20), "ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "commands.txt")
+        with open(path, 'w', encoding = "utf-8") as f:
+            f.writelines(f"/addnode {text}\n" for text in texts)
+            f.writelines(f"/addedge {texts[a]}, {texts[b]}\n" for a, b in pairs)
+        start = time.perf_counter()
+        DirectedGraph().from_builder_file(path)
+        record(results, f"graph.from_builder_file[n={n}]", time.perf_counter() - start, "ms")
+
+# ==== RENDERING ====
+def bench_render(results : Results, n : int, rng : random.Random, frames : int):
+    graph = make_graph(n, rng)
+    explorer = GraphExplorer(graph)
+
+    explorer.node_centers.clear()
+    explorer.spatial.clear()
+    start = time.perf_counter()
+    explorer.initialize_node_centers()
+    record(results, f"render.initialize_node_centers[n={n}]", time.perf_counter() - start, "ms")
+
+    for i in range(explorer.chat_log.max_messages):
+        explorer.chat_log.log(f"message {i} " + "lorem ipsum " * 8, (255, 255, 255))
+
+    # Close up (labels and arrowheads) centered on the first node, and the whole graph (points or clusters)
+    xs = [pos.x for pos in explorer.node_centers.values()]
+    ys = [pos.y for pos in explorer.node_centers.values()]
+    views = {
+        "labels" : (1.0, explorer.node_centers[0]),
+        "overview" : (min(explorer.width / (max(xs) - min(xs) + 1), explorer.height / (max(ys) - min(ys) + 1)),
+            Point((max(xs) + min(xs)) / 2, (max(ys) + min(ys)) / 2))
+    }
+    for view, (zoom, center) in views.items():
+        explorer.camera.zoom = max(explorer.camera.MIN_ZOOM, zoom)
+        explorer.camera.offset = Point(center.x - explorer.width / 2 / explorer.camera.zoom, center.y - explorer.height / 2 / explorer.camera.zoom)
+        explorer.draw_frame() # Fill the text and edge caches, then time warm frames
+        record(results, f"render.frame_{view}[n={n}]", best_time(explorer.draw_frame, frames), "ms")
+        record(results, f"render.draw_graph_{view}[n={n}]", best_time(explorer.draw_graph, frames), "ms")
+        edges = list(graph.E)[:1000]
+        record(results, f"render.draw_edges_{view}[n={n}]", best_time(lambda: explorer.draw_edges(edges), frames) / len(edges), "us")
+
+    y = explorer.height - explorer.font.get_height() * 2
+    record(results, f"render.chat_log_draw[n={n}]", best_time(lambda: explorer.chat_log.draw(explorer.screen, 10, y), frames), "ms")
+
+    points = [(Point(rng.randrange(explorer.width), rng.randrange(explorer.height)),) for _ in range(1000)]
+    record(results, f"render.mouse_on_node[n={n}]", per_call(explorer.mouse_on_node, points), "us")
+    explorer.workers.shutdown()
+
+# ==== HARNESS ====
+def bench_harness(results : Results, turns : List[int], rng : random.Random):
+    """
+    Time per converse turn against an instant backend as the history grows, so what is measured is the
+    harness itself: context fitting, decoration and the transport's request key
+    """
+    graph = make_graph(1000, rng)
+    harness = BaseChatHarness("LearnAssist/prompts/basechat.txt", backend = FakeBackend("ok " * 50), context = ContextWindow(budget = 10 ** 9))
+    harness.update_decoration("Graph", str(graph))
+
+    done = 0
+    for target in sorted(turns):
+        while done < target - 20:
+            harness.converse(f"turn {done} " + "question " * 20)
+            done += 1
+        record(results, f"harness.converse[history={target}]", best_time(lambda: harness.converse("question " * 20), 20), "us")
+        record(results, f"harness.decorate_messages[history={target}]", best_time(lambda: harness.decorate_messages(harness.messages), 20, number = 1000), "us")
+        done += 20
+
+# ==== BASELINE ====
+def compare(results : Results, baseline : Results, tolerance : float) -> List[str]:
+    """
+    Print each metric next to its baseline. Returns the names of metrics slower by more than tolerance
+    """
+    regressions = []
+    width = max(len(name) for name in results)
+    for name, entry in results.items():
+        base = baseline.get(name)
+        if base is None or base["unit"] != entry["unit"]:
+            print(f"{name:<{width}}  {entry['value']:>12.3f} {entry['unit']:<2}  (no baseline)")
+            continue
+        ratio = entry["value"] / base["value"] if base["value"] > 0 else 1.0
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<{width}}  {entry['value']:>12.3f} {entry['unit']:<2}  baseline {base['value']:>12.3f}  x{ratio:.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = "Headless benchmarks of graph operations, rendering and harness overhead")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1000, 10000, 100000], help = "Graph sizes in nodes")
+    parser.add_argument("--quick", action = "store_true", help = "Only the 1k and 10k graphs")
+    parser.add_argument("--turns", type = int, nargs = "+", default = [20, 100, 500], help = "History lengths for the harness")
+    parser.add_argument("--frames", type = int, default = 10, help = "Frames timed per view")
+    parser.add_argument("--repeat", type = int, default = 1, help = "Run everything this many times and keep the best value of each metric")
+    parser.add_argument("--only", default = None, choices = ["graph", "render", "harness"])
+    parser.add_argument("--out", default = None, help = "Write the results as JSON here")
+    parser.add_argument("--baseline", default = BASELINE)
+    parser.add_argument("--update-baseline", action = "store_true", help = "Store the results as the new baseline")
+    parser.add_argument("--tolerance", type = float, default = 0.5, help = "Allowed slowdown against the baseline (0.5 = 50%%)")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    sizes = [n for n in args.sizes if n <= 10000] if args.quick else args.sizes
+    results : Results = {}
+    for _ in range(args.repeat):
+        run : Results = {}
+        for n in sizes:
+            if args.only in (None, "graph"):
+                bench_graph(run, n, random.Random(args.seed))
+            if args.only in (None, "render"):
+                bench_render(run, n, random.Random(args.seed), args.frames)
+        if args.only in (None, "harness"):
+            bench_harness(run, args.turns, random.Random(args.seed))
+        for name, entry in run.items(): # Keep the best of the repeats, noise only ever makes things slower
+            if name not in results or entry["value"] < results[name]["value"]:
+                results[name] = entry
+    pygame.quit()
+
+    report = {
+        "meta" : {
+            "time" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python" : platform.python_version(),
+            "platform" : platform.platform(),
+            "pygame" : pygame.version.ver,
+            "sizes" : sizes,
+            "repeat" : args.repeat
+        },
+        "results" : results
+    }
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent = 1)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent = 1)
+        compare(results, {}, args.tolerance)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regressions over {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
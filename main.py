@@ -1,6 +1,238 @@
-from LearnAssist.chat_harness import ConceptExpanderChat
-
-print("Format: [Concept], [Topic], [Scope], [Direction]")
-chat = ConceptExpanderChat()
-x = input()
-print(chat.converse(x))
\ No newline at end of file
+"""
+Concept expansion from the command line.
+
+Interactively, one "[Concept], [Topic], [Scope], [Direction]" query typed in:
+    python main.py
+
+In bulk, queries read as JSON lines from a file or stdin, run by a pool of ConceptExpanderChat instances,
+with results written as JSON lines (in input order, or as they finish with --completion-order):
+    python main.py --batch queries.jsonl --out results.jsonl --workers 8
+    cat queries.jsonl | python main.py --batch - --out results.jsonl
+
+An input line is {"id" : ..., "query" : "Calculus, Math, medium, down"}, or has concept / topic / scope /
+direction fields instead of query, or is the query as plain text. Lines without an id are numbered.
+Rerunning with the same --out skips the ids already completed there and retries the ones that failed.
+"""
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from LearnAssist.chat_harness import ConceptExpanderChat
+from LearnAssist.workers import RateLimiter
+
+def interactive():
+    print("Format: [Concept], [Topic], [Scope], [Direction]")
+    chat = ConceptExpanderChat()
+    x = input()
+
+    # Concepts are printed as soon as each one has been generated
+    expansion = chat.converse_concepts(x)
+    try:
+        while True:
+            try:
+                concept = next(expansion)
+            except StopIteration as stop:
+                print(stop.value.get("chat", ""))
+                break
+            print(f"- {concept['name']}: {concept.get('justification', '')}")
+    except RuntimeError as e: # API error, already reads "API Error : ..."
+        print(e)
+    except ValueError as e: # Reply without any JSON
+        print(f"Couldn't read the reply: {e}")
+
+# ==== BATCH ====
+def read_queries(lines : Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    (id, query) for every non blank input line
+    """
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            entry = line # Plain text query
+        if not isinstance(entry, dict):
+            entry = {"query" : str(entry)}
+        query = entry.get("query")
+        if query is None:
+            query = f"{entry.get('concept', '')}, {entry.get('topic') or 'No-Topic'}, {entry.get('scope', 'medium')}, {entry.get('direction', 'down')}"
+        yield str(entry.get("id", lineno)), str(query)
+
+def completed_ids(path : str) -> set:
+    """
+    Ids with a successful result in an earlier output file. A last line cut off by an interrupted run
+    is removed, so new results are appended after whole lines
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+            data = data[:data.rfind(b"\n") + 1]
+    for line in data.decode("utf-8").splitlines():
+        try:
+            result = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(result, dict) and "error" not in result and "id" in result:
+            done.add(str(result["id"]))
+    return done
+
+def percentile(values, p : float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else 0.0
+
+class BatchRunner:
+    """
+    Runs queries through up to workers ConceptExpanderChat instances (one per worker thread, reset before
+    every query so queries are independent) and writes one JSON line per result. At most 2 * workers
+    queries are read ahead, so stdin is consumed as results are written rather than all at once.
+
+    :param out: Output file object
+    :param workers: Queries in flight at once
+    :param ordered: Write results in input order, otherwise as they finish
+    :param requests_per_second: Rate limit over all workers, None for no limit
+    """
+    def __init__(self, out, workers : int = 4, ordered : bool = True, requests_per_second : float = None):
+        self.out = out
+        self.workers = workers
+        self.ordered = ordered
+        self.limiter = RateLimiter(requests_per_second, burst = workers) if requests_per_second else None
+        self.local = threading.local()
+        self.harnesses = [] # Every worker's harness, for the transport statistics
+
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.latencies = []
+
+    def expand(self, query : str) -> Tuple[Optional[dict], Optional[str], float]:
+        """
+        (reply, error, seconds) of one query on the current worker thread's harness
+        """
+        harness = getattr(self.local, "harness", None)
+        if harness is None:
+            harness = self.local.harness = ConceptExpanderChat()
+            self.harnesses.append(harness)
+        if self.limiter is not None:
+            self.limiter.acquire()
+
+        harness.reset()
+        start = time.perf_counter()
+        try:
+            reply = harness.converse(query)
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}", time.perf_counter() - start
+        seconds = time.perf_counter() - start
+        if not isinstance(reply, dict):
+            return None, str(reply), seconds # converse returns API errors as text
+        return reply, None, seconds
+
+    def write(self, id : str, query : str, reply : Optional[dict], error : Optional[str], seconds : float):
+        result = {"id" : id, "query" : query}
+        if error is not None:
+            result["error"] = error
+            self.failed += 1
+        else:
+            result.update({"new_concepts" : reply.get("new_concepts") or [], "chat" : reply.get("chat", "")})
+            self.succeeded += 1
+            self.latencies.append(seconds)
+        result["seconds"] = round(seconds, 3)
+        self.out.write(json.dumps(result, ensure_ascii = False) + "\n")
+        self.out.flush() # A result on disk is a query that a restart skips
+
+    def run(self, queries : Iterable[Tuple[str, str]], skip : set = frozenset()):
+        queries = iter(queries)
+        running : Dict[Future, Tuple[int, str, str]] = {}
+        finished : Dict[int, tuple] = {} # Results waiting for earlier ones, by input position
+        next_write = 0
+        position = 0
+        exhausted = False
+
+        executor = ThreadPoolExecutor(max_workers = self.workers, thread_name_prefix = "batch")
+        try:
+            while True:
+                while not exhausted and len(running) + len(finished) < 2 * self.workers:
+                    try:
+                        id, query = next(queries)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if id in skip:
+                        self.skipped += 1
+                        continue
+                    running[executor.submit(self.expand, query)] = (position, id, query)
+                    position += 1
+
+                if not running:
+                    break
+                done, _ = wait(running, return_when = FIRST_COMPLETED)
+                for future in done:
+                    index, id, query = running.pop(future)
+                    if self.ordered:
+                        finished[index] = (id, query) + future.result()
+                    else:
+                        self.write(id, query, *future.result())
+                while next_write in finished:
+                    self.write(*finished.pop(next_write))
+                    next_write += 1
+        finally:
+            executor.shutdown(wait = False, cancel_futures = True)
+
+    def stats(self, seconds : float) -> str:
+        lines = [
+            f"{self.succeeded} succeeded, {self.failed} failed, {self.skipped} skipped as already done in {seconds:.1f}s "
+            f"({(self.succeeded + self.failed) / max(seconds, 1e-9):.2f} queries/s)"
+        ]
+        if self.latencies:
+            lines.append(
+                f"latency p50 {percentile(self.latencies, 50):.2f}s, p90 {percentile(self.latencies, 90):.2f}s, "
+                f"p99 {percentile(self.latencies, 99):.2f}s, max {max(self.latencies):.2f}s"
+            )
+        if self.harnesses:
+            transport = self.harnesses[0].transport.stats()
+            lines.append(f"requests {transport['requests']}, retries {transport['retries']}, coalesced {transport['coalesced']}")
+        return "\n".join(lines)
+
+def batch(args):
+    skip = completed_ids(args.out) if args.out else set()
+    source = sys.stdin if args.batch == "-" else open(args.batch, 'r', encoding = "utf-8")
+    out = open(args.out, 'a', encoding = "utf-8") if args.out else sys.stdout
+
+    runner = BatchRunner(out, workers = args.workers, ordered = not args.completion_order, requests_per_second = args.rps)
+    start = time.perf_counter()
+    try:
+        runner.run(read_queries(source), skip)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+        print(runner.stats(time.perf_counter() - start), file = sys.stderr)
+    return 1 if runner.failed else 0
+
+def main():
+    parser = argparse.ArgumentParser(description = "Expand concepts with ConceptExpanderChat, interactively or in bulk")
+    parser.add_argument("--batch", default = None, help = "JSON lines file of queries, - for stdin")
+    parser.add_argument("--out", default = None, help = "Results file, appended to and used to skip finished ids (stdout if not given)")
+    parser.add_argument("--workers", type = int, default = 4, help = "Queries in flight at once")
+    parser.add_argument("--completion-order", action = "store_true", help = "Write results as they finish instead of in input order")
+    parser.add_argument("--rps", type = float, default = None, help = "Requests per second over all workers")
+    args = parser.parse_args()
+
+    if args.batch is None:
+        interactive()
+    else:
+        sys.exit(batch(args))
+
+if __name__ == "__main__":
+    main()
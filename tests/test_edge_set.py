@@ -0,0 +1,62 @@
+"""
+EdgeSet's hash table through random adds and removals, checked against a plain set of tuples
+"""
+import pickle
+import random
+
+import pytest
+
+from LearnAssist.graph import EdgeSet
+
+def check(edges : EdgeSet, model : set):
+    assert len(edges) == len(model)
+    assert set(edges) == model and len(list(edges)) == len(model)
+    assert all(edge in edges for edge in model)
+
+@pytest.mark.parametrize("seed", range(4))
+def test_random_adds_and_removals_match_a_set(seed):
+    rng = random.Random(seed)
+    edges, model = EdgeSet(), set()
+    ids = [0, 1, 2, EdgeSet.MASK - 1] + [rng.randrange(1 << 31) for _ in range(40)]
+    for step in range(20000):
+        edge = (rng.choice(ids), rng.choice(ids))
+        if rng.random() < 0.6:
+            assert edges.add(*edge) == (edge not in model)
+            model.add(edge)
+        else:
+            assert edges.discard(*edge) == (edge in model)
+            model.discard(edge)
+        assert (edge in edges) == (edge in model)
+        assert edges.used <= EdgeSet.MAX_LOAD * len(edges.table)
+        if step % 1000 == 0:
+            check(edges, model)
+    check(edges, model)
+
+def test_table_stays_compact():
+    edges = EdgeSet((i, i + 1) for i in range(100000))
+    assert len(edges) > len(edges.table) * EdgeSet.MAX_LOAD / 3 # Growing only doubles the table
+    for i in range(99000):
+        edges.discard(i, i + 1)
+    for i in range(50000):
+        edges.add(i, i)
+        edges.discard(i, i)
+    assert len(edges.table) <= 4096 # Rebuilt smaller as the edges were removed
+    check(edges, {(i, i + 1) for i in range(99000, 100000)})
+
+def test_pickle():
+    model = {(1, 2), (2, 1), (0, 0), (7, 3)}
+    check(pickle.loads(pickle.dumps(EdgeSet(model))), model)
+
+def test_unpickle_set_of_packed_ints():
+    edges = EdgeSet.__new__(EdgeSet)
+    edges.__setstate__((None, {"keys" : {(1 << EdgeSet.SHIFT) | 2, 5}}))
+    check(edges, {(1, 2), (0, 5)})
+
+def test_storage_builds_the_same_table():
+    np = pytest.importorskip("numpy")
+    from LearnAssist.storage import edge_set
+    rng = random.Random(0)
+    model = {(rng.randrange(5000), rng.randrange(5000)) for _ in range(20000)} | {(0, 0)}
+    edges = edge_set(np.array([(a << EdgeSet.SHIFT) | b for a, b in model], dtype = np.int64))
+    check(edges, model)
+    assert not edges.add(0, 0) and edges.discard(0, 0) and edges.add(4999, 0) == ((4999, 0) not in model)
@@ -0,0 +1,243 @@
+"""
+FrontierExpander against in process backends: expansion_reply through make_backend("fake-expansion"),
+and a stand-in that answers from a fixed concept tree and records what it was asked
+"""
+import json
+import threading
+
+from LearnAssist.backends import BackendError, FakeBackend, make_backend
+from LearnAssist.chat_harness import ConceptExpanderChat
+from LearnAssist.expander import FrontierExpander
+from LearnAssist.graph import DirectedGraph
+
+# Concept -> suggestions, each name distinct enough to never be merged with another
+TREE = {
+    "Calculus" : ["Limits", "Derivatives", "Integrals"],
+    "Limits" : ["Epsilon delta", "Continuity"],
+    "Derivatives" : ["Chain rule", "Continuity"],
+    "Integrals" : ["Riemann sums"],
+    "Epsilon delta" : ["Quantifiers"],
+    "Continuity" : ["Intermediate value theorem"],
+    "Chain rule" : ["Function composition"],
+    "Riemann sums" : ["Partitions"]
+}
+
+class TreeBackend(FakeBackend):
+    """
+    Replies from TREE. fail maps a concept to what to do instead: an exception to raise or a string to reply with
+    """
+    def __init__(self, fail : dict = None):
+        super().__init__(self.answer)
+        self.fail = fail or {}
+        self.asked = []
+        self.commands = []
+        self.asked_lock = threading.Lock()
+
+    def answer(self, messages) -> str:
+        concept = messages[-1]['content'].split(",")[0].strip()
+        with self.asked_lock:
+            self.asked.append(concept)
+            self.commands.append(messages[-1]['content'])
+        failure = self.fail.get(concept)
+        if isinstance(failure, Exception):
+            raise failure
+        if failure is not None:
+            return failure
+        data = {
+            "concept" : concept,
+            "chat" : f"Concepts around {concept}",
+            "new_concepts" : [{"name" : name, "justification" : f"{concept} needs {name}"} for name in TREE.get(concept, [])]
+        }
+        return "```json\n" + json.dumps(data) + "\n```"
+
+def make_expander(graph, backend, **kwargs) -> FrontierExpander:
+    kwargs.setdefault("max_workers", 1) # One at a time keeps the breadth first order deterministic
+    return FrontierExpander(graph, harness_factory = lambda: ConceptExpanderChat(backend = backend), **kwargs)
+
+def id_of(graph, name : str) -> int:
+    id = graph.names.lookup(name)
+    assert id is not None, f"{name} is not in the graph"
+    return id
+
+def names(graph):
+    return sorted(node.display_text for node in graph.V.values())
+
+# ==== DEPTH AND BUDGET ====
+def test_depth_one_expands_only_the_seeds():
+    graph, backend = DirectedGraph(), TreeBackend()
+    report = make_expander(graph, backend, max_depth = 1).run(["Calculus"])
+    assert backend.asked == ["Calculus"]
+    assert names(graph) == ["Calculus", "Derivatives", "Integrals", "Limits"]
+    assert report.expanded == 1 and report.nodes_added == 4 and report.edges_added == 3
+
+def test_expansion_is_breadth_first_and_stops_at_max_depth():
+    graph, backend = DirectedGraph(), TreeBackend()
+    report = make_expander(graph, backend, max_depth = 2).run(["Calculus"])
+    assert backend.asked == ["Calculus", "Limits", "Derivatives", "Integrals"]
+    # The last level is added to the graph but not expanded
+    for name in ["Epsilon delta", "Continuity", "Chain rule", "Riemann sums"]:
+        id_of(graph, name)
+    assert "Quantifiers" not in names(graph)
+    assert report.requests == 4 and report.expanded == 4 and not report.failed
+
+def test_budget_limits_requests():
+    graph, backend = DirectedGraph(), TreeBackend()
+    report = make_expander(graph, backend, max_depth = 5, budget = 3).run(["Calculus"])
+    assert backend.asked == ["Calculus", "Limits", "Derivatives"]
+    assert report.requests == 3
+
+def test_budget_holds_with_concurrent_workers():
+    graph, backend = DirectedGraph(), TreeBackend()
+    report = make_expander(graph, backend, max_depth = 5, budget = 5, max_workers = 4).run(["Calculus"])
+    assert len(backend.asked) == 5 and len(set(backend.asked)) == 5
+    assert report.requests == 5 and report.expanded == 5
+
+def test_fake_expansion_backend():
+    graph = DirectedGraph()
+    expander = FrontierExpander(graph, harness_factory = lambda: ConceptExpanderChat(backend = make_backend("fake-expansion")), max_depth = 1)
+    report = expander.run(["Topology"])
+    seed = id_of(graph, "Topology")
+    assert report.expanded == 1 and len(graph.V[seed].forward_neighbors) == 5
+
+# ==== MERGING ====
+def test_suggestions_matching_existing_nodes_are_not_duplicated():
+    graph, backend = DirectedGraph(), TreeBackend()
+    limits = graph.add_node(text = "limits") # Differs only in case from the suggestion
+    derivatives = graph.add_node(text = "Derivative") # Small typo
+    make_expander(graph, backend, max_depth = 1).run(["Calculus"])
+    calculus = id_of(graph, "Calculus")
+    assert len(graph.V) == 4
+    assert (calculus, limits) in graph.E and (calculus, derivatives) in graph.E
+
+def test_concept_suggested_twice_is_added_and_expanded_once():
+    graph, backend = DirectedGraph(), TreeBackend()
+    make_expander(graph, backend, max_depth = 3).run(["Calculus"])
+    continuity = id_of(graph, "Continuity")
+    assert names(graph).count("Continuity") == 1
+    assert backend.asked.count("Continuity") == 1
+    assert set(graph.V[continuity].backward_neighbors) == {id_of(graph, "Limits"), id_of(graph, "Derivatives")}
+
+def test_seed_given_by_id_and_existing_seed_name():
+    graph, backend = DirectedGraph(), TreeBackend()
+    calculus = graph.add_node(text = "Calculus")
+    make_expander(graph, backend, max_depth = 1).run([calculus, "calculus"])
+    assert backend.asked == ["Calculus"]
+    assert names(graph).count("Calculus") == 1
+
+def test_down_edges_point_to_suggestions_with_justification_notes():
+    graph, backend = DirectedGraph(), TreeBackend()
+    make_expander(graph, backend, max_depth = 1, direction = "down").run(["Calculus"])
+    calculus, limits = id_of(graph, "Calculus"), id_of(graph, "Limits")
+    assert (calculus, limits) in graph.E and (limits, calculus) not in graph.E
+    assert graph.notes[(calculus, limits)] == "Calculus needs Limits"
+
+def test_up_edges_point_from_suggestions_with_justification_notes():
+    graph, backend = DirectedGraph(), TreeBackend()
+    make_expander(graph, backend, max_depth = 1, direction = "up").run(["Calculus"])
+    calculus, limits = id_of(graph, "Calculus"), id_of(graph, "Limits")
+    assert (limits, calculus) in graph.E and (calculus, limits) not in graph.E
+    assert graph.notes[(limits, calculus)] == "Calculus needs Limits"
+
+def test_command_carries_topic_scope_and_direction():
+    graph, backend = DirectedGraph(), TreeBackend()
+    make_expander(graph, backend, max_depth = 1, topic = "Analysis", scope = "low", direction = "backward").run(["Calculus"])
+    assert backend.commands == ["Calculus, Analysis, low, backward"]
+
+# ==== FAILURES ====
+def test_api_error_is_reported_and_expansion_continues():
+    graph, backend = DirectedGraph(), TreeBackend(fail = {"Limits" : BackendError("HTTP 400: Bad request", 400)})
+    seen = []
+    report = make_expander(graph, backend, max_depth = 2, on_expand = lambda concept, reply, error: seen.append((concept, error))).run(["Calculus"])
+    assert report.failed == [("Limits", "RuntimeError: API Error : HTTP 400: Bad request")]
+    assert report.expanded == 3
+    assert ("Limits", "RuntimeError: API Error : HTTP 400: Bad request") in seen
+    assert "Epsilon delta" not in names(graph) # Nothing merged for the failed concept
+
+def test_reply_without_json_is_reported():
+    graph, backend = DirectedGraph(), TreeBackend(fail = {"Integrals" : "Sorry, I can't help with that."})
+    report = make_expander(graph, backend, max_depth = 2).run(["Calculus"])
+    assert [concept for concept, _ in report.failed] == ["Integrals"]
+    assert report.failed[0][1].startswith("ValueError")
+    assert "Riemann sums" not in names(graph)
+
+def test_cut_off_reply_keeps_complete_entries():
+    cut = '```json\n{"concept" : "Calculus", "new_concepts" : [{"name" : "Limits", "justification" : "x"}, {"name" : "Deriv'
+    graph, backend = DirectedGraph(), TreeBackend(fail = {"Calculus" : cut})
+    report = make_expander(graph, backend, max_depth = 1).run(["Calculus"])
+    assert not report.failed
+    assert names(graph) == ["Calculus", "Limits"]
+
+# ==== CHECKPOINTS ====
+def read_checkpoint(path) -> list:
+    with open(path, 'r', encoding = "utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def test_checkpoint_records_settings_replies_and_errors(tmp_path):
+    checkpoint = str(tmp_path / "run.expand.jsonl")
+    backend = TreeBackend(fail = {"Derivatives" : BackendError("HTTP 400: Bad request", 400)})
+    make_expander(DirectedGraph(), backend, max_depth = 2, checkpoint = checkpoint).run(["Calculus"])
+    settings, *entries = read_checkpoint(checkpoint)
+    assert settings == {"seeds" : ["Calculus"], "topic" : None, "scope" : "medium", "direction" : "down", "max_depth" : 2}
+    assert [entry["concept"] for entry in entries] == ["Calculus", "Limits", "Derivatives", "Integrals"]
+    assert "error" in entries[2] and "new_concepts" not in entries[2]
+    assert [c["name"] for c in entries[0]["new_concepts"]] == TREE["Calculus"]
+
+def test_resume_replays_checkpoint_and_retries_failures(tmp_path):
+    checkpoint = str(tmp_path / "run.expand.jsonl")
+    first = TreeBackend(fail = {"Derivatives" : BackendError("HTTP 400: Bad request", 400)})
+    make_expander(DirectedGraph(), first, max_depth = 2, checkpoint = checkpoint).run(["Calculus"])
+
+    # A fresh graph rebuilt from the checkpoint, only the failed concept is sent again
+    graph, second = DirectedGraph(), TreeBackend()
+    report = make_expander(graph, second, max_depth = 2, checkpoint = checkpoint).run(["Calculus"])
+    assert second.asked == ["Derivatives"]
+    assert report.replayed == 3 and report.expanded == 4 and not report.failed
+
+    reference = DirectedGraph()
+    make_expander(reference, TreeBackend(), max_depth = 2).run(["Calculus"])
+    assert names(graph) == names(reference)
+    assert len(graph.E) == len(reference.E)
+
+    entries = read_checkpoint(checkpoint)[1:]
+    assert [entry["concept"] for entry in entries if "error" not in entry] == ["Calculus", "Limits", "Integrals", "Derivatives"]
+
+def test_resume_continues_an_interrupted_run(tmp_path):
+    checkpoint = str(tmp_path / "run.expand.jsonl")
+    first = TreeBackend()
+    make_expander(DirectedGraph(), first, max_depth = 3, budget = 2, checkpoint = checkpoint).run(["Calculus"])
+    assert first.asked == ["Calculus", "Limits"]
+
+    graph, second = DirectedGraph(), TreeBackend()
+    report = make_expander(graph, second, max_depth = 3, checkpoint = checkpoint).run(["Calculus"])
+    assert "Calculus" not in second.asked and "Limits" not in second.asked
+    assert report.replayed == 2
+    reference = DirectedGraph()
+    make_expander(reference, TreeBackend(), max_depth = 3).run(["Calculus"])
+    assert names(graph) == names(reference)
+
+def test_checkpoint_of_other_settings_starts_over(tmp_path):
+    checkpoint = str(tmp_path / "run.expand.jsonl")
+    make_expander(DirectedGraph(), TreeBackend(), max_depth = 1, checkpoint = checkpoint).run(["Calculus"])
+    backend = TreeBackend()
+    report = make_expander(DirectedGraph(), backend, max_depth = 1, direction = "up", checkpoint = checkpoint).run(["Calculus"])
+    assert backend.asked == ["Calculus"] and report.replayed == 0
+    assert read_checkpoint(checkpoint)[0]["direction"] == "up"
+
+def test_cut_off_checkpoint_header_starts_over(tmp_path):
+    checkpoint = tmp_path / "run.expand.jsonl"
+    checkpoint.write_text('{"seeds" : ["Calc', encoding = "utf-8")
+    backend = TreeBackend()
+    report = make_expander(DirectedGraph(), backend, max_depth = 1, checkpoint = str(checkpoint)).run(["Calculus"])
+    assert backend.asked == ["Calculus"] and report.replayed == 0
+
+def test_cut_off_last_entry_keeps_the_entries_before_it(tmp_path):
+    checkpoint = tmp_path / "run.expand.jsonl"
+    make_expander(DirectedGraph(), TreeBackend(), max_depth = 2, budget = 3, checkpoint = str(checkpoint)).run(["Calculus"])
+    data = checkpoint.read_bytes()
+    checkpoint.write_bytes(data[:-10]) # Interrupted while writing the entry for Derivatives
+
+    graph, backend = DirectedGraph(), TreeBackend()
+    report = make_expander(graph, backend, max_depth = 2, checkpoint = str(checkpoint)).run(["Calculus"])
+    assert backend.asked == ["Derivatives", "Integrals"]
+    assert report.replayed == 2 and report.expanded == 4
+    assert [entry["concept"] for entry in read_checkpoint(checkpoint)[1:]] == ["Calculus", "Limits", "Derivatives", "Integrals"]
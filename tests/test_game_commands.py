@@ -0,0 +1,60 @@
+"""
+Chat commands of the explorer with malformed node IDs, as typed or as streamed in from a BaseChat reply
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("LEARNASSIST_BACKEND", "fake")
+
+import pytest
+
+pygame = pytest.importorskip("pygame")
+
+from LearnAssist.game import GraphExplorer
+from LearnAssist.graph import DirectedGraph
+
+@pytest.fixture(scope = "module")
+def explorer():
+    explorer = GraphExplorer(resolution = (800, 600))
+    yield explorer
+    pygame.quit()
+
+@pytest.fixture
+def graph(explorer):
+    graph = DirectedGraph()
+    a, b = graph.add_node(text = "Limits"), graph.add_node(text = "Derivatives")
+    graph.add_edge(a, b)
+    explorer.graph = graph
+    explorer.chat_log.messages.clear()
+    return graph
+
+def last_reply(explorer) -> str:
+    return explorer.chat_log.messages[-1]
+
+@pytest.mark.parametrize("command, reply", [
+    ("/addedge abc, 1", "System: Invalid node IDs provided"),
+    ("/addedge 0", "System: Invalid node IDs provided"),
+    ("/deledge 0, x", "System: No edge between the IDs provided"),
+    ("/deledge", "System: No edge between the IDs provided"),
+    ("/delnode abc", "System: Invalid node ID provided"),
+    ("/delnode", "System: Invalid node ID provided"),
+    ("/merge 3", "System: Invalid node IDs provided"),
+    ("/merge one, two", "System: Invalid node IDs provided"),
+    ("/rename x, Limits of functions", "System: Invalid node ID or name provided"),
+])
+def test_malformed_ids_are_answered_not_raised(explorer, graph, command, reply):
+    assert explorer.handle_commands(command, "User")
+    assert last_reply(explorer) == reply
+    assert len(graph.V) == 2 and len(graph.E) == 1
+
+def test_malformed_command_in_base_chat_reply(explorer, graph):
+    explorer.receive_text("Sure, I will remove it: /delnode Limits\nDone.", "BaseChat")
+    assert "System: Invalid node ID provided" in explorer.chat_log.messages
+    assert len(graph.V) == 2
+
+def test_well_formed_ids_still_work(explorer, graph):
+    explorer.handle_commands("/addedge 1, 0", "User")
+    assert last_reply(explorer) == "System: Added edge from ID 1 to ID 0"
+    explorer.handle_commands("/deledge 0, 1", "User")
+    assert last_reply(explorer) == "System: Deleted edge from ID 0 to ID 1"
+    assert set(graph.E) == {(1, 0)}
@@ -0,0 +1,45 @@
+"""
+Profiling overlay of the explorer, toggled with profiling already on (e.g. for an exporter) and off
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("LEARNASSIST_BACKEND", "fake")
+
+import pytest
+
+pygame = pytest.importorskip("pygame")
+
+from LearnAssist.game import GraphExplorer
+from LearnAssist.profiling import PROFILER
+
+@pytest.fixture(scope = "module")
+def explorer():
+    explorer = GraphExplorer(resolution = (800, 600))
+    yield explorer
+    pygame.quit()
+
+@pytest.fixture(autouse = True)
+def profiler(explorer):
+    enabled = PROFILER.enabled
+    yield PROFILER
+    if explorer.show_hud:
+        explorer.toggle_hud()
+    PROFILER.enabled = enabled
+    PROFILER.reset()
+
+def test_hud_keeps_counters_when_profiling_was_on(explorer, profiler):
+    profiler.enabled = True
+    profiler.count("exported")
+    explorer.toggle_hud()
+    assert profiler.counters["exported"] == 1
+    explorer.toggle_hud()
+    assert profiler.enabled and profiler.counters["exported"] == 1
+
+def test_hud_starts_clean_when_profiling_was_off(explorer, profiler):
+    profiler.enabled = False
+    profiler.counters["stale"] = 3
+    explorer.toggle_hud()
+    assert profiler.enabled and "stale" not in profiler.counters
+    explorer.toggle_hud()
+    assert not profiler.enabled
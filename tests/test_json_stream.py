@@ -0,0 +1,66 @@
+"""
+ConceptStreamParser on whole replies, replies fed a character at a time and replies cut off at every point
+"""
+import json
+
+import pytest
+
+from LearnAssist.json_stream import ConceptStreamParser, parse_concepts
+
+CONCEPTS = [{"name" : "Limits", "description" : "What a function tends to {near} a point"}, "Derivatives", {"name" : "Chain \"rule\""}]
+EXPECTED = [{"name" : "Limits", "description" : "What a function tends to {near} a point"}, {"name" : "Derivatives"}, {"name" : "Chain \"rule\""}]
+BODY = json.dumps({"chat" : "Here are some [ideas] to explore", "new_concepts" : CONCEPTS})
+
+REPLIES = {
+    "bare" : BODY,
+    "fenced" : f"```json\n{BODY}\n```",
+    "prose" : f"Sure, here you go:\n{BODY}",
+    "fenced after prose" : f"I think {{this}} is it: ```json {BODY}```",
+    "fenced after an example" : f'Replies look like {{"chat" : "..."}}, so:\n```JSON\n{BODY}\n```',
+    "example without a fence" : f'Replies look like {{"chat" : "..."}}, so: {BODY}',
+    "trailing junk" : f"{BODY}\n``` Hope that helps! {{\"new_concepts\" : [\"Nope\"]}}",
+}
+
+def feed_chars(reply : str):
+    parser = ConceptStreamParser()
+    streamed = [entry for c in reply for entry in parser.feed(c)]
+    return streamed, parser.finish()
+
+@pytest.mark.parametrize("name", REPLIES)
+def test_whole_reply(name):
+    assert parse_concepts(REPLIES[name]) == {"chat" : "Here are some [ideas] to explore", "new_concepts" : EXPECTED}
+
+@pytest.mark.parametrize("name", REPLIES)
+def test_char_by_char_matches_whole_reply(name):
+    streamed, data = feed_chars(REPLIES[name])
+    assert streamed == EXPECTED
+    assert data == parse_concepts(REPLIES[name])
+
+@pytest.mark.parametrize("name", ["bare", "fenced", "fenced after prose"])
+def test_every_truncation_point(name):
+    reply = REPLIES[name]
+    for end in range(len(reply) + 1):
+        parser = ConceptStreamParser()
+        streamed = parser.feed(reply[:end])
+        try:
+            data = parser.finish()
+        except ValueError:
+            assert "{" not in reply[:end].split("```json")[-1], f"Cut at {end}" # Nothing to parse after the fence yet
+            continue
+        assert data["new_concepts"] == streamed == EXPECTED[:len(streamed)], f"Cut at {end}"
+        assert data.get("chat") in (None, "Here are some [ideas] to explore"), f"Cut at {end}"
+
+def test_entries_stream_out_as_they_close():
+    parser = ConceptStreamParser()
+    assert parser.feed('{"chat" : "hi", "new_concepts" : [{"name" : "Limits"}, {"name" : "Deri') == [{"name" : "Limits"}]
+    assert parser.feed('vatives"}]}') == [{"name" : "Derivatives"}]
+
+def test_reply_without_the_field_keeps_its_object():
+    assert parse_concepts('Just chatting: {"chat" : "hi"} and {nothing else') == {"chat" : "hi", "new_concepts" : []}
+
+def test_malformed_entries_are_skipped():
+    assert parse_concepts('{"new_concepts" : [{"name" : ""}, 3, {"title" : "x"}, {"name" : "Limits"}]}') == {"new_concepts" : [{"name" : "Limits"}]}
+
+def test_reply_without_json():
+    with pytest.raises(ValueError):
+        parse_concepts("Sorry, I can't help with that")
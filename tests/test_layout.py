@@ -0,0 +1,76 @@
+"""
+ForceLayout steps done in slices within a time budget, against the same steps done whole
+"""
+from collections import namedtuple
+import random
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from LearnAssist.graph import DirectedGraph
+from LearnAssist.layout import ForceLayout
+
+Point = namedtuple("Point", "x y")
+
+def random_graph(n : int, seed : int = 0):
+    rng = random.Random(seed)
+    graph = DirectedGraph()
+    graph.add_nodes((id, f"concept {id}") for id in range(n))
+    graph.add_edges((rng.randrange(n), rng.randrange(n)) for _ in range(2 * n))
+    positions = {id : Point(rng.uniform(0, 30 * n ** 0.5), rng.uniform(0, 30 * n ** 0.5)) for id in range(n)}
+    return graph, positions
+
+def hot_layout(graph, positions, **kwargs) -> ForceLayout:
+    layout = ForceLayout(**kwargs)
+    layout.sync(graph, positions)
+    layout.reheat()
+    return layout
+
+@pytest.mark.parametrize("exact_limit", [1000, 50]) # Exact repulsion, then the grid
+def test_sliced_step_matches_whole_step(exact_limit):
+    graph, positions = random_graph(400)
+    whole, sliced = hot_layout(graph, positions, exact_limit = exact_limit), hot_layout(graph, positions, exact_limit = exact_limit)
+    for _ in range(3):
+        whole.step()
+        while sliced.n_steps < whole.n_steps:
+            sliced.step_slice(37)
+        assert np.allclose(whole.pos, sliced.pos, rtol = 0, atol = 1e-6)
+        assert np.allclose(whole.heat, sliced.heat)
+
+def test_run_stays_near_budget_and_carries_on():
+    graph, positions = random_graph(5000)
+    layout = hot_layout(graph, positions)
+    whole_step = time.perf_counter()
+    hot_layout(graph, positions).step()
+    whole_step = time.perf_counter() - whole_step
+
+    seen = set()
+    for _ in range(200):
+        start = time.perf_counter()
+        seen.update(layout.run(budget_ms = 2))
+        assert time.perf_counter() - start < whole_step / 2
+        if layout.n_steps:
+            break
+    assert layout.n_steps == 1 and seen == set(graph.V) # The step was finished over several calls
+
+def test_pinned_node_stays_put_mid_step():
+    graph, positions = random_graph(300)
+    layout = hot_layout(graph, positions)
+    layout.step_slice(10)
+    pinned = layout.ids[200]
+    layout.set_position(pinned, 5.0, 5.0)
+    while layout.n_steps == 0:
+        layout.step_slice(10)
+    assert layout.position(pinned) == (5.0, 5.0)
+
+def test_edit_mid_step_resumes_where_it_stopped():
+    graph, positions = random_graph(300)
+    layout = hot_layout(graph, positions)
+    layout.step_slice(150)
+    id = graph.add_node(text = "new concept")
+    positions[id] = Point(0.0, 0.0)
+    layout.sync(graph, positions, hot = [id])
+    moved = layout.step_slice(10)
+    assert moved[0] == 150
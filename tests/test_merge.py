@@ -0,0 +1,108 @@
+"""
+Merging nodes: DirectedGraph.merge_nodes, merge_duplicates over the similarity index and GraphExplorer.merge_nodes
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("LEARNASSIST_BACKEND", "fake")
+
+import pytest
+
+from LearnAssist.graph import DirectedGraph
+
+@pytest.fixture
+def graph():
+    """
+    Limits -> keep, Limits -> drop, drop -> Chain rule, keep -> Integrals, drop -> Integrals, with notes on drop's edges
+    """
+    graph = DirectedGraph()
+    for id, name in enumerate(["Derivative", "Derivatives", "Limits", "Chain rule", "Integrals"]):
+        graph.add_node(id = id, text = name)
+    graph.add_edges([(2, 0), (2, 1), (1, 3), (0, 4), (1, 4)])
+    graph.set_note(2, 1, "Limits define the derivative")
+    graph.set_note(1, 3, "Differentiating compositions")
+    graph.set_note(0, 4, "Keep's own note")
+    graph.set_note(1, 4, "Drop's note on the same edge")
+    return graph
+
+def test_edges_notes_and_tags_move_to_keep(graph):
+    graph.set_tagged(1, True)
+    graph.merge_nodes(0, 1)
+    assert 1 not in graph.V
+    assert set(graph.E) == {(2, 0), (0, 3), (0, 4)}
+    assert set(graph.V[0].forward_neighbors) == {3, 4} and set(graph.V[0].backward_neighbors) == {2}
+    assert graph.notes[(0, 3)] == "Differentiating compositions"
+    assert graph.notes[(2, 0)] == "Limits define the derivative" # keep already had the edge, not its note
+    assert graph.notes[(0, 4)] == "Keep's own note"
+    assert not any(1 in edge for edge in graph.notes)
+    assert graph.tagged_vertices[0] and 1 not in graph.tagged_vertices
+
+def test_keep_stays_tagged(graph):
+    graph.set_tagged(0, True)
+    graph.merge_nodes(0, 1)
+    assert graph.tagged_vertices[0]
+
+@pytest.mark.parametrize("edge", [(0, 1), (1, 0), (1, 1)])
+def test_edges_between_the_two_are_dropped_not_looped(graph, edge):
+    graph.add_edge(*edge)
+    graph.merge_nodes(0, 1)
+    assert (0, 0) not in graph.E and 0 not in graph.V[0].forward_neighbors
+    assert set(graph.E) == {(2, 0), (0, 3), (0, 4)}
+
+def test_cannot_merge_into_itself(graph):
+    with pytest.raises(AssertionError):
+        graph.merge_nodes(0, 0)
+
+def names_graph(*names) -> DirectedGraph:
+    pytest.importorskip("numpy")
+    graph = DirectedGraph()
+    for name in names:
+        graph.add_node(text = name)
+    return graph
+
+def test_merge_duplicates_keeps_the_older_node():
+    from LearnAssist.similarity import merge_duplicates
+    graph = names_graph("Euler identity", "Linear algebra", "Eulers Identity")
+    graph.add_edge(1, 2)
+    assert merge_duplicates(graph) == {2 : 0}
+    assert set(graph.V) == {0, 1} and set(graph.E) == {(1, 0)}
+
+def test_different_numbers_are_not_merged():
+    from LearnAssist.similarity import merge_duplicates
+    graph = names_graph("Introduction to Calculus 1", "Introduction to Calculus 2")
+    assert graph.similarity.similar_to([0], 0.85) # Close enough as text
+    assert merge_duplicates(graph, threshold = 0.85) == {}
+    assert set(graph.V) == {0, 1}
+
+def test_chains_merge_in_one_pass():
+    from LearnAssist.similarity import merge_duplicates
+    graph = names_graph("The fundamental theorem of calculus", "Fundamental theorem of the calculus", "Theorem of fundamental calculus")
+    pairs = {frozenset((a, b)) for a, b, _ in graph.similarity.similar_to([0, 1, 2], 0.8)}
+    assert pairs == {frozenset((0, 1)), frozenset((1, 2))} # 0 and 2 only meet through 1
+    assert merge_duplicates(graph, [0, 1, 2], threshold = 0.8) == {1 : 0, 2 : 0}
+    assert set(graph.V) == {0}
+
+def test_explorer_merge_moves_positions():
+    pygame = pytest.importorskip("pygame")
+    from LearnAssist.game import GraphExplorer, Point
+    explorer = GraphExplorer(resolution = (800, 600))
+    try:
+        graph = DirectedGraph()
+        keep, drop, other = [graph.add_node(text = name) for name in ["Derivative", "Derivatives", "Limits"]]
+        graph.add_edge(other, drop)
+        explorer.graph = graph
+        explorer.set_node_center(drop, Point(300, 200))
+        explorer.set_node_center(other, Point(100, 100))
+        explorer.merge_nodes(keep, drop)
+        assert explorer.node_centers[keep] == Point(300, 200) # keep had no position, it takes drop's
+        assert drop not in explorer.node_centers
+        assert explorer.visible_nodes() and drop not in explorer.visible_nodes() and keep in explorer.visible_nodes()
+
+        explorer.set_node_center(other, Point(50, 50))
+        graph.add_node(id = 7, text = "Limit")
+        explorer.set_node_center(7, Point(500, 500))
+        explorer.merge_nodes(other, 7)
+        assert explorer.node_centers[other] == Point(50, 50) # keep already had a position
+        assert 7 not in explorer.node_centers and set(graph.E) == {(other, keep)}
+    finally:
+        pygame.quit()
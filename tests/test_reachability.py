@@ -0,0 +1,92 @@
+"""
+ReachabilityIndex kept up to date through random edits, checked against a rebuild from scratch and a brute force search
+"""
+from collections import deque
+import random
+
+import pytest
+
+from LearnAssist.graph import DirectedGraph
+from LearnAssist.reachability import ReachabilityIndex, tutor_context
+
+def learned_ancestors(index : ReachabilityIndex, graph) -> dict:
+    return {id : set(index.learned_ancestors(id)) for id in graph.V}
+
+def brute_force_distances(graph, id : int) -> dict:
+    """
+    Edges from every node that leads to id, to id
+    """
+    distance = {id : 0}
+    queue = deque([id])
+    while queue:
+        current = queue.popleft()
+        for id_b in graph.V[current].backward_neighbors:
+            if id_b not in distance:
+                distance[id_b] = distance[current] + 1
+                queue.append(id_b)
+    return distance
+
+def check_against_brute_force(graph):
+    index = graph.reachability
+    for id in graph.V:
+        distance = brute_force_distances(graph, id)
+        learned = {other for other in distance if other != id and graph.tagged_vertices[other]}
+        assert set(index.learned_ancestors(id)) == learned
+
+        path = index.prerequisite_path(id)
+        assert path[-1] == id
+        assert all((a, b) in graph.E for a, b in zip(path, path[1:]))
+        if graph.tagged_vertices[id] or not graph.V[id].backward_neighbors:
+            assert path == [id]
+        elif learned:
+            # Shortest path from the closest learned node
+            assert graph.tagged_vertices[path[0]]
+            assert len(path) - 1 == min(distance[other] for other in learned)
+
+def random_edit(graph, rng : random.Random):
+    ids = list(graph.V)
+    op = rng.random()
+    if op < 0.35 or len(graph.E) < 5:
+        graph.add_edge(rng.choice(ids), rng.choice(ids)) # Self loops and cycles included
+    elif op < 0.6:
+        graph.remove_edge(*rng.choice(list(graph.E)))
+    elif op < 0.8:
+        id = rng.choice(ids)
+        graph.set_tagged(id, not graph.tagged_vertices[id])
+    elif op < 0.87 and len(ids) > 10:
+        graph.remove_node(rng.choice(ids))
+    elif op < 0.93 and len(ids) > 10:
+        keep, drop = rng.sample(ids, 2)
+        graph.merge_nodes(keep, drop)
+    else:
+        graph.add_node(text = f"concept {graph.next_id}", backward_neighbors = rng.sample(ids, 2), forward_neighbors = rng.sample(ids, 1))
+
+@pytest.mark.parametrize("seed", range(6))
+def test_random_edits_match_rebuild(seed):
+    rng = random.Random(seed)
+    graph = DirectedGraph()
+    graph.add_nodes((id, f"concept {id}") for id in range(30))
+    graph.add_edges((rng.randrange(30), rng.randrange(30)) for _ in range(45))
+    for id in rng.sample(range(30), 6):
+        graph.set_tagged(id, True)
+    graph.reachability # Built now, kept up to date from here on
+
+    for step in range(1000):
+        random_edit(graph, rng)
+        assert learned_ancestors(graph.reachability, graph) == learned_ancestors(ReachabilityIndex(graph), graph), f"Differs after edit {step}"
+        if step % 25 == 0:
+            check_against_brute_force(graph)
+    check_against_brute_force(graph)
+
+def test_tutor_context_names_path_and_missing_prerequisites():
+    graph = DirectedGraph()
+    algebra, limits, derivatives, integrals = [graph.add_node(text = name) for name in ["Algebra", "Limits", "Derivatives", "Integrals"]]
+    graph.add_edges([(algebra, limits), (limits, derivatives), (derivatives, integrals)])
+    graph.set_tagged(algebra, True)
+
+    context = tutor_context(graph, [integrals])
+    assert context["LEARNED CONCEPTS"] == "Algebra"
+    assert context["PREREQUISITES"] == "Integrals: from learned Algebra -> Limits -> Derivatives -> Integrals (learn first: Limits, Derivatives)"
+    assert context["RELEVANT GRAPH"].split("\n ") == ["Algebra -> Limits", "Limits -> Derivatives", "Derivatives -> Integrals"]
+
+    assert tutor_context(graph, []) == {"LEARNED CONCEPTS" : "Algebra", "PREREQUISITES" : None, "RELEVANT GRAPH" : None}
@@ -0,0 +1,77 @@
+"""
+Edges of the explorer drawn straight to the screen while the view changes, and blitted from the edge layer once it holds still
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("LEARNASSIST_BACKEND", "fake")
+
+import pytest
+
+pygame = pytest.importorskip("pygame")
+
+from LearnAssist.game import GraphExplorer, Point
+from LearnAssist.graph import DirectedGraph
+
+@pytest.fixture(scope = "module")
+def explorer():
+    explorer = GraphExplorer(resolution = (800, 600))
+    yield explorer
+    pygame.quit()
+
+@pytest.fixture
+def graph(explorer):
+    graph = DirectedGraph()
+    ids = [graph.add_node(text = f"concept {i}") for i in range(6)]
+    graph.add_edges([(ids[i], ids[i + 1]) for i in range(5)] + [(ids[0], ids[5])])
+    explorer.graph = graph
+    for i in ids:
+        explorer.set_node_center(i, Point(100 + 120 * i, 150 + 60 * (i % 2)))
+    explorer.camera.offset, explorer.camera.zoom = Point(0, 0), 1.0
+    return graph
+
+def frame(explorer) -> dict:
+    """
+    Work done by one full redraw
+    """
+    before = explorer.render_stats()
+    explorer.invalidate()
+    explorer.render()
+    return {key : value - before[key] for key, value in explorer.render_stats().items()}
+
+def test_steady_frames_blit_the_layer(explorer, graph):
+    moving = frame(explorer)
+    assert moving["edge_draw_calls"] == 2 * len(graph.E) and moving["edge_layer_blits"] == 0
+    still = [frame(explorer) for _ in range(3)]
+    assert still[0]["edge_layer_draws"] == 1
+    assert all(f["edge_draw_calls"] == 0 and f["edge_layer_draws"] == 0 and f["edge_layer_blits"] == 1 for f in still[1:])
+
+@pytest.mark.parametrize("change", ["move", "pan", "zoom", "edit"])
+def test_changes_redraw_the_edges(explorer, graph, change):
+    for _ in range(2):
+        frame(explorer)
+    if change == "move":
+        explorer.set_node_center(0, Point(50, 400))
+    elif change == "pan":
+        explorer.camera.offset = Point(10, 0)
+    elif change == "zoom":
+        explorer.camera.zoom = 1.25
+    else:
+        graph.remove_edge(0, 5)
+    assert frame(explorer)["edge_draw_calls"] == 2 * len(graph.E)
+
+def test_layer_looks_like_drawing_directly(explorer, graph):
+    frame(explorer)
+    direct = pygame.image.tobytes(explorer.screen, "RGB")
+    frame(explorer)
+    assert frame(explorer)["edge_layer_blits"] == 1
+    assert pygame.image.tobytes(explorer.screen, "RGB") == direct
+
+def test_dirty_rect_redraw_uses_the_layer(explorer, graph):
+    for _ in range(2):
+        frame(explorer)
+    before = explorer.render_stats()
+    explorer.invalidate((100, 100, 200, 100))
+    explorer.render()
+    after = explorer.render_stats()
+    assert after["edge_draw_calls"] == before["edge_draw_calls"] and after["edge_layer_blits"] == before["edge_layer_blits"] + 1
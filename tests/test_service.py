@@ -0,0 +1,56 @@
+"""
+SessionManager turn counts when a session is evicted the moment the scheduler lets go of it
+"""
+import asyncio
+
+import pytest
+
+from LearnAssist.backends import FakeBackend
+from LearnAssist.service import FairScheduler, ServiceError, SessionManager
+
+class EvictingScheduler(FairScheduler):
+    """
+    Evicts a session as soon as its turn finishes, before the caller awaiting the turn gets to run again
+    """
+    def __init__(self, manager : SessionManager):
+        super().__init__(max_concurrency = 2)
+        self.manager = manager
+
+    def _finished(self, session, future, task):
+        super()._finished(session, future, task)
+        if session.idle and session.name in self.manager.sessions:
+            self.manager.evict(session)
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = SessionManager(str(tmp_path), backend = FakeBackend(lambda messages: f"Reply {len(messages)}"))
+    manager.scheduler = EvictingScheduler(manager)
+    yield manager
+    manager.shutdown()
+
+def test_turns_survive_eviction(manager):
+    async def talk():
+        for i in range(3):
+            await manager.converse("alice", f"Message {i}", kind = "base")
+    asyncio.run(talk())
+    assert manager.evicted == 3
+    session = manager.get("alice")
+    assert session.turns == 3 and len(session.history()) == 6
+
+def test_reset_survives_eviction(manager):
+    manager.get("alice", "base").turns = 5
+    async def talk():
+        await manager.reset("alice")
+    asyncio.run(talk())
+    session = manager.get("alice")
+    assert session.turns == 0 and session.history() == []
+
+def test_api_errors_are_not_counted(manager):
+    async def talk():
+        await manager.converse("alice", "Hello", kind = "base")
+        session = manager.get("alice")
+        session.harness.converse = lambda message: "API Error : HTTP 400"
+        with pytest.raises(ServiceError):
+            await manager.converse("alice", "Hello again")
+    asyncio.run(talk())
+    assert manager.get("alice").turns == 1
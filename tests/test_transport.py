@@ -0,0 +1,152 @@
+"""
+Coalescing of identical requests in Transport, with a backend that holds its reply until the test lets it go
+"""
+import threading
+import time
+
+import pytest
+
+from LearnAssist.backends import BackendError, FakeBackend
+from LearnAssist.transport import Transport
+
+MESSAGES = [{"role" : "user", "content" : "What is a limit?"}]
+
+class GatedBackend(FakeBackend):
+    """
+    Sends its first delta, then waits for gate before the rest (or fail, raised instead of the rest)
+    """
+    def __init__(self, fail : Exception = None):
+        super().__init__("Hello, world")
+        self.fail = fail
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def complete(self, model, messages, temperature):
+        return "".join(self.stream(model, messages, temperature))
+
+    def stream(self, model, messages, temperature):
+        with self.lock:
+            self.requests += 1
+        self.started.set()
+        yield "Hello"
+        self.gate.wait(5)
+        if self.fail is not None:
+            raise self.fail
+        yield ", world"
+
+class Reader(threading.Thread):
+    """
+    Reads a whole stream (or completion) on its own thread, keeping the deltas and any error
+    """
+    def __init__(self, transport : Transport, stream : bool = True):
+        super().__init__(daemon = True)
+        self.transport, self.streaming = transport, stream
+        self.deltas, self.error = [], None
+        self.start()
+
+    def run(self):
+        try:
+            if self.streaming:
+                for delta in self.transport.stream("model", MESSAGES, 0):
+                    self.deltas.append(delta)
+            else:
+                self.deltas.append(self.transport.complete("model", MESSAGES, 0))
+        except Exception as e:
+            self.error = e
+
+def wait_for(condition, timeout : float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.001)
+
+def test_identical_streams_share_one_request():
+    backend = GatedBackend()
+    transport = Transport(backend)
+    leader = Reader(transport)
+    backend.started.wait(5)
+    followers = [Reader(transport) for _ in range(3)]
+    wait_for(lambda: transport.coalesced == 3)
+    backend.gate.set()
+    for reader in [leader] + followers:
+        reader.join(5)
+        assert reader.error is None and reader.deltas == ["Hello", ", world"]
+    assert backend.requests == 1
+    assert not transport.streams
+
+def test_follower_joining_late_gets_every_delta():
+    backend = GatedBackend()
+    transport = Transport(backend)
+    leader = Reader(transport)
+    wait_for(lambda: leader.deltas == ["Hello"])
+    follower = Reader(transport)
+    wait_for(lambda: transport.coalesced == 1)
+    backend.gate.set()
+    follower.join(5)
+    assert follower.deltas == ["Hello", ", world"]
+
+def test_stream_error_reaches_every_reader():
+    backend = GatedBackend(fail = BackendError("HTTP 400: Bad request", 400))
+    transport = Transport(backend)
+    leader = Reader(transport)
+    backend.started.wait(5)
+    follower = Reader(transport)
+    wait_for(lambda: transport.coalesced == 1)
+    backend.gate.set()
+    for reader in [leader, follower]:
+        reader.join(5)
+        assert reader.deltas == ["Hello"] and isinstance(reader.error, BackendError)
+
+def test_abandoned_stream_fails_followers():
+    backend = GatedBackend()
+    transport = Transport(backend)
+    stream = transport.stream("model", MESSAGES, 0)
+    assert next(stream) == "Hello"
+    follower = Reader(transport)
+    wait_for(lambda: transport.coalesced == 1)
+    stream.close()
+    follower.join(5)
+    assert follower.deltas == ["Hello"] and isinstance(follower.error, BackendError)
+    assert not transport.streams
+
+def test_streams_are_sent_separately_without_coalescing():
+    backend = GatedBackend()
+    transport = Transport(backend, coalesce = False)
+    readers = [Reader(transport) for _ in range(2)]
+    wait_for(lambda: backend.requests == 2)
+    backend.gate.set()
+    for reader in readers:
+        reader.join(5)
+        assert reader.deltas == ["Hello", ", world"]
+
+def test_finished_stream_is_not_reused():
+    backend = GatedBackend()
+    backend.gate.set()
+    transport = Transport(backend)
+    assert list(transport.stream("model", MESSAGES, 0)) == list(transport.stream("model", MESSAGES, 0))
+    assert backend.requests == 2 and transport.coalesced == 0
+
+def test_identical_completions_share_one_request():
+    backend = GatedBackend()
+    transport = Transport(backend)
+    readers = [Reader(transport, stream = False)]
+    backend.started.wait(5)
+    readers.append(Reader(transport, stream = False))
+    wait_for(lambda: transport.coalesced == 1)
+    backend.gate.set()
+    for reader in readers:
+        reader.join(5)
+        assert reader.deltas == ["Hello, world"]
+    assert backend.requests == 1
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_retryable_failure_before_first_delta_is_retried(stream):
+    failures = [BackendError("HTTP 503: Unavailable", 503)]
+    def reply(messages):
+        if failures:
+            raise failures.pop()
+        return "Hello"
+    backend = FakeBackend(reply)
+    transport = Transport(backend, backoff = 0.001)
+    result = "".join(transport.stream("model", MESSAGES, 0)) if stream else transport.complete("model", MESSAGES, 0)
+    assert result == "Hello" and transport.retries == 1